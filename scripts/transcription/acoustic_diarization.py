@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Acoustic Speaker Diarization for Ray Peat Transcripts
+Embeds sliding windows of the audio, clusters the embeddings into speakers
+and labels Whisper segments by time overlap. SPEAKER_PATTERNS then put
+names on the clusters. CPU only; windows are processed in fixed-size
+batches so memory stays flat on multi-hour files.
+"""
+
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from chunked_transcribe import SAMPLE_RATE, decode_pcm_blocks
+
+# Configuration
+WINDOW_SECONDS = 1.5         # audio per embedding
+HOP_SECONDS = 0.75           # step between windows
+WINDOW_BATCH = 64            # windows embedded per vectorized batch
+FRAME_SAMPLES = 400          # 25 ms analysis frames...
+FRAME_HOP_SAMPLES = 160      # ...every 10 ms
+FFT_SIZE = 512
+MEL_BANDS = 40
+MFCC_COEFFICIENTS = 20
+SILENCE_DBFS = -45.0         # windows quieter than this carry no speaker information
+MICRO_CLUSTERS = 128         # k-means pre-clustering keeps agglomeration O(k^2), not O(windows^2)
+MERGE_THRESHOLD = 0.5        # stop merging clusters further apart than this cosine distance
+MAX_SPEAKERS = 8
+
+def mel_filterbank(bands: int = MEL_BANDS, fft_size: int = FFT_SIZE,
+                   sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Triangular mel filters, shape (bands, fft_size // 2 + 1)"""
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    edges = mel_to_hz(np.linspace(hz_to_mel(20.0), hz_to_mel(sample_rate / 2), bands + 2))
+    bins = np.fft.rfftfreq(fft_size, 1.0 / sample_rate)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins - lower) / (center - lower)
+    falling = (upper - bins) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+def dct_matrix(coefficients: int = MFCC_COEFFICIENTS, bands: int = MEL_BANDS) -> np.ndarray:
+    """Orthonormal DCT-II rows, shape (coefficients, bands)"""
+    n = np.arange(bands)
+    k = np.arange(coefficients)[:, None]
+    matrix = np.cos(np.pi / bands * (n + 0.5) * k) * np.sqrt(2.0 / bands)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+class MFCCEmbedder:
+    """Speaker embedding from MFCC statistics (per-coefficient mean and std)
+
+    Plain NumPy, so it runs anywhere the rest of the pipeline does. Any
+    object with embed(windows) -> (batch, dim) array can stand in for it,
+    e.g. a neural speaker encoder.
+    """
+
+    def __init__(self):
+        self.window = np.hanning(FRAME_SAMPLES).astype(np.float32)
+        self.filterbank = mel_filterbank()
+        self.dct = dct_matrix()
+
+    @property
+    def dimension(self) -> int:
+        # c0 (overall loudness) is dropped: it tracks mic distance, not voice
+        return 2 * (MFCC_COEFFICIENTS - 1)
+
+    def embed(self, windows: np.ndarray) -> np.ndarray:
+        """(batch, samples) float32 audio → (batch, dimension) embeddings"""
+        frames = np.lib.stride_tricks.sliding_window_view(windows, FRAME_SAMPLES, axis=1)[:, ::FRAME_HOP_SAMPLES]
+        spectrum = np.fft.rfft(frames * self.window, n=FFT_SIZE)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+        log_mel = np.log(power @ self.filterbank.T + 1e-6)
+        mfcc = (log_mel @ self.dct.T)[:, :, 1:]
+        return np.concatenate([mfcc.mean(axis=1), mfcc.std(axis=1)], axis=1)
+
+def iter_window_batches(blocks: Iterable[np.ndarray],
+                        batch_size: int = WINDOW_BATCH) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """(start times, float32 windows) in batches from a stream of int16 PCM blocks
+
+    Only the unconsumed tail of the stream is buffered between blocks.
+    """
+    window = int(WINDOW_SECONDS * SAMPLE_RATE)
+    hop = int(HOP_SECONDS * SAMPLE_RATE)
+    buffer = np.zeros(0, dtype=np.int16)
+    buffer_start = 0
+
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        count = (len(buffer) - window) // hop + 1 if len(buffer) >= window else 0
+        for first in range(0, count, batch_size):
+            n = min(batch_size, count - first)
+            offsets = (first + np.arange(n)) * hop
+            windows = np.lib.stride_tricks.sliding_window_view(buffer, window)[offsets]
+            yield (buffer_start + offsets) / SAMPLE_RATE, windows.astype(np.float32) / 32768.0
+        buffer = buffer[count * hop:]
+        buffer_start += count * hop
+
+def extract_embeddings(blocks: Iterable[np.ndarray], embedder=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Start times and embeddings of every non-silent window"""
+    embedder = embedder or MFCCEmbedder()
+    starts, embeddings = [], []
+    for batch_starts, windows in iter_window_batches(blocks):
+        rms = np.sqrt(np.mean(windows * windows, axis=1))
+        voiced = 20 * np.log10(rms + 1e-10) > SILENCE_DBFS
+        if voiced.any():
+            starts.append(batch_starts[voiced])
+            embeddings.append(embedder.embed(windows[voiced]))
+
+    if not starts:
+        return np.zeros(0), np.zeros((0, embedder.dimension), dtype=np.float32)
+    return np.concatenate(starts), np.concatenate(embeddings)
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Per-episode mean/variance normalization, then unit length"""
+    centered = (embeddings - embeddings.mean(axis=0)) / (embeddings.std(axis=0) + 1e-6)
+    return centered / (np.linalg.norm(centered, axis=1, keepdims=True) + 1e-9)
+
+def kmeans(points: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized k-means: (centroids, labels)"""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=k, replace=False)]
+    labels = np.zeros(len(points), dtype=np.int64)
+    for _ in range(iterations):
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2; |p|^2 doesn't change the argmin
+        distances = (centroids * centroids).sum(axis=1) - 2 * points @ centroids.T
+        new_labels = distances.argmin(axis=1)
+        if _ and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, points)
+        counts = np.bincount(labels, minlength=k)
+        occupied = counts > 0
+        centroids[occupied] = sums[occupied] / counts[occupied, None]
+    return centroids, labels
+
+def agglomerate(centroids: np.ndarray, weights: np.ndarray, threshold: float = MERGE_THRESHOLD,
+                max_clusters: int = MAX_SPEAKERS) -> np.ndarray:
+    """Merge weighted centroids bottom-up by cosine distance; returns a cluster id per centroid
+
+    Merging stops once the closest pair is further apart than threshold and
+    no more than max_clusters remain.
+    """
+    sums = centroids * weights[:, None]
+    active = weights > 0
+    assignment = np.arange(len(centroids))
+
+    while active.sum() > 1:
+        unit = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-9)
+        similarity = unit @ unit.T
+        similarity[~active, :] = -np.inf
+        similarity[:, ~active] = -np.inf
+        np.fill_diagonal(similarity, -np.inf)
+        i, j = np.unravel_index(np.argmax(similarity), similarity.shape)
+        if 1.0 - similarity[i, j] > threshold and active.sum() <= max_clusters:
+            break
+        sums[i] += sums[j]
+        active[j] = False
+        assignment[assignment == j] = i
+
+    # Renumber 0..n-1
+    return np.unique(assignment, return_inverse=True)[1]
+
+def cluster_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Cluster id for each embedding"""
+    if len(embeddings) == 0:
+        return np.zeros(0, dtype=np.int64)
+    points = normalize_embeddings(embeddings)
+    k = min(MICRO_CLUSTERS, len(points))
+    centroids, labels = kmeans(points, k)
+    weights = np.bincount(labels, minlength=k).astype(np.float64)
+    return agglomerate(centroids, weights)[labels]
+
+def assign_segments(segments: List[Dict], starts: np.ndarray,
+                    labels: np.ndarray) -> List[Tuple[Optional[int], float]]:
+    """(cluster, confidence) per segment from the windows overlapping it
+
+    Confidence is the share of overlapping window time belonging to the
+    winning cluster.
+    """
+    cluster_count = int(labels.max()) + 1 if len(labels) else 0
+    ends = starts + WINDOW_SECONDS
+    assignments = []
+    for segment in segments:
+        start, end = segment.get("start", 0.0), segment.get("end", 0.0)
+        lo = np.searchsorted(starts, start - WINDOW_SECONDS)
+        hi = np.searchsorted(starts, end)
+        overlap = np.minimum(ends[lo:hi], end) - np.maximum(starts[lo:hi], start)
+        mask = overlap > 0
+        if not mask.any():
+            assignments.append((None, 0.0))
+            continue
+        votes = np.bincount(labels[lo:hi][mask], weights=overlap[mask], minlength=cluster_count)
+        winner = int(votes.argmax())
+        assignments.append((winner, round(float(votes[winner] / votes.sum()), 3)))
+    return assignments
+
+def cluster_centroids(embeddings: np.ndarray, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean raw embedding and window count per cluster"""
+    count = int(labels.max()) + 1 if len(labels) else 0
+    sums = np.zeros((count, embeddings.shape[1]))
+    np.add.at(sums, labels, embeddings)
+    windows = np.bincount(labels, minlength=count)
+    return sums / np.maximum(windows, 1)[:, None], windows
+
+def name_clusters(segments: List[Dict], clusters: List[Optional[int]], matcher,
+                  known: Optional[Dict[int, str]] = None) -> Dict[int, str]:
+    """Put SPEAKER_PATTERNS names on clusters; the rest become "Speaker N"
+
+    known holds names already settled (e.g. by voiceprint) and is kept as is.
+    Each remaining name goes to the cluster whose segments mention it most,
+    and each cluster gets at most one name.
+    """
+    votes = Counter()
+    for cluster, speaker in zip(clusters, matcher.match_segments(segments)):
+        if cluster is not None and speaker:
+            votes[(cluster, speaker)] += 1
+
+    names: Dict[int, str] = dict(known or {})
+    for (cluster, speaker), _ in votes.most_common():
+        if cluster not in names and speaker not in names.values():
+            names[cluster] = speaker
+
+    # Unnamed clusters in order of first appearance
+    number = 1
+    for cluster in clusters:
+        if cluster is not None and cluster not in names:
+            names[cluster] = f"Speaker {number}"
+            number += 1
+    return names
+
+def diarize_transcript(transcript_data: Dict, blocks: Iterable[np.ndarray], matcher,
+                       embedder=None, voiceprints=None) -> Dict:
+    """Label transcript segments with acoustic speaker clusters
+
+    blocks is the episode's 16 kHz mono int16 PCM, e.g. decode_pcm_blocks(audio_path).
+    With a VoiceprintStore, clusters that sound like an enrolled speaker are
+    named by voice before text patterns are consulted.
+    """
+    segments = transcript_data["transcript"]["segments"]
+    starts, embeddings = extract_embeddings(blocks, embedder)
+    labels = cluster_embeddings(embeddings)
+    centroids, windows = cluster_centroids(embeddings, labels)
+
+    assignments = assign_segments(segments, starts, labels)
+    clusters = [cluster for cluster, _ in assignments]
+    voice_matches = voiceprints.match(centroids) if voiceprints else {}
+    names = name_clusters(segments, clusters, matcher,
+                          {cluster: speaker for cluster, (speaker, _) in voice_matches.items()})
+
+    speaking_time = Counter()
+    for segment, (cluster, confidence) in zip(segments, assignments):
+        segment["speaker"] = names[cluster] if cluster is not None else "Unknown Speaker"
+        segment["speaker_confidence"] = confidence
+        speaking_time[segment["speaker"]] += segment.get("end", 0) - segment.get("start", 0)
+
+    transcript_data["speaker_analysis"] = {
+        "identified_speakers": [names[cluster] for cluster in sorted(names)],
+        "speaking_time": {speaker: round(seconds, 1) for speaker, seconds in speaking_time.most_common()},
+        "windows": len(starts),
+        "voiceprint_matches": {speaker: score for speaker, score in voice_matches.values()},
+        # Raw centroids and episode statistics, for enrolling this episode in voiceprints.py
+        "speaker_embeddings": {
+            names[cluster]: {"centroid": np.round(centroids[cluster], 4).tolist(), "windows": int(windows[cluster])}
+            for cluster in sorted(names)
+        },
+        "embedding_background": {
+            "count": len(embeddings),
+            "sum": np.round(embeddings.sum(axis=0), 4).tolist(),
+            "sumsq": np.round((embeddings.astype(np.float64) ** 2).sum(axis=0), 4).tolist(),
+        },
+        "analysis_method": "acoustic_clustering",
+        "analysis_date": datetime.now().isoformat()
+    }
+    return transcript_data
+
+def diarize_audio_file(transcript_data: Dict, audio_path: Path, matcher, embedder=None, voiceprints=None,
+                       pcm_cache=None) -> Dict:
+    """diarize_transcript() on audio decoded by ffmpeg, or read from a PCMCache"""
+    blocks = pcm_cache.blocks(audio_path) if pcm_cache else decode_pcm_blocks(audio_path)
+    return diarize_transcript(transcript_data, blocks, matcher, embedder, voiceprints)
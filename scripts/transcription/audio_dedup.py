@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Audio Deduplication Index for Ray Peat Podcast Collection
+Fingerprints every MP3 in the audio cache so the same recording published
+under a different title is transcribed only once
+"""
+
+import sqlite3
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from chunked_transcribe import decode_pcm_blocks
+from manifest import file_sha256
+
+# Configuration
+DEDUP_INDEX_PATH = Path("transcripts/audio-dedup.sqlite")
+FINGERPRINT_SAMPLE_RATE = 8000    # plenty for a loudness envelope, and cheap to decode
+FINGERPRINT_FRAME_SECONDS = 0.1
+FINGERPRINT_SMOOTH_FRAMES = 5
+DURATION_TOLERANCE = 0.02         # re-uploads differ by at most 2% in length
+MAX_SHIFT_SECONDS = 10            # ...and by at most this much trimmed or added at the start
+MATCH_THRESHOLD = 0.75            # fraction of agreeing envelope bits (unrelated audio is ~0.5)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    duration REAL,
+    bits BLOB,
+    bit_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS duplicates (
+    path TEXT PRIMARY KEY,
+    canonical_path TEXT NOT NULL,
+    similarity REAL NOT NULL
+);
+"""
+
+def compute_fingerprint(audio_path: Path) -> Tuple[float, np.ndarray]:
+    """Duration and a bit-per-frame loudness-envelope fingerprint
+
+    Bit i is set when the smoothed loudness rises from frame i to frame i+1.
+    The envelope survives re-encoding and bitrate changes, which a byte or
+    PCM hash does not.
+    """
+    frame = int(FINGERPRINT_SAMPLE_RATE * FINGERPRINT_FRAME_SECONDS)
+    energies = []
+    remainder = np.zeros(0, dtype=np.int16)
+    total = 0
+
+    for block in decode_pcm_blocks(audio_path, sample_rate=FINGERPRINT_SAMPLE_RATE):
+        total += len(block)
+        samples = np.concatenate([remainder, block])
+        usable = len(samples) // frame * frame
+        frames = samples[:usable].astype(np.float32).reshape(-1, frame)
+        energies.append(np.log1p(np.mean(frames * frames, axis=1)))
+        remainder = samples[usable:]
+
+    envelope = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+    # Smoothing makes the bits insensitive to frames landing at a different phase
+    if len(envelope) >= FINGERPRINT_SMOOTH_FRAMES:
+        envelope = np.convolve(envelope, np.ones(FINGERPRINT_SMOOTH_FRAMES) / FINGERPRINT_SMOOTH_FRAMES, mode="valid")
+    bits = (envelope[1:] > envelope[:-1]) if len(envelope) > 1 else np.zeros(0, dtype=bool)
+    return total / FINGERPRINT_SAMPLE_RATE, bits
+
+def similarity(bits_a: np.ndarray, bits_b: np.ndarray) -> float:
+    """Best fraction of agreeing bits over start offsets within MAX_SHIFT_SECONDS"""
+    max_shift = int(MAX_SHIFT_SECONDS / FINGERPRINT_FRAME_SECONDS)
+    best = 0.0
+    for shift in range(-max_shift, max_shift + 1):
+        a = bits_a[shift:] if shift > 0 else bits_a
+        b = bits_b[-shift:] if shift < 0 else bits_b
+        overlap = min(len(a), len(b))
+        if overlap < max_shift:
+            continue
+        best = max(best, float(np.mean(a[:overlap] == b[:overlap])))
+    return best
+
+class DedupIndex:
+    """SQLite-backed fingerprint cache and duplicate map"""
+
+    def __init__(self, path: Path = DEDUP_INDEX_PATH):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fingerprint(self, audio_path: Path) -> Dict:
+        """Cached sha256 + fingerprint, recomputed only when size or mtime change"""
+        stat = audio_path.stat()
+        key = str(audio_path.resolve())
+        row = self.conn.execute("SELECT * FROM fingerprints WHERE path = ?", (key,)).fetchone()
+        if row and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return self._unpack(row)
+
+        sha256 = file_sha256(audio_path)
+        try:
+            duration, bits = compute_fingerprint(audio_path)
+            packed, bit_count = np.packbits(bits).tobytes(), len(bits)
+        except (OSError, RuntimeError) as e:
+            # No ffmpeg or undecodable audio: fall back to exact byte matches only
+            print(f"! Could not fingerprint {audio_path.name}, using its content hash only: {e}")
+            duration, packed, bit_count = None, None, None
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (path, size, mtime_ns, sha256, duration, bits, bit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, sha256, duration, packed, bit_count)
+            )
+        return self._unpack(self.conn.execute("SELECT * FROM fingerprints WHERE path = ?", (key,)).fetchone())
+
+    @staticmethod
+    def _unpack(row: sqlite3.Row) -> Dict:
+        bits = None
+        if row["bits"] is not None:
+            bits = np.unpackbits(np.frombuffer(row["bits"], dtype=np.uint8), count=row["bit_count"]).astype(bool)
+        return {"sha256": row["sha256"], "duration": row["duration"], "bits": bits}
+
+    def find_duplicates(self, audio_files: List[Path]) -> Dict[Path, Tuple[Path, float]]:
+        """Map each duplicate file to (canonical file, similarity)
+
+        The canonical copy is the first file in sorted order, so the choice is
+        stable from run to run as long as the earlier file stays in the cache.
+        """
+        prints = {audio_file: self.fingerprint(audio_file) for audio_file in sorted(audio_files)}
+        canonical: List[Path] = []
+        by_hash: Dict[str, Path] = {}
+        duplicates: Dict[Path, Tuple[Path, float]] = {}
+
+        for audio_file, fp in prints.items():
+            if fp["sha256"] in by_hash:
+                duplicates[audio_file] = (by_hash[fp["sha256"]], 1.0)
+                continue
+
+            match = None
+            if fp["bits"] is not None:
+                for other in canonical:
+                    other_fp = prints[other]
+                    if other_fp["bits"] is None:
+                        continue
+                    tolerance = max(other_fp["duration"], fp["duration"]) * DURATION_TOLERANCE
+                    if abs(other_fp["duration"] - fp["duration"]) > tolerance:
+                        continue
+                    score = similarity(fp["bits"], other_fp["bits"])
+                    if score >= MATCH_THRESHOLD:
+                        match = (other, score)
+                        break
+
+            if match:
+                duplicates[audio_file] = match
+            else:
+                canonical.append(audio_file)
+                by_hash[fp["sha256"]] = audio_file
+
+        with self.conn:
+            self.conn.execute("DELETE FROM duplicates")
+            self.conn.executemany(
+                "INSERT INTO duplicates (path, canonical_path, similarity) VALUES (?, ?, ?)",
+                [(str(path.resolve()), str(original.resolve()), score)
+                 for path, (original, score) in duplicates.items()]
+            )
+        return duplicates
+
+    def unique(self, audio_files: List[Path]) -> List[Path]:
+        """audio_files with every duplicate removed, order preserved"""
+        duplicates = self.find_duplicates(audio_files)
+        for duplicate, (original, score) in sorted(duplicates.items()):
+            print(f"= Duplicate audio: {duplicate.name} → {original.name} ({score:.0%} match)")
+        return [audio_file for audio_file in audio_files if audio_file not in duplicates]
+
+    def canonical_for(self, audio_path: Path) -> Optional[Path]:
+        """The file this one duplicates, from the last find_duplicates() run"""
+        row = self.conn.execute(
+            "SELECT canonical_path FROM duplicates WHERE path = ?", (str(audio_path.resolve()),)
+        ).fetchone()
+        return Path(row["canonical_path"]) if row else None
+
+    def duplicates_of(self, audio_path: Path) -> List[Path]:
+        """Files recorded as duplicates of audio_path"""
+        rows = self.conn.execute(
+            "SELECT path FROM duplicates WHERE canonical_path = ?", (str(audio_path.resolve()),)
+        ).fetchall()
+        return [Path(row["path"]) for row in rows]
+
+def main():
+    """Report duplicate audio in the audio cache"""
+    from bulk_transcribe import get_audio_files
+
+    parser = argparse.ArgumentParser(description="Find duplicate audio files in the audio cache")
+    parser.parse_args()
+
+    audio_files = get_audio_files(dedupe=False)
+    print(f"Fingerprinting {len(audio_files)} audio files...")
+    with DedupIndex() as index:
+        unique = index.unique(audio_files)
+
+    print(f"\n{len(unique)} unique recordings, {len(audio_files) - len(unique)} duplicates")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Batched Transcription for Short Ray Peat Clips
+Cuts several episodes into <= 30 s windows (Whisper's context length), runs
+the windows through the model in fixed-size batches and reassembles each
+episode's result. For short clips, per-call overhead (model reloads, one
+forward pass per window) otherwise dominates the runtime.
+"""
+
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from chunked_transcribe import SAMPLE_RATE, iter_audio_chunks, stitch_chunks
+from metrics import get_metrics
+
+# Configuration
+BATCH_SIZE = 8                # windows per model call
+BATCH_MAX_WAIT_SECONDS = 2.0  # flush a partial batch once its first window has waited this long
+BATCH_WINDOW_SECONDS = 30     # Whisper decodes 30 s at a time
+
+# (audio file, window index, offset in seconds, int16 mono samples)
+Window = Tuple[Path, int, float, np.ndarray]
+
+class _EpisodeDone:
+    """Queue marker: every window of audio_file has been queued (or decoding failed)"""
+
+    def __init__(self, audio_file: Path, windows: int, samples: int, error: Optional[str] = None):
+        self.audio_file = audio_file
+        self.windows = windows
+        self.samples = samples
+        self.error = error
+
+_END = object()
+
+class _Episode:
+    """Windows transcribed so far for one file"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.results = {}
+        self.expected = None
+        self.samples = 0
+        self.failed = False
+        self.in_batch = 0  # windows sitting in the current batch; the episode stays open until they come back
+
+    @property
+    def complete(self) -> bool:
+        if self.expected is None or self.in_batch:
+            return False
+        return self.failed or len(self.results) == self.expected
+
+def decode_windows(audio_files: List[Path], out: queue.Queue, started: Dict[Path, float],
+                   window_seconds: float = BATCH_WINDOW_SECONDS, pcm_cache=None):
+    """Producer: queue every file's windows, then an _EpisodeDone marker per file"""
+    for audio_file in audio_files:
+        started[audio_file] = time.monotonic()
+        windows = samples = 0
+        try:
+            for index, offset, chunk in iter_audio_chunks(audio_file, window_seconds, pcm_cache):
+                out.put((audio_file, index, offset, chunk))
+                windows += 1
+                samples += len(chunk)
+        except Exception as e:
+            print(f"✗ Could not decode {audio_file.name}: {e}")
+            out.put(_EpisodeDone(audio_file, windows, samples, f"{type(e).__name__}: {e}"))
+            continue
+        out.put(_EpisodeDone(audio_file, windows, samples))
+    out.put(_END)
+
+def transcribe_windows(engine, batch: List[Window]) -> List[Optional[Dict]]:
+    """One engine call for the batch; if it fails, retry window by window so one bad window costs only its file"""
+    audio = [samples.astype(np.float32) / 32768.0 for _, _, _, samples in batch]
+    audio_seconds = sum(len(samples) for samples in audio) / SAMPLE_RATE
+    with get_metrics().stage("transcribe_batch", windows=len(batch), files=len({w[0] for w in batch}),
+                             audio_seconds=audio_seconds) as stage:
+        try:
+            return engine.transcribe_batch(audio)
+        except Exception as e:
+            print(f"✗ Batch of {len(batch)} windows failed, retrying one at a time: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+
+    results = []
+    for (audio_file, index, offset, _), window in zip(batch, audio):
+        try:
+            results.append(engine.transcribe(window))
+        except Exception as e:
+            print(f"✗ Window {index} of {audio_file.name} at {offset:.0f}s failed: {e}")
+            results.append(None)
+    return results
+
+def transcribe_batched(audio_files: List[Path], engine, batch_size: int = BATCH_SIZE,
+                       max_wait: float = BATCH_MAX_WAIT_SECONDS, pcm_cache=None,
+                       window_seconds: float = BATCH_WINDOW_SECONDS) -> Iterator[Tuple[Path, Optional[Dict], float]]:
+    """Transcribe files through shared window batches
+
+    Decoding runs in a background thread; a batch is sent to the engine
+    when it holds batch_size windows, when its oldest window has waited
+    max_wait seconds, or when the input runs out. Yields (audio_file,
+    whisper_result or None, wall seconds) as each file's last window comes
+    back, roughly in input order.
+    """
+    # A couple of batches of lookahead keeps the model busy without decoding the whole list up front
+    windows = queue.Queue(maxsize=batch_size * 2)
+    started = {}
+    producer = threading.Thread(target=decode_windows, daemon=True,
+                                args=(audio_files, windows, started, window_seconds, pcm_cache))
+    producer.start()
+
+    episodes = {}
+    batch = []
+    deadline = None
+    exhausted = False
+
+    def finished() -> Iterator[Tuple[Path, Optional[Dict], float]]:
+        for audio_file in [f for f, episode in episodes.items() if episode.complete]:
+            episode = episodes.pop(audio_file)
+            elapsed = time.monotonic() - episode.started
+            duration = episode.samples / SAMPLE_RATE
+            result = None if episode.failed else stitch_chunks(episode.results, duration)
+            get_metrics().record("transcribe", elapsed, result is not None, audio_file.name,
+                                 engine=engine.method, batched=True, audio_seconds=duration)
+            yield audio_file, result, elapsed
+
+    while not exhausted or batch:
+        if not exhausted:
+            try:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                item = windows.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _END:
+                exhausted = True
+            elif isinstance(item, _EpisodeDone):
+                episode = episodes.setdefault(item.audio_file, _Episode(started[item.audio_file]))
+                episode.expected = item.windows
+                episode.samples = item.samples
+                episode.failed = episode.failed or item.error is not None
+                yield from finished()
+                continue
+            elif item is not None:
+                audio_file = item[0]
+                episode = episodes.setdefault(audio_file, _Episode(started[audio_file]))
+                if episode.failed:
+                    # One window already failed, so the file will be reported as failed anyway
+                    continue
+                episode.in_batch += 1
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + max_wait
+                if len(batch) < batch_size and time.monotonic() < deadline:
+                    continue
+
+        if not batch:
+            continue
+
+        for (audio_file, index, offset, _), result in zip(batch, transcribe_windows(engine, batch)):
+            episode = episodes[audio_file]
+            episode.in_batch -= 1
+            if result is None:
+                episode.failed = True
+            else:
+                episode.results[index] = dict(result, offset=offset)
+        batch = []
+        deadline = None
+        yield from finished()
+
+    producer.join()
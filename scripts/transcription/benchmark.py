@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark for Ray Peat Transcription Scripts
+Runs each stage on a fixed synthetic corpus and reports wall time, real-time
+factor, peak RSS and files/minute, appending results to a JSON history so
+regressions between versions are visible
+"""
+
+import io
+import os
+import json
+import wave
+import zlib
+import time
+import random
+import resource
+import argparse
+import platform
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import bulk_transcribe
+import speaker_diarization
+from engines import ENGINES, SAMPLE_RATE, TranscriptionEngine, create_engine
+
+# Configuration
+HISTORY_PATH = Path("transcripts/benchmarks/history.json")
+DEFAULT_FILES = 8
+DEFAULT_AUDIO_SECONDS = 60
+DEFAULT_SEGMENTS = 2000
+CORPUS_SEED = 1234
+
+WORDS = (
+    "thyroid progesterone sugar metabolism energy cells estrogen serotonin carbon dioxide "
+    "calcium milk coffee orange juice gelatin aspirin stress light brain the of and to in "
+    "that it is was for on are with they be at one have this from"
+).split()
+SPEAKER_MENTIONS = ["ray peat", "doctor peat", "andrew murray", "sarah murray", "host andrew"]
+
+class StubEngine(TranscriptionEngine):
+    """Deterministic fake engine: measures the pipeline around Whisper, not Whisper itself"""
+
+    name = "stub"
+
+    def __init__(self, model: str = "stub", language: str = "en", segments_per_minute: int = 20):
+        super().__init__(model, language)
+        self.segments_per_minute = segments_per_minute
+
+    @property
+    def method(self) -> str:
+        return "Benchmark stub"
+
+    def transcribe(self, audio) -> Dict:
+        with wave.open(str(audio), 'rb') as f:
+            duration = f.getnframes() / f.getframerate()
+        count = max(1, int(duration / 60 * self.segments_per_minute))
+        return synthetic_transcription(count, duration, seed=zlib.crc32(Path(audio).name.encode()))
+
+def synthetic_transcription(segment_count: int, duration: float, seed: int = CORPUS_SEED) -> Dict:
+    """Whisper-shaped result with segment_count segments spread over duration seconds"""
+    rng = random.Random(seed)
+    step = duration / segment_count
+    segments = []
+    for i in range(segment_count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words)), rng.choice(SPEAKER_MENTIONS))
+        segments.append({
+            "id": i,
+            "seek": int(i * step * 100),
+            "start": round(i * step, 3),
+            "end": round((i + 1) * step, 3),
+            "text": " " + " ".join(words),
+            "tokens": [rng.randrange(50000) for _ in range(len(words) + 2)],
+            "temperature": 0.0,
+            "avg_logprob": -rng.random(),
+            "compression_ratio": 1.0 + rng.random(),
+            "no_speech_prob": rng.random() * 0.1,
+        })
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": "en",
+        "duration": duration,
+    }
+
+def write_synthetic_audio(path: Path, seconds: float, seed: int):
+    """Speech-like noise bursts separated by silences, as 16 kHz mono WAV
+
+    Saved under a .mp3 name so get_audio_files() picks it up; ffmpeg probes the
+    container, so real engines still decode it.
+    """
+    rng = np.random.default_rng(seed)
+    samples = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    position = 0
+    while position < len(samples):
+        burst = int(rng.uniform(1.0, 6.0) * SAMPLE_RATE)
+        t = np.arange(min(burst, len(samples) - position)) / SAMPLE_RATE
+        tone = np.sin(2 * np.pi * rng.uniform(100, 300) * t) * 0.2
+        samples[position:position + len(t)] = tone + rng.normal(0, 0.05, len(t))
+        position += burst + int(rng.uniform(0.2, 1.5) * SAMPLE_RATE)
+
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
+
+def build_corpus(root: Path, files: int, audio_seconds: float) -> Path:
+    """Create the fixed audio corpus under root (same seed, same corpus every run)"""
+    audio_dir = root / "audio-cache"
+    audio_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(files):
+        write_synthetic_audio(audio_dir / f"Politics_and_Science_Benchmark_{i:03d}_2020.mp3",
+                              audio_seconds, CORPUS_SEED + i)
+    return audio_dir
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children, in MB"""
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return usage / (1024 * 1024 if platform.system() == "Darwin" else 1024)
+
+def run_stage(name: str, func: Callable[[], int], audio_seconds: float) -> Dict:
+    """Time func (which returns the number of files it handled) and collect metrics"""
+    # The stages print per-file progress; keep it out of the results table
+    with redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        files = func()
+        wall = time.perf_counter() - started
+    result = {
+        "stage": name,
+        "wall_seconds": round(wall, 4),
+        "files": files,
+        "files_per_minute": round(files / wall * 60, 2) if wall > 0 else None,
+        "rtf": round(audio_seconds / wall, 2) if wall > 0 and audio_seconds else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    rtf = f"{result['rtf']}x realtime" if result["rtf"] else "-"
+    print(f"  {name:<24} {wall:8.3f}s  {result['files_per_minute'] or 0:10.1f} files/min  {rtf:>18}  {result['peak_rss_mb']:8.1f} MB")
+    return result
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(engine: TranscriptionEngine, files: int, audio_seconds: float, segments: int) -> Dict:
+    """Run every stage once on a fresh corpus in a temp directory"""
+    with tempfile.TemporaryDirectory(prefix="transcribr-bench-") as tmp:
+        root = Path(tmp)
+        print(f"Building corpus: {files} files x {audio_seconds:.0f}s audio, {segments}-segment transcripts")
+        audio_dir = build_corpus(root, files, audio_seconds)
+        output_dir = root / "raw-transcripts"
+        total_audio = files * audio_seconds
+
+        # Point the scripts' directory constants at the corpus
+        bulk_transcribe.AUDIO_CACHE_DIR = audio_dir
+        bulk_transcribe.RAW_TRANSCRIPTS_DIR = output_dir
+        state: Dict = {}
+        stages = []
+
+        def list_audio() -> int:
+            state["audio_files"] = bulk_transcribe.get_audio_files()
+            return len(state["audio_files"])
+
+        def transcribe() -> int:
+            engine.load()
+            state["transcripts"] = [(f, bulk_transcribe.transcribe_audio(f, engine)) for f in state["audio_files"]]
+            return len(state["transcripts"])
+
+        def save() -> int:
+            for audio_file, transcript_data in state["transcripts"]:
+                output_path = bulk_transcribe.organize_by_show_and_year(audio_file, transcript_data)
+                bulk_transcribe.save_transcript(transcript_data, output_path)
+            return len(state["transcripts"])
+
+        # Diarization gets its own, larger transcripts so its cost can be sized independently
+        large = [bulk_transcribe.build_transcript_data(
+                     audio_dir / f"synthetic_{i}.mp3",
+                     synthetic_transcription(segments, segments * 3.0, seed=CORPUS_SEED + i),
+                     "Benchmark stub")
+                 for i in range(files)]
+
+        def diarize() -> int:
+            for transcript_data in large:
+                speaker_diarization.apply_speaker_labels(transcript_data)
+            return len(large)
+
+        print(f"\n  {'stage':<24} {'wall':>9}  {'throughput':>20}  {'rtf':>18}  {'peak rss':>11}")
+        stages.append(run_stage("get_audio_files", list_audio, 0))
+        stages.append(run_stage("transcribe_audio", transcribe, total_audio))
+        stages.append(run_stage("save_transcript", save, total_audio))
+        stages.append(run_stage("apply_speaker_labels", diarize, files * segments * 3.0))
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "engine": engine.method,
+            "files": files,
+            "audio_seconds": audio_seconds,
+            "segments": segments,
+        },
+        "stages": stages,
+    }
+
+def load_history() -> List[Dict]:
+    if HISTORY_PATH.exists():
+        with open(HISTORY_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return []
+
+def compare_with_previous(run: Dict, history: List[Dict]):
+    """Print per-stage change against the last run with the same config"""
+    previous = next((r for r in reversed(history) if r["config"] == run["config"]), None)
+    if not previous:
+        print("\nNo earlier run with this config to compare against")
+        return
+
+    print(f"\nChange vs {previous['revision'] or 'previous run'} ({previous['timestamp']}):")
+    before = {stage["stage"]: stage for stage in previous["stages"]}
+    for stage in run["stages"]:
+        old = before.get(stage["stage"])
+        if not old or not old["wall_seconds"]:
+            continue
+        change = (stage["wall_seconds"] - old["wall_seconds"]) / old["wall_seconds"] * 100
+        flag = "  ← slower" if change > 10 else ""
+        print(f"  {stage['stage']:<24} {old['wall_seconds']:8.3f}s → {stage['wall_seconds']:8.3f}s ({change:+.1f}%){flag}")
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description="Benchmark the transcription → diarization pipeline")
+    parser.add_argument("--engine", choices=["stub"] + list(ENGINES), default="stub",
+                        help="Transcription engine (default: stub, no Whisper needed)")
+    parser.add_argument("--model", default="tiny", help="Model for real engines (default: tiny)")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILES, help=f"Corpus size (default: {DEFAULT_FILES})")
+    parser.add_argument("--audio-seconds", type=float, default=DEFAULT_AUDIO_SECONDS,
+                        help=f"Length of each synthetic audio file (default: {DEFAULT_AUDIO_SECONDS})")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS,
+                        help=f"Segments per synthetic transcript for the diarization stage (default: {DEFAULT_SEGMENTS})")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the history")
+    args = parser.parse_args()
+
+    if args.engine == "stub":
+        engine = StubEngine()
+    else:
+        engine = create_engine(args.engine, args.model, bulk_transcribe.WHISPER_LANGUAGE)
+
+    run = run_benchmark(engine, args.files, args.audio_seconds, args.segments)
+
+    history = load_history()
+    compare_with_previous(run, history)
+
+    if not args.no_save:
+        HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(HISTORY_PATH, 'w', encoding='utf-8') as f:
+            json.dump(history + [run], f, indent=2)
+        print(f"\nResults appended to {HISTORY_PATH}")
+
+if __name__ == "__main__":
+    main()
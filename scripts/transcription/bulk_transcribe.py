@@ -8,23 +8,63 @@ import os
 import json
 import argparse
 import subprocess
+import multiprocessing
+import time
 from pathlib import Path
 from datetime import datetime
 import re
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from audio_dedup import DedupIndex
+from batched_transcribe import BATCH_MAX_WAIT_SECONDS, transcribe_batched
+from cascade import CASCADE_DRAFT_MODEL, cascade_summary
+from chunked_transcribe import bounded_imap, transcribe_chunked
+from engines import ENGINES, TranscriptionEngine, create_engine, get_engine
+from manifest import TranscriptionManifest
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
+from pcm_cache import PCMCache, to_float
+from segment_store import TRANSCRIPT_FORMATS, load_transcript_file, save_transcript_file
+from transcript_search import SearchIndex
 
 # Configuration
 WHISPER_MODEL = "large"  # tiny, base, small, medium, large
+WHISPER_LANGUAGE = "en"
 AUDIO_CACHE_DIR = Path("transcripts/audio-cache")
 RAW_TRANSCRIPTS_DIR = Path("transcripts/raw-transcripts")
 
-def get_audio_files() -> List[Path]:
-    """Get all MP3 files from audio cache directory"""
+# Per-process state for --workers mode (populated by init_worker)
+_worker_engine = None
+_worker_error = None
+_worker_pcm_cache = None
+
+def get_audio_files(dedupe: bool = False) -> List[Path]:
+    """Get all MP3 files from audio cache directory
+
+    With dedupe, files the fingerprint index recognises as re-uploads of
+    another file are left out.
+    """
     audio_files = []
     if AUDIO_CACHE_DIR.exists():
         for mp3_file in AUDIO_CACHE_DIR.glob("**/*.mp3"):
             audio_files.append(mp3_file)
-    return sorted(audio_files)
+    audio_files = sorted(audio_files)
+
+    if dedupe and audio_files:
+        with DedupIndex() as index:
+            audio_files = index.unique(audio_files)
+    return audio_files
+
+def record_duplicates(manifest: TranscriptionManifest, audio_file: Path, output_path: Path,
+                      engine: TranscriptionEngine):
+    """Point the manifest entries of audio_file's duplicates at its transcript"""
+    with DedupIndex() as index:
+        duplicates = index.duplicates_of(audio_file)
+    for duplicate in duplicates:
+        if duplicate.exists():
+            manifest.mark_done(manifest.audio_hash(duplicate), engine.cache_key, engine.language,
+                               duplicate, output_path)
 
 def extract_episode_info(filename: str) -> Dict:
     """Extract episode metadata from filename"""
@@ -59,93 +99,93 @@ def extract_episode_info(filename: str) -> Dict:
         "filename": filename
     }
 
-def transcribe_audio(audio_path: Path) -> Optional[Dict]:
-    """Transcribe a single audio file using Whisper"""
-    try:
-        print(f"Transcribing: {audio_path.name}")
-
-        # Run Whisper command
-        cmd = [
-            "whisper",
-            str(audio_path),
-            "--model", WHISPER_MODEL,
-            "--output_format", "json",
-            "--language", "en",
-            "--verbose", "False"
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-
-        # Find the output JSON file
-        json_pattern = audio_path.stem + "*.json"
-        json_files = list(audio_path.parent.glob(json_pattern))
-
-        if not json_files:
-            print(f"✗ No JSON output found for {audio_path.name}")
-            return None
-
-        json_file = json_files[0]
-
-        # Read the transcription
-        with open(json_file, 'r', encoding='utf-8') as f:
-            transcription_data = json.load(f)
-
-        # Clean up the JSON file
-        json_file.unlink()
-
-        # Extract episode info
-        episode_info = extract_episode_info(audio_path.name)
-
-        # Create structured output
-        transcript_data = {
-            "metadata": {
-                "title": f"{episode_info['show']}: {episode_info['topic']}",
-                "audio_file": audio_path.name,
-                "transcription_date": datetime.now().isoformat(),
-                "transcription_method": f"OpenAI Whisper {WHISPER_MODEL}",
-                "audio_duration": transcription_data.get("duration"),
-                "show": episode_info["show"],
-                "topic": episode_info["topic"]
-            },
-            "transcript": {
-                "text": transcription_data.get("text", ""),
-                "segments": transcription_data.get("segments", [])
-            },
-            "quality_metrics": {
-                "language": transcription_data.get("language"),
-                "word_count": len(transcription_data.get("text", "").split()) if transcription_data.get("text") else 0
-            }
+def build_transcript_data(audio_path: Path, transcription_data: Dict,
+                          method: Optional[str] = None) -> Dict:
+    """Wrap raw Whisper output in the structured transcript format"""
+    episode_info = extract_episode_info(audio_path.name)
+
+    transcript_data = {
+        "metadata": {
+            "title": f"{episode_info['show']}: {episode_info['topic']}",
+            "audio_file": audio_path.name,
+            "transcription_date": datetime.now().isoformat(),
+            "transcription_method": method or f"OpenAI Whisper {WHISPER_MODEL}",
+            "audio_duration": transcription_data.get("duration"),
+            "show": episode_info["show"],
+            "topic": episode_info["topic"]
+        },
+        "transcript": {
+            "text": transcription_data.get("text", ""),
+            "segments": transcription_data.get("segments", [])
+        },
+        "quality_metrics": {
+            "language": transcription_data.get("language"),
+            "word_count": len(transcription_data.get("text", "").split()) if transcription_data.get("text") else 0
         }
+    }
 
-        print(f"✓ Transcribed: {audio_path.name} ({transcript_data['quality_metrics']['word_count']} words)")
-        return transcript_data
-
-    except subprocess.CalledProcessError as e:
-        print(f"✗ Whisper failed for {audio_path.name}: {e}")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"✗ Invalid JSON output for {audio_path.name}: {e}")
-        return None
-    except Exception as e:
-        print(f"✗ Unexpected error for {audio_path.name}: {e}")
-        return None
+    # Cascade runs: how much of the episode each model transcribed
+    models = cascade_summary(transcript_data["transcript"]["segments"])
+    if models:
+        transcript_data["quality_metrics"]["models"] = models
+    return transcript_data
+
+def transcribe_audio(audio_path: Path, engine: Optional[TranscriptionEngine] = None,
+                     pcm_cache: Optional[PCMCache] = None) -> Optional[Dict]:
+    """Transcribe a single audio file using Whisper (the CLI unless another engine is given)
+
+    With pcm_cache, the engine gets decoded samples from the cache instead of the MP3.
+    """
+    engine = engine or create_engine("cli", WHISPER_MODEL, WHISPER_LANGUAGE)
+    metrics = get_metrics()
+    with metrics.stage("transcribe", file=audio_path.name, engine=engine.method) as stage:
+        try:
+            print(f"Transcribing: {audio_path.name}")
+
+            audio = to_float(pcm_cache.load(audio_path)) if pcm_cache else audio_path
+            with metrics.profile("transcribe", audio_path.name):
+                transcription_data = engine.transcribe(audio)
+            transcript_data = build_transcript_data(audio_path, transcription_data, engine.method)
+            stage["audio_seconds"] = transcript_data["metadata"].get("audio_duration")
+
+            print(f"✓ Transcribed: {audio_path.name} ({transcript_data['quality_metrics']['word_count']} words)")
+            return transcript_data
+
+        except subprocess.CalledProcessError as e:
+            print(f"✗ Whisper failed for {audio_path.name}: {e}")
+            stage["error"] = f"whisper exited {e.returncode}: {(e.stderr or '').strip()[-500:]}"
+            return None
+        except FileNotFoundError as e:
+            print(f"✗ No output found for {audio_path.name}: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return None
+        except json.JSONDecodeError as e:
+            print(f"✗ Invalid JSON output for {audio_path.name}: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return None
+        except Exception as e:
+            print(f"✗ Unexpected error for {audio_path.name}: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return None
 
-def save_transcript(transcript_data: Dict, output_path: Path):
-    """Save transcript to structured JSON file"""
-    try:
-        # Create output directory if it doesn't exist
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+def save_transcript(transcript_data: Dict, output_path: Path) -> bool:
+    """Save transcript to structured JSON (or .segs / .ndjson) file"""
+    with get_metrics().stage("serialize", file=output_path.name) as stage:
+        try:
+            # Creates the output directory and picks the format from the suffix
+            save_transcript_file(transcript_data, output_path)
+            stage["bytes"] = output_path.stat().st_size
+            stage["segments"] = len(transcript_data["transcript"]["segments"])
 
-        # Write JSON file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_data, f, indent=2, ensure_ascii=False)
+            print(f"✓ Saved transcript: {output_path}")
+            return True
 
-        print(f"✓ Saved transcript: {output_path}")
+        except Exception as e:
+            print(f"✗ Failed to save transcript {output_path}: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return False
 
-    except Exception as e:
-        print(f"✗ Failed to save transcript {output_path}: {e}")
-
-def organize_by_show_and_year(audio_file: Path, transcript_data: Dict) -> Path:
+def organize_by_show_and_year(audio_file: Path, transcript_data: Dict, suffix: str = ".json") -> Path:
     """Organize transcript into appropriate folder structure"""
     show = transcript_data["metadata"]["show"].lower().replace(" ", "-")
     topic = transcript_data["metadata"]["topic"].lower().replace(" ", "-")
@@ -161,20 +201,220 @@ def organize_by_show_and_year(audio_file: Path, transcript_data: Dict) -> Path:
 
     # Create output path
     output_dir = RAW_TRANSCRIPTS_DIR / show / year
-    filename = f"{show}_{year}_{topic}_raw.json"
+    filename = f"{show}_{year}_{topic}_raw{suffix}"
     output_path = output_dir / filename
 
     return output_path
 
-def main():
+def init_worker(engine_name: str, model_name: str, language: str, threads: int, use_pcm_cache: bool = False,
+                draft_model: Optional[str] = None):
+    """Load the transcription engine (both models, for a cascade) once per worker process"""
+    global _worker_engine, _worker_error, _worker_pcm_cache
+    if use_pcm_cache:
+        _worker_pcm_cache = PCMCache()
+    try:
+        engine = create_engine(engine_name, model_name, language, draft_model)
+        engine.load(threads)
+        _worker_engine = engine
+    except Exception as e:
+        # Raising here would make the pool respawn the worker forever,
+        # so remember the error and fail each job instead
+        _worker_error = f"{type(e).__name__}: {e}"
+
+def transcribe_in_worker(audio_path: Path) -> Tuple[Path, Optional[Dict], float]:
+    """Transcribe a single audio file with the worker's preloaded engine"""
+    started = time.monotonic()
+    if _worker_engine is None:
+        print(f"✗ Worker has no model for {audio_path.name}: {_worker_error}")
+        return audio_path, None, 0.0
+
+    return audio_path, transcribe_audio(audio_path, _worker_engine, _worker_pcm_cache), time.monotonic() - started
+
+def transcribe_chunk_in_worker(chunk: Tuple[int, float, np.ndarray]) -> Tuple[int, float, Optional[Dict]]:
+    """Transcribe one int16 PCM chunk with the worker's preloaded engine"""
+    index, offset, samples = chunk
+    if _worker_engine is None:
+        print(f"✗ Worker has no model for chunk {index}: {_worker_error}")
+        return index, offset, None
+
+    with get_metrics().stage("transcribe_chunk", file=f"chunk {index}", offset=offset,
+                             audio_seconds=len(samples) / 16000) as stage:
+        try:
+            audio = samples.astype(np.float32) / 32768.0
+            return index, offset, _worker_engine.transcribe(audio)
+        except Exception as e:
+            print(f"✗ Chunk {index} at {offset:.0f}s failed: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return index, offset, None
+
+def start_worker_pool(workers: int, engine: TranscriptionEngine, use_pcm_cache: bool = False,
+                      threads: Optional[int] = None):
+    """Pool of processes that each load `engine` once"""
+    # Split the cores between workers so they don't oversubscribe the CPU
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"Starting {workers} workers ({threads} threads each, {engine.method})")
+
+    # spawn rather than fork: torch does not survive forking reliably
+    ctx = multiprocessing.get_context("spawn")
+    return ctx.Pool(workers, initializer=init_worker,
+                    initargs=(engine.name, engine.model, engine.language, threads, use_pcm_cache,
+                              engine.draft_model))
+
+def iter_pool_transcriptions(audio_files: List[Path], workers: int, engine: TranscriptionEngine,
+                             use_pcm_cache: bool = False) -> Iterator[Tuple[Path, Optional[Dict], float]]:
+    """Transcribe files on a pool of warm workers, yielding results as they finish"""
+    with start_worker_pool(workers, engine, use_pcm_cache) as pool:
+        yield from pool.imap_unordered(transcribe_in_worker, audio_files)
+
+def iter_sequential_transcriptions(audio_files: List[Path], engine: TranscriptionEngine,
+                                   pcm_cache: Optional[PCMCache] = None) -> Iterator[Tuple[Path, Optional[Dict], float]]:
+    """Transcribe files one after another in this process"""
+    for i, audio_file in enumerate(audio_files, 1):
+        print(f"\n--- Processing {i}/{len(audio_files)} ---")
+        started = time.monotonic()
+        transcript_data = transcribe_audio(audio_file, engine, pcm_cache)
+        yield audio_file, transcript_data, time.monotonic() - started
+
+def partial_path_for(output_path: Path) -> Path:
+    """Where chunked mode keeps finished chunks until the transcript is saved"""
+    return output_path.with_name(output_path.name + ".partial.jsonl")
+
+def iter_chunked_transcriptions(audio_files: List[Path], workers: int, engine: TranscriptionEngine,
+                                suffix: str = ".json",
+                                pcm_cache: Optional[PCMCache] = None) -> Iterator[Tuple[Path, Optional[Dict], float]]:
+    """Transcribe files one at a time, splitting each into chunks spread across the worker pool"""
+    with start_worker_pool(workers, engine) as pool:
+        # Keep a couple of chunks queued per worker, no more, so memory stays bounded
+        map_chunks = lambda chunks: bounded_imap(pool, transcribe_chunk_in_worker, chunks, workers * 2)
+
+        for i, audio_file in enumerate(audio_files, 1):
+            print(f"\n--- Processing {i}/{len(audio_files)} (chunked) ---")
+            started = time.monotonic()
+            partial_path = partial_path_for(expected_output_path(audio_file, suffix))
+            with get_metrics().stage("transcribe", file=audio_file.name, engine=engine.method, chunked=True) as stage:
+                try:
+                    result = transcribe_chunked(audio_file, map_chunks, partial_path, pcm_cache=pcm_cache)
+                except Exception as e:
+                    print(f"✗ Unexpected error for {audio_file.name}: {e}")
+                    stage["error"] = f"{type(e).__name__}: {e}"
+                    result = None
+                if result:
+                    stage["audio_seconds"] = result.get("duration")
+                elif "error" not in stage:
+                    stage["error"] = "chunks failed"
+
+            transcript_data = build_transcript_data(audio_file, result, engine.method) if result else None
+            if transcript_data:
+                print(f"✓ Transcribed: {audio_file.name} ({transcript_data['quality_metrics']['word_count']} words)")
+            yield audio_file, transcript_data, time.monotonic() - started
+
+def iter_batched_transcriptions(audio_files: List[Path], engine: TranscriptionEngine, batch_size: int,
+                                max_wait: float = BATCH_MAX_WAIT_SECONDS,
+                                pcm_cache: Optional[PCMCache] = None) -> Iterator[Tuple[Path, Optional[Dict], float]]:
+    """Transcribe files in this process, decoding windows from several files per model call"""
+    print(f"Batching up to {batch_size} windows per call (max wait {max_wait:g}s)")
+    for audio_file, result, wall_time in transcribe_batched(audio_files, engine, batch_size, max_wait, pcm_cache):
+        transcript_data = build_transcript_data(audio_file, result, engine.method) if result else None
+        if transcript_data:
+            print(f"✓ Transcribed: {audio_file.name} ({transcript_data['quality_metrics']['word_count']} words)")
+        yield audio_file, transcript_data, wall_time
+
+def expected_output_path(audio_file: Path, suffix: str = ".json") -> Path:
+    """Where organize_by_show_and_year() will put this file's transcript"""
+    return organize_by_show_and_year(audio_file, {"metadata": extract_episode_info(audio_file.name)}, suffix)
+
+def adopt_existing_transcript(manifest: TranscriptionManifest, audio_file: Path, audio_hash: str,
+                              engine: TranscriptionEngine, suffix: str = ".json") -> bool:
+    """Record a _raw.json written before the manifest existed, if it matches this run"""
+    output_path = expected_output_path(audio_file, suffix)
+    if not output_path.exists():
+        return False
+
+    try:
+        metadata = load_transcript_file(output_path).get("metadata", {})
+    except (OSError, ValueError):
+        return False
+
+    if metadata.get("audio_file") != audio_file.name:
+        return False
+    if metadata.get("transcription_method") != engine.method:
+        return False
+
+    manifest.mark_done(audio_hash, engine.cache_key, engine.language, audio_file, output_path,
+                       audio_duration=metadata.get("audio_duration"))
+    return True
+
+def filter_pending(manifest: TranscriptionManifest, audio_files: List[Path], engine: TranscriptionEngine,
+                   suffix: str = ".json") -> Tuple[List[Path], Dict[Path, str]]:
+    """Drop files the manifest already has a transcript for; return the rest with their hashes"""
+    pending = []
+    hashes = {}
+    for audio_file in audio_files:
+        audio_hash = manifest.audio_hash(audio_file)
+        if manifest.is_done(audio_hash, engine.cache_key, engine.language):
+            continue
+        if adopt_existing_transcript(manifest, audio_file, audio_hash, engine, suffix):
+            print(f"✓ Found existing transcript: {audio_file.name}")
+            continue
+        pending.append(audio_file)
+        hashes[audio_file] = audio_hash
+    return pending, hashes
+
+def main(argv: Optional[List[str]] = None):
     """Main transcription function"""
+    global RAW_TRANSCRIPTS_DIR
     parser = argparse.ArgumentParser(description="Bulk transcribe Ray Peat audio files")
+    parser.add_argument("files", type=Path, nargs="*",
+                        help="Only these audio files (default: everything in the audio cache)")
     parser.add_argument("--limit", type=int, help="Limit number of files to process")
     parser.add_argument("--start-from", type=str, help="Start processing from specific file")
-    args = parser.parse_args()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes, each keeping a Whisper model loaded (default: 1)")
+    parser.add_argument("--engine", choices=list(ENGINES),
+                        help="Transcription backend (default: cli for a single unbatched worker without --cascade, whisper otherwise)")
+    parser.add_argument("--model", default=WHISPER_MODEL, help=f"Model name (default: {WHISPER_MODEL})")
+    parser.add_argument("--cascade", nargs="?", const=CASCADE_DRAFT_MODEL, metavar="DRAFT_MODEL",
+                        help=f"Transcribe with a fast draft model (default: {CASCADE_DRAFT_MODEL}) and redo only "
+                             "low-confidence segments with --model")
+    parser.add_argument("--output-dir", type=Path, default=RAW_TRANSCRIPTS_DIR,
+                        help="Where to write transcripts, e.g. a separate tree per engine for A/B runs")
+    parser.add_argument("--force", action="store_true",
+                        help="Retranscribe files the manifest already marks as done")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Split long files at silences and transcribe the chunks in parallel across --workers")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="Transcribe in this process, batching up to N 30-second windows from several files per model call (for short clips)")
+    parser.add_argument("--batch-wait", type=float, default=BATCH_MAX_WAIT_SECONDS,
+                        help=f"With --batch-size, max seconds a window waits for its batch to fill (default: {BATCH_MAX_WAIT_SECONDS:g})")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Transcribe every file, even ones fingerprinted as duplicates of another")
+    parser.add_argument("--format", choices=list(TRANSCRIPT_FORMATS), default="json",
+                        help="Transcript file format: pretty-printed JSON, compact segment store, "
+                             "or streaming NDJSON (default: json)")
+    parser.add_argument("--pcm-cache", action="store_true",
+                        help="Decode each file once into the shared PCM cache and transcribe from there (for model sweeps and re-runs)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Don't add new transcripts to the search index (e.g. for A/B output trees)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = configure_metrics(args)
+
+    RAW_TRANSCRIPTS_DIR = args.output_dir
+
+    # Modes that call the model many times keep it loaded in-process
+    pooled = args.workers > 1 or args.chunked or args.batch_size > 0 or args.cascade
+    # Shared per process, so repeat runs in one process (transcribr daemon) reuse a loaded model
+    engine = get_engine(args.engine or ("whisper" if pooled else "cli"), args.model, WHISPER_LANGUAGE,
+                        args.cascade)
 
     # Get audio files
-    audio_files = get_audio_files()
+    if args.files:
+        missing = [f for f in args.files if not f.is_file()]
+        if missing:
+            parser.error(f"no such audio file: {', '.join(map(str, missing))}")
+        audio_files = sorted(args.files)
+    else:
+        audio_files = get_audio_files(dedupe=not args.no_dedupe)
     if not audio_files:
         print("No audio files found in audio-cache directory")
         return
@@ -189,37 +429,81 @@ def main():
     if args.limit:
         audio_files = audio_files[:args.limit]
 
+    suffix = TRANSCRIPT_FORMATS[args.format]
+    manifest = TranscriptionManifest()
+    search_index = None if args.no_index else SearchIndex()
+    pcm_cache = PCMCache() if args.pcm_cache else None
+
+    # Skip anything already transcribed with this model and language
+    if args.force:
+        hashes = {f: manifest.audio_hash(f) for f in audio_files}
+    else:
+        total = len(audio_files)
+        audio_files, hashes = filter_pending(manifest, audio_files, engine, suffix)
+        print(f"Skipping {total - len(audio_files)} already transcribed files")
+
     print(f"Processing {len(audio_files)} files...")
 
     # Process files
     processed = 0
     successful = 0
 
-    for audio_file in audio_files:
-        print(f"\n--- Processing {processed + 1}/{len(audio_files)} ---")
+    print(f"Engine: {engine.method}")
+    if args.batch_size > 0:
+        results = iter_batched_transcriptions(audio_files, engine, args.batch_size, args.batch_wait, pcm_cache)
+    elif args.chunked:
+        results = iter_chunked_transcriptions(audio_files, max(1, args.workers), engine, suffix, pcm_cache)
+    elif args.workers > 1:
+        results = iter_pool_transcriptions(audio_files, args.workers, engine, args.pcm_cache)
+    else:
+        results = iter_sequential_transcriptions(audio_files, engine, pcm_cache)
 
-        # Transcribe audio
-        transcript_data = transcribe_audio(audio_file)
+    for audio_file, transcript_data, wall_time in results:
+        audio_hash = hashes[audio_file]
         if transcript_data:
             # Organize and save
-            output_path = organize_by_show_and_year(audio_file, transcript_data)
-            save_transcript(transcript_data, output_path)
-            successful += 1
+            output_path = organize_by_show_and_year(audio_file, transcript_data, suffix)
+            if save_transcript(transcript_data, output_path):
+                manifest.mark_done(audio_hash, engine.cache_key, engine.language, audio_file, output_path,
+                                   audio_duration=transcript_data["metadata"].get("audio_duration"),
+                                   wall_time=wall_time)
+                successful += 1
+                if not args.no_dedupe:
+                    record_duplicates(manifest, audio_file, output_path, engine)
+                # Finished chunks are only needed until the transcript is safely saved
+                partial_path = partial_path_for(output_path)
+                if partial_path.exists():
+                    partial_path.unlink()
+                if search_index:
+                    search_index.index_file(output_path)
+            else:
+                manifest.mark_failed(audio_hash, engine.cache_key, engine.language, audio_file,
+                                     wall_time=wall_time, error="save failed")
         else:
             print(f"✗ Failed to transcribe: {audio_file.name}")
+            manifest.mark_failed(audio_hash, engine.cache_key, engine.language, audio_file,
+                                 wall_time=wall_time, error="transcription failed")
 
         processed += 1
 
         # Progress update
         if processed % 10 == 0:
             print(f"\n--- Progress: {processed}/{len(audio_files)} files processed, {successful} successful ---")
+            if args.metrics_file:
+                metrics.write_prometheus(args.metrics_file)
 
-    print("
-=== Final Summary ===")
+    print("\n=== Final Summary ===")
     print(f"Total files processed: {processed}")
     print(f"Successful transcriptions: {successful}")
     print(f"Failed transcriptions: {processed - successful}")
-    print(f"Success rate: {(successful/processed)*100".1f"}%" if processed > 0 else "No files processed")
+    print(f"Success rate: {(successful/processed)*100:.1f}%" if processed > 0 else "No files processed")
+    manifest.close()
+    if search_index:
+        search_index.close()
+    if pcm_cache:
+        pcm_cache.close()
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
 
     if successful > 0:
         print(f"\nTranscripts saved to: {RAW_TRANSCRIPTS_DIR}")
@@ -227,6 +511,7 @@ def main():
         print("1. Run speaker diarization script")
         print("2. Apply transcript polishing")
         print("3. Organize final polished transcripts")
+        print("(python scripts/pipeline.py runs every stage, rebuilding only what is stale)")
 
 if __name__ == "__main__":
     main()
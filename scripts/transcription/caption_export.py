@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Caption Export for Ray Peat Transcripts
+Renders stored transcript segments as SRT, WebVTT, plain text, speaker-
+attributed Markdown and word-level JSON in a single pass over the
+segments, so new formats never need another Whisper run. Long segments
+are reflowed into captions of bounded line length and duration.
+"""
+
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from segment_store import read_transcript_stream
+from transcript_search import RAW_TRANSCRIPTS_DIR, TRANSCRIPT_PATTERN, episode_key, select_transcripts
+
+# Configuration
+EXPORT_DIR = Path("transcripts/exports")
+EXPORT_FORMATS = ("srt", "vtt", "txt", "md", "words")
+MAX_LINE_CHARS = 42          # common broadcast subtitle limit
+MAX_CUE_LINES = 2
+MAX_CUE_SECONDS = 7.0
+PARAGRAPH_GAP_SECONDS = 2.0  # plain text: a pause this long starts a new paragraph
+UNKNOWN_SPEAKER = "Unknown Speaker"
+
+# (start, end, lines)
+Cue = Tuple[float, float, List[str]]
+
+def format_time(seconds: float, separator: str = ".") -> str:
+    """HH:MM:SS.mmm (SRT wants a comma before the milliseconds)"""
+    ms = int(round(max(seconds, 0.0) * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{separator}{ms % 1000:03d}"
+
+def segment_speaker(segment: Dict) -> Optional[str]:
+    speaker = segment.get("speaker")
+    return speaker if speaker and speaker != UNKNOWN_SPEAKER else None
+
+def segment_words(segment: Dict) -> Iterator[Dict]:
+    """Timed words of a segment
+
+    Whisper's word timestamps are used when the transcript has them;
+    otherwise the segment's span is shared out by word length.
+    """
+    if segment.get("words"):
+        for word in segment["words"]:
+            text = word.get("word", "").strip()
+            if text:
+                yield {"word": text, "start": word["start"], "end": word["end"], "estimated": False}
+        return
+
+    words = segment.get("text", "").split()
+    start, end = segment.get("start", 0.0), segment.get("end", 0.0)
+    weight = sum(len(word) + 1 for word in words)
+    position = 0
+    for word in words:
+        word_start = start + (end - start) * position / weight
+        position += len(word) + 1
+        yield {"word": word, "start": round(word_start, 3),
+               "end": round(start + (end - start) * position / weight, 3), "estimated": True}
+
+def reflow(words: Iterator[Dict], max_chars: int = MAX_LINE_CHARS, max_lines: int = MAX_CUE_LINES,
+           max_seconds: float = MAX_CUE_SECONDS, first_line_reserve: int = 0) -> Iterator[Cue]:
+    """Pack timed words into cues of at most max_lines lines of max_chars, spanning at most max_seconds
+
+    first_line_reserve keeps that many characters of the first cue's first
+    line free, for a prefix the renderer adds (e.g. an SRT speaker tag). If
+    not even the first word fits beside it, the first line is left empty.
+    """
+    lines: List[List[str]] = [[]]
+    cue_start = cue_end = None
+    first_cue = True
+
+    for word in words:
+        text = word["word"]
+        if cue_start is not None:
+            line_length = sum(len(w) + 1 for w in lines[-1]) + len(text)
+            line_limit = max_chars - first_line_reserve if first_cue and len(lines) == 1 else max_chars
+            if word["end"] - cue_start > max_seconds:
+                yield cue_start, cue_end, [" ".join(line) for line in lines]
+                lines, cue_start, first_cue = [[]], None, False
+            elif lines[-1] and line_length > line_limit:
+                if len(lines) < max_lines:
+                    lines.append([])
+                else:
+                    yield cue_start, cue_end, [" ".join(line) for line in lines]
+                    lines, cue_start, first_cue = [[]], None, False
+
+        if cue_start is None:
+            cue_start = word["start"]
+            if first_cue and first_line_reserve and first_line_reserve + len(text) > max_chars and max_lines > 1:
+                lines.append([])
+        lines[-1].append(text)
+        cue_end = word["end"]
+
+    if cue_start is not None:
+        yield cue_start, cue_end, [" ".join(line) for line in lines]
+
+class Renderer:
+    """One output format; fed every segment in order, then closed"""
+
+    suffix = ""
+
+    def __init__(self, output: TextIO, metadata: Dict):
+        self.output = output
+        self.metadata = metadata
+
+    def first_line_reserve(self, segment: Dict) -> int:
+        """Characters this renderer will prefix to the first line of the segment's first cue"""
+        return 0
+
+    def segment(self, segment: Dict, words: List[Dict], cues: List[Cue]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class SRTRenderer(Renderer):
+    suffix = ".srt"
+
+    def __init__(self, output: TextIO, metadata: Dict):
+        super().__init__(output, metadata)
+        self.index = 0
+        self.speaker = None
+
+    def speaker_tag(self, segment: Dict) -> str:
+        """Name the speaker at each change of turn, as broadcast subtitles do"""
+        speaker = segment_speaker(segment)
+        return f"[{speaker}] " if speaker and speaker != self.speaker else ""
+
+    def first_line_reserve(self, segment: Dict) -> int:
+        return len(self.speaker_tag(segment))
+
+    def segment(self, segment: Dict, words: List[Dict], cues: List[Cue]):
+        speaker = segment_speaker(segment)
+        for start, end, lines in cues:
+            self.index += 1
+            tag = self.speaker_tag(segment)
+            if tag:
+                lines = [(tag + lines[0]).rstrip()] + lines[1:]
+            self.speaker = speaker
+            self.output.write(f"{self.index}\n{format_time(start, ',')} --> {format_time(end, ',')}\n")
+            self.output.write("\n".join(lines) + "\n\n")
+
+class VTTRenderer(Renderer):
+    suffix = ".vtt"
+
+    def __init__(self, output: TextIO, metadata: Dict):
+        super().__init__(output, metadata)
+        self.output.write("WEBVTT\n\n")
+
+    def segment(self, segment: Dict, words: List[Dict], cues: List[Cue]):
+        speaker = segment_speaker(segment)
+        for start, end, lines in cues:
+            self.output.write(f"{format_time(start)} --> {format_time(end)}\n")
+            text = "\n".join(lines)
+            self.output.write(f"<v {speaker}>{text}\n\n" if speaker else f"{text}\n\n")
+
+class TextRenderer(Renderer):
+    """Paragraphs split at speaker turns and long pauses"""
+
+    suffix = ".txt"
+
+    def __init__(self, output: TextIO, metadata: Dict):
+        super().__init__(output, metadata)
+        self.speaker = None
+        self.last_end = None
+
+    def segment(self, segment: Dict, words: List[Dict], cues: List[Cue]):
+        text = segment.get("text", "").strip()
+        if not text:
+            return
+        speaker = segment_speaker(segment)
+        if self.last_end is not None:
+            new_paragraph = speaker != self.speaker or segment.get("start", 0.0) - self.last_end >= PARAGRAPH_GAP_SECONDS
+            self.output.write("\n\n" if new_paragraph else " ")
+        self.output.write(text)
+        self.speaker = speaker
+        self.last_end = segment.get("end", 0.0)
+
+    def close(self):
+        if self.last_end is not None:
+            self.output.write("\n")
+
+class MarkdownRenderer(Renderer):
+    """Title, then one paragraph per speaker turn with its start time"""
+
+    suffix = ".md"
+
+    def __init__(self, output: TextIO, metadata: Dict):
+        super().__init__(output, metadata)
+        self.output.write(f"# {metadata.get('title') or metadata.get('audio_file') or 'Transcript'}\n\n")
+        details = [f"{label}: {metadata[key]}" for key, label in
+                   (("show", "Show"), ("audio_file", "Audio"), ("transcription_method", "Transcribed with"))
+                   if metadata.get(key)]
+        if details:
+            self.output.write("\n".join(f"*{detail}*  " for detail in details) + "\n\n")
+        self.turn = None
+
+    def segment(self, segment: Dict, words: List[Dict], cues: List[Cue]):
+        text = segment.get("text", "").strip()
+        if not text:
+            return
+        speaker = segment_speaker(segment) or UNKNOWN_SPEAKER
+        if speaker != self.turn:
+            if self.turn is not None:
+                self.output.write("\n\n")
+            timestamp = format_time(segment.get("start", 0.0)).split(".")[0]
+            self.output.write(f"**{speaker}** [{timestamp}]: {text}")
+            self.turn = speaker
+        else:
+            self.output.write(f" {text}")
+
+    def close(self):
+        if self.turn is not None:
+            self.output.write("\n")
+
+class WordsRenderer(Renderer):
+    """JSON array of timed words, written one line per word"""
+
+    suffix = ".words.json"
+
+    def __init__(self, output: TextIO, metadata: Dict):
+        super().__init__(output, metadata)
+        self.output.write("[")
+        self.first = True
+
+    def segment(self, segment: Dict, words: List[Dict], cues: List[Cue]):
+        speaker = segment_speaker(segment)
+        for word in words:
+            record = dict(word, speaker=speaker) if speaker else word
+            self.output.write(("\n" if self.first else ",\n") + json.dumps(record, ensure_ascii=False))
+            self.first = False
+
+    def close(self):
+        self.output.write("\n]\n")
+
+RENDERERS = {
+    "srt": SRTRenderer,
+    "vtt": VTTRenderer,
+    "txt": TextRenderer,
+    "md": MarkdownRenderer,
+    "words": WordsRenderer,
+}
+
+def export_basename(transcript_path: Path) -> str:
+    """Episode name without the _raw/_speakers suffix"""
+    match = TRANSCRIPT_PATTERN.search(transcript_path.name)
+    return transcript_path.name[:match.start()] if match else transcript_path.stem
+
+def export_paths(transcript_path: Path, formats: List[str], output_dir: Path = EXPORT_DIR) -> Dict[str, Path]:
+    """Output file per format, mirroring the show/year layout of the transcript trees"""
+    key = episode_key(transcript_path)
+    directory = output_dir / Path(key).parent if key else output_dir
+    name = export_basename(transcript_path)
+    return {fmt: directory / f"{name}{RENDERERS[fmt].suffix}" for fmt in formats}
+
+def export_transcript(transcript_path: Path, outputs: Dict[str, Path], max_chars: int = MAX_LINE_CHARS,
+                      max_seconds: float = MAX_CUE_SECONDS) -> int:
+    """Render every requested format in one pass over the segments; returns the segment count
+
+    Outputs are written next to their final names and renamed into place at
+    the end, so a failed export leaves no truncated files.
+    """
+    metadata, segments = read_transcript_stream(transcript_path)
+    tmp_paths = {fmt: path.with_name(path.name + ".tmp") for fmt, path in outputs.items()}
+    files = {}
+    try:
+        for fmt, tmp_path in tmp_paths.items():
+            tmp_path.parent.mkdir(parents=True, exist_ok=True)
+            files[fmt] = open(tmp_path, 'w', encoding='utf-8')
+        renderers = [RENDERERS[fmt](files[fmt], metadata) for fmt in outputs]
+
+        count = 0
+        for segment in segments:
+            words = list(segment_words(segment))
+            # Reflowed again only for renderers that prefix the first line (SRT at a speaker change)
+            cues = {}
+            for renderer in renderers:
+                reserve = renderer.first_line_reserve(segment)
+                if reserve not in cues:
+                    cues[reserve] = list(reflow(iter(words), max_chars, MAX_CUE_LINES, max_seconds, reserve))
+                renderer.segment(segment, words, cues[reserve])
+            count += 1
+        for renderer in renderers:
+            renderer.close()
+    except BaseException:
+        for fmt, f in files.items():
+            f.close()
+            tmp_paths[fmt].unlink()
+        raise
+
+    for fmt, f in files.items():
+        f.close()
+        tmp_paths[fmt].replace(outputs[fmt])
+    return count
+
+def export_job(transcript_path: Path, formats: List[str], output_dir: Path, max_chars: int, max_seconds: float,
+               force: bool = False) -> Tuple[Path, Optional[str]]:
+    """Pool entry point: returns (path, None) on success, (path, "skipped") or (path, error)"""
+    outputs = export_paths(transcript_path, formats, output_dir)
+    source_mtime = transcript_path.stat().st_mtime
+    if not force and all(path.exists() and path.stat().st_mtime >= source_mtime for path in outputs.values()):
+        return transcript_path, "skipped"
+    try:
+        export_transcript(transcript_path, outputs, max_chars, max_seconds)
+        return transcript_path, None
+    except Exception as e:
+        return transcript_path, f"{type(e).__name__}: {e}"
+
+def main():
+    """Export transcripts as captions and documents"""
+    parser = argparse.ArgumentParser(description="Export Ray Peat transcripts as SRT, WebVTT, text, Markdown or word JSON")
+    parser.add_argument("files", type=Path, nargs="*", help="Transcript files (default: every episode)")
+    parser.add_argument("--formats", default="srt,vtt",
+                        help=f"Comma-separated, from {', '.join(EXPORT_FORMATS)} (default: srt,vtt)")
+    parser.add_argument("--output-dir", type=Path, default=EXPORT_DIR, help=f"Default: {EXPORT_DIR}")
+    parser.add_argument("--max-chars", type=int, default=MAX_LINE_CHARS,
+                        help=f"Caption line length (default: {MAX_LINE_CHARS})")
+    parser.add_argument("--max-seconds", type=float, default=MAX_CUE_SECONDS,
+                        help=f"Longest caption on screen (default: {MAX_CUE_SECONDS:g})")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument("--force", action="store_true", help="Re-export files whose exports are newer than the transcript")
+    args = parser.parse_args()
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in RENDERERS]
+    if unknown:
+        parser.error(f"unknown format(s) {', '.join(unknown)}; expected {', '.join(EXPORT_FORMATS)}")
+
+    transcripts = args.files or select_transcripts()
+    if not transcripts:
+        print(f"No transcripts found under {RAW_TRANSCRIPTS_DIR.parent}")
+        return
+    print(f"Exporting {len(transcripts)} transcripts as {', '.join(formats)}...")
+
+    job = partial(export_job, formats=formats, output_dir=args.output_dir, max_chars=args.max_chars,
+                  max_seconds=args.max_seconds, force=args.force)
+    exported = skipped = failed = 0
+    if args.jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(job, transcripts, chunksize=8)
+    else:
+        executor = None
+        results = map(job, transcripts)
+
+    try:
+        for path, error in results:
+            if error is None:
+                exported += 1
+                print(f"✓ Exported: {export_basename(path)}")
+            elif error == "skipped":
+                skipped += 1
+            else:
+                failed += 1
+                print(f"✗ Failed to export {path}: {error}")
+    finally:
+        if executor:
+            executor.shutdown()
+
+    print(f"\n{exported} exported, {skipped} up to date, {failed} failed → {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Model Cascade for Ray Peat Transcription
+Transcribes with a fast draft model, flags the segments whose Whisper
+confidence signals (avg_logprob, no_speech_prob, compression_ratio) look
+poor, and re-transcribes only those time ranges with the large model.
+The results are spliced back into the draft, and every segment records
+which model produced it.
+"""
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from chunked_transcribe import decode_pcm_blocks, shift_segments
+from engines import SAMPLE_RATE, AudioInput, TranscriptionEngine
+from metrics import get_metrics
+from pcm_cache import to_float
+
+# Configuration
+CASCADE_DRAFT_MODEL = "small"
+# A draft segment is redone when any of these trips. Slightly stricter than
+# whisper.transcribe()'s own fallback thresholds (-1.0, 2.4, 0.6), since a
+# redo here costs seconds of large-model time rather than a whole episode
+ESCALATE_LOGPROB_BELOW = -0.8
+ESCALATE_COMPRESSION_ABOVE = 2.2
+ESCALATE_NO_SPEECH_ABOVE = 0.5
+ESCALATE_MERGE_GAP_SECONDS = 3.0  # flagged segments closer than this are redone as one range
+ESCALATE_PAD_SECONDS = 1.0        # audio context given to the large model either side of a range
+ESCALATE_WHOLE_FRACTION = 0.6     # past this share of the audio, redo the whole file instead
+ESCALATE_WINDOW_SECONDS = 30      # ranges up to this long share one batched large-model call
+
+# (start, end, reasons) on the draft's timeline
+Range = Tuple[float, float, List[str]]
+
+def flag_reasons(segment: Dict) -> List[str]:
+    """Which confidence signals of a draft segment are below par (empty if none)"""
+    reasons = []
+    if segment.get("avg_logprob", 0.0) < ESCALATE_LOGPROB_BELOW:
+        reasons.append("avg_logprob")
+    if segment.get("no_speech_prob", 0.0) > ESCALATE_NO_SPEECH_ABOVE:
+        reasons.append("no_speech_prob")
+    if segment.get("compression_ratio", 0.0) > ESCALATE_COMPRESSION_ABOVE:
+        reasons.append("compression_ratio")
+    return reasons
+
+def escalation_ranges(segments: List[Dict], merge_gap: float = ESCALATE_MERGE_GAP_SECONDS) -> List[Range]:
+    """Time ranges covering the flagged segments, neighbours within merge_gap merged"""
+    ranges: List[Range] = []
+    for segment in segments:
+        reasons = flag_reasons(segment)
+        if not reasons:
+            continue
+        start, end = segment.get("start", 0.0), segment.get("end", 0.0)
+        if ranges and start - ranges[-1][1] <= merge_gap:
+            previous_start, previous_end, previous_reasons = ranges[-1]
+            merged = previous_reasons + [reason for reason in reasons if reason not in previous_reasons]
+            ranges[-1] = (previous_start, max(previous_end, end), merged)
+        else:
+            ranges.append((start, end, reasons))
+    return ranges
+
+def splice(draft: Dict, redone: List[Tuple[Range, float, Dict]], draft_model: str, final_model: str) -> Dict:
+    """Replace the draft segments inside each range with the final model's segments
+
+    redone holds (range, offset of the audio slice, final model result).
+    A segment belongs to a range when its midpoint falls inside it, so the
+    padding the final model heard for context is not transcribed twice.
+    """
+    ranges = [span for span, _, _ in redone]
+
+    def inside(segment: Dict, start: float, end: float) -> bool:
+        return start <= (segment.get("start", 0.0) + segment.get("end", 0.0)) / 2 <= end
+
+    segments = [dict(segment, model=draft_model) for segment in draft.get("segments", [])
+                if not any(inside(segment, start, end) for start, end, _ in ranges)]
+
+    for (start, end, reasons), offset, result in redone:
+        for segment in shift_segments(result.get("segments", []), offset, 0):
+            if inside(segment, start, end):
+                segment["start"] = max(segment["start"], start)
+                segment["end"] = min(segment["end"], end)
+                segments.append(dict(segment, model=final_model, escalated=reasons))
+
+    segments.sort(key=lambda segment: segment.get("start", 0.0))
+    for i, segment in enumerate(segments):
+        segment["id"] = i
+
+    return {
+        "text": "".join(segment.get("text", "") for segment in segments),
+        "segments": segments,
+        "language": draft.get("language"),
+        "duration": draft.get("duration"),
+    }
+
+def with_model(result: Dict, model: str) -> Dict:
+    """Tag every segment of a single-model result with that model"""
+    result["segments"] = [dict(segment, model=model) for segment in result.get("segments", [])]
+    return result
+
+def cascade_summary(segments: List[Dict]) -> Optional[Dict]:
+    """Segments and seconds per model, or None for a transcript without per-segment provenance"""
+    if not any("model" in segment for segment in segments):
+        return None
+    summary = defaultdict(lambda: {"segments": 0, "seconds": 0.0})
+    for segment in segments:
+        entry = summary[segment.get("model", "unknown")]
+        entry["segments"] += 1
+        entry["seconds"] += segment.get("end", 0.0) - segment.get("start", 0.0)
+    return {model: dict(entry, seconds=round(entry["seconds"], 1)) for model, entry in summary.items()}
+
+class CascadeEngine(TranscriptionEngine):
+    """Draft engine for everything, final engine for the stretches the draft was unsure about
+
+    Built by engines.create_engine(..., draft_model=...); both engines are
+    the same backend, loaded in the same process.
+    """
+
+    def __init__(self, draft: TranscriptionEngine, final: TranscriptionEngine):
+        super().__init__(final.model, final.language)
+        self.name = final.name
+        self.draft_model = draft.model
+        self.draft = draft
+        self.final = final
+
+    @property
+    def method(self) -> str:
+        return f"{self.final.method} (cascade from {self.draft.model})"
+
+    @property
+    def cache_key(self) -> str:
+        return f"cascade:{self.draft.cache_key}>{self.final.cache_key}"
+
+    def load(self, threads: Optional[int] = None):
+        self.draft.load(threads)
+        self.final.load(threads)
+
+    def transcribe(self, audio: AudioInput) -> Dict:
+        draft = self.draft.transcribe(audio)
+        ranges = escalation_ranges(draft.get("segments", []))
+        if not ranges:
+            return with_model(draft, self.draft.model)
+
+        flagged = sum(end - start for start, end, _ in ranges)
+        duration = draft.get("duration") or ranges[-1][1]
+        if flagged > ESCALATE_WHOLE_FRACTION * duration:
+            with get_metrics().stage("escalate", ranges=len(ranges), audio_seconds=duration, whole=True):
+                return with_model(self.final.transcribe(audio), self.final.model)
+
+        # Only decoded when something needs redoing
+        samples = audio if isinstance(audio, np.ndarray) else load_samples(Path(audio))
+        return self._escalate([(draft, samples, ranges)])[0]
+
+    def transcribe_batch(self, windows: List[np.ndarray]) -> List[Dict]:
+        """Draft all windows in one call, then redo every window's flagged ranges in one more"""
+        drafts = self.draft.transcribe_batch(windows)
+        return self._escalate([(draft, window, escalation_ranges(draft.get("segments", [])))
+                               for draft, window in zip(drafts, windows)])
+
+    def _escalate(self, items: List[Tuple[Dict, np.ndarray, List[Range]]]) -> List[Dict]:
+        """Run the final model over the padded ranges of each (draft, samples, ranges) and splice"""
+        jobs = []
+        for item, (draft, samples, ranges) in enumerate(items):
+            for span in ranges:
+                first = max(0, int((span[0] - ESCALATE_PAD_SECONDS) * SAMPLE_RATE))
+                last = min(len(samples), int((span[1] + ESCALATE_PAD_SECONDS) * SAMPLE_RATE))
+                jobs.append((item, span, first / SAMPLE_RATE, samples[first:last]))
+        if not jobs:
+            return [with_model(draft, self.draft.model) for draft, _, _ in items]
+
+        window_samples = ESCALATE_WINDOW_SECONDS * SAMPLE_RATE
+        short = [job for job in jobs if len(job[3]) <= window_samples]
+        long = [job for job in jobs if len(job[3]) > window_samples]
+        results = {}
+        with get_metrics().stage("escalate", ranges=len(jobs),
+                                 audio_seconds=sum(len(job[3]) for job in jobs) / SAMPLE_RATE):
+            if short:
+                for job, result in zip(short, self.final.transcribe_batch([job[3] for job in short])):
+                    results[id(job)] = result
+            for job in long:
+                results[id(job)] = self.final.transcribe(job[3])
+
+        redone = defaultdict(list)
+        for job in jobs:
+            item, span, offset, _ = job
+            redone[item].append((span, offset, results[id(job)]))
+        return [splice(draft, redone[item], self.draft.model, self.final.model)
+                for item, (draft, _, _) in enumerate(items)]
+
+def load_samples(audio_path: Path) -> np.ndarray:
+    """Decode a whole file to float32 samples for slicing"""
+    return to_float(np.concatenate(list(decode_pcm_blocks(audio_path)) or [np.zeros(0, dtype=np.int16)]))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Chunked Transcription for Long Ray Peat Episodes
+Splits audio at quiet points into bounded windows, transcribes the windows in
+parallel and stitches the segments back together with global timestamps.
+Finished chunks are appended to a .partial.jsonl file so a failed or
+interrupted episode resumes from the last completed chunk.
+"""
+
+import json
+import subprocess
+from collections import Counter, deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Configuration
+SAMPLE_RATE = 16000          # Whisper's native input rate
+CHUNK_MAX_SECONDS = 300      # hard upper bound on a window
+CHUNK_SEARCH_SECONDS = 30    # look this far back from the bound for a quiet split point
+FRAME_SECONDS = 0.03         # energy frame size for silence detection
+SMOOTH_FRAMES = 10           # frames averaged when looking for the quietest point
+READ_BLOCK_SECONDS = 60      # how much PCM to pull from ffmpeg at a time
+
+# (chunk index, offset in seconds, int16 mono samples)
+Chunk = Tuple[int, float, np.ndarray]
+
+def decode_pcm_blocks(audio_path: Path, block_seconds: float = READ_BLOCK_SECONDS,
+                      sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """Stream mono int16 PCM (16 kHz by default) from ffmpeg in fixed-size blocks"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-i", str(audio_path),
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"
+    ]
+    block_bytes = int(block_seconds * sample_rate) * 2
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors="replace")
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed for {audio_path.name}: {stderr.strip()}")
+
+def find_split_point(samples: np.ndarray, search_from: int) -> int:
+    """Index of the quietest point in samples[search_from:], on a frame boundary"""
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    region = samples[search_from:].astype(np.float32)
+    frame_count = len(region) // frame
+    if frame_count == 0:
+        return len(samples)
+
+    frames = region[:frame_count * frame].reshape(frame_count, frame)
+    energy = np.sqrt(np.mean(frames * frames, axis=1))
+    if frame_count >= SMOOTH_FRAMES:
+        energy = np.convolve(energy, np.ones(SMOOTH_FRAMES) / SMOOTH_FRAMES, mode="same")
+
+    return search_from + int(np.argmin(energy)) * frame + frame // 2
+
+def split_at_silence(blocks: Iterable[np.ndarray], max_seconds: float = CHUNK_MAX_SECONDS,
+                     search_seconds: float = CHUNK_SEARCH_SECONDS) -> Iterator[Chunk]:
+    """Cut a PCM stream into windows of at most max_seconds, preferring quiet split points
+
+    Only one window plus one read block is held in memory at a time.
+    """
+    max_samples = int(max_seconds * SAMPLE_RATE)
+    search_samples = min(int(search_seconds * SAMPLE_RATE), max_samples // 2)
+
+    buffer = np.zeros(0, dtype=np.int16)
+    offset_samples = 0
+    index = 0
+
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) > max_samples:
+            split = find_split_point(buffer[:max_samples], max_samples - search_samples)
+            yield index, offset_samples / SAMPLE_RATE, buffer[:split]
+            buffer = buffer[split:]
+            offset_samples += split
+            index += 1
+
+    if len(buffer):
+        yield index, offset_samples / SAMPLE_RATE, buffer
+
+def iter_audio_chunks(audio_path: Path, max_seconds: float = CHUNK_MAX_SECONDS, pcm_cache=None) -> Iterator[Chunk]:
+    """Decode an audio file (or read it from a PCMCache) and split it into silence-bounded chunks"""
+    blocks = pcm_cache.blocks(audio_path) if pcm_cache else decode_pcm_blocks(audio_path)
+    return split_at_silence(blocks, max_seconds)
+
+def bounded_imap(pool, func: Callable, jobs: Iterable, max_in_flight: int) -> Iterator:
+    """Like pool.imap, but never pulls more than max_in_flight jobs ahead
+
+    Pool.imap drains its input eagerly, which would decode the whole
+    episode into memory before the first chunk finished.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.apply_async(func, (job,)))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+def shift_segments(segments: List[Dict], offset: float, first_id: int) -> List[Dict]:
+    """Move chunk-local segments onto the episode timeline"""
+    shifted = []
+    for i, segment in enumerate(segments):
+        segment = dict(segment)
+        segment["id"] = first_id + i
+        segment["start"] = round(segment.get("start", 0.0) + offset, 3)
+        segment["end"] = round(segment.get("end", 0.0) + offset, 3)
+        if "seek" in segment:
+            # seek is counted in 10 ms mel frames
+            segment["seek"] += int(round(offset * 100))
+        shifted.append(segment)
+    return shifted
+
+def stitch_chunks(chunk_results: Dict[int, Dict], duration: float) -> Dict:
+    """Combine per-chunk Whisper results into one Whisper-shaped result"""
+    segments = []
+    texts = []
+    languages = Counter()
+
+    for index in sorted(chunk_results):
+        result = chunk_results[index]
+        segments.extend(shift_segments(result["segments"], result["offset"], len(segments)))
+        texts.append(result.get("text", ""))
+        if result.get("language"):
+            languages[result["language"]] += 1
+
+    return {
+        "text": "".join(texts),
+        "segments": segments,
+        "language": languages.most_common(1)[0][0] if languages else None,
+        "duration": duration,
+    }
+
+def load_partial(partial_path: Path, source: Dict) -> Dict[int, Dict]:
+    """Completed chunks from an earlier run, if they were made from the same source and settings"""
+    if not partial_path or not partial_path.exists():
+        return {}
+
+    chunks = {}
+    with open(partial_path, 'r', encoding='utf-8') as f:
+        try:
+            header = json.loads(f.readline())
+        except json.JSONDecodeError:
+            return {}
+        if header != source:
+            return {}
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn final line from a crash; everything before it is fine
+                break
+            chunks[record["chunk"]] = record
+    return chunks
+
+def transcribe_chunked(audio_path: Path, map_chunks: Callable[[Iterable[Chunk]], Iterator[Tuple[int, float, Optional[Dict]]]],
+                       partial_path: Optional[Path] = None,
+                       max_seconds: float = CHUNK_MAX_SECONDS, pcm_cache=None) -> Optional[Dict]:
+    """Transcribe audio_path chunk by chunk
+
+    map_chunks receives an iterable of (index, offset, samples) and yields
+    (index, offset, whisper_result or None) in any order - typically a worker
+    pool. With partial_path set, each finished chunk is appended there as it
+    completes and reused on the next attempt. With pcm_cache, audio is read
+    from the decoded cache instead of ffmpeg. Returns a Whisper-style result
+    dict, or None if any chunk failed.
+    """
+    stat = audio_path.stat()
+    source = {"audio_file": audio_path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+              "max_seconds": max_seconds, "sample_rate": SAMPLE_RATE}
+
+    done = load_partial(partial_path, source)
+    if done:
+        print(f"Resuming {audio_path.name} with {len(done)} chunks already transcribed")
+
+    partial_file = None
+    if partial_path:
+        # Rewrite rather than append so a torn line from a crash doesn't stay in the middle
+        partial_path.parent.mkdir(parents=True, exist_ok=True)
+        partial_file = open(partial_path, 'w', encoding='utf-8')
+        partial_file.write(json.dumps(source) + "\n")
+        for index in sorted(done):
+            partial_file.write(json.dumps(done[index], ensure_ascii=False) + "\n")
+        partial_file.flush()
+
+    total_samples = 0
+    failed = 0
+
+    def pending_chunks() -> Iterator[Chunk]:
+        nonlocal total_samples
+        for index, offset, samples in iter_audio_chunks(audio_path, max_seconds, pcm_cache):
+            total_samples = int(offset * SAMPLE_RATE) + len(samples)
+            if index not in done:
+                yield index, offset, samples
+
+    try:
+        for index, offset, result in map_chunks(pending_chunks()):
+            if result is None:
+                failed += 1
+                continue
+            record = {"chunk": index, "offset": offset, "text": result.get("text", ""),
+                      "segments": result.get("segments", []), "language": result.get("language")}
+            done[index] = record
+            if partial_file:
+                partial_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                partial_file.flush()
+            print(f"  chunk {index} done ({offset / 60:.1f} min, {len(record['segments'])} segments)")
+    finally:
+        if partial_file:
+            partial_file.close()
+
+    if failed:
+        print(f"✗ {failed} chunks failed for {audio_path.name}; finished chunks kept in {partial_path}")
+        return None
+
+    return stitch_chunks(done, total_samples / SAMPLE_RATE)
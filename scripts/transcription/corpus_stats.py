@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Corpus Analytics for Ray Peat Transcripts
+Keeps a per-episode summary table (duration, words, speaker talk time, top
+terms) that is updated incrementally as transcripts change, so corpus-wide
+questions - hours per show, who talks how much, words per minute, top terms
+per year - are answered from a few thousand summary rows instead of
+re-reading every transcript.
+"""
+
+import re
+import json
+import sqlite3
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from segment_store import read_transcript_stream
+from transcript_search import RAW_TRANSCRIPTS_DIR, TRANSCRIPT_PATTERN, episode_key, select_transcripts
+
+# Configuration
+CORPUS_STATS_PATH = Path("transcripts/corpus-stats.sqlite")
+TERMS_PER_EPISODE = 300   # most frequent terms kept per episode for the vocabulary rollup
+MIN_TERM_LENGTH = 3
+UNKNOWN_SPEAKER = "Unknown Speaker"
+STOPWORDS = frozenset("""
+    about after again also always and any are because been before being but can could did does doing
+    don't down each even every from going gonna had has have having here how i'm into it's its just know
+    like more most much not now off once one only other our out over own really right same say says see
+    should some such than that that's the their them then there these they thing things think this those
+    through too under until very want was way well were what when where which while who why will with
+    would yeah yes you you're your
+""".split())
+
+WORD_PATTERN = re.compile(r"[a-z][a-z'-]*[a-z]")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    id INTEGER PRIMARY KEY,
+    episode TEXT UNIQUE NOT NULL,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    title TEXT,
+    show TEXT NOT NULL,
+    year TEXT NOT NULL,
+    duration REAL NOT NULL,
+    speech_seconds REAL NOT NULL,
+    words INTEGER NOT NULL,
+    segments INTEGER NOT NULL,
+    labeled_seconds REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS speakers (
+    episode_id INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    words INTEGER NOT NULL,
+    segments INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS speakers_episode ON speakers (episode_id);
+CREATE TABLE IF NOT EXISTS terms (
+    episode_id INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS terms_episode ON terms (episode_id);
+-- Rollup of terms per show and year, kept in step with the terms table
+CREATE TABLE IF NOT EXISTS term_totals (
+    show TEXT NOT NULL,
+    year TEXT NOT NULL,
+    term TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (show, year, term)
+);
+CREATE INDEX IF NOT EXISTS term_totals_year ON term_totals (year, count);
+"""
+
+def summarize_transcript(path: Path) -> Dict:
+    """One pass over a transcript's segments: totals, per-speaker talk time and top terms"""
+    metadata, segments = read_transcript_stream(path)
+    speakers = defaultdict(lambda: {"seconds": 0.0, "words": 0, "segments": 0})
+    terms = Counter()
+    words = count = 0
+    speech_seconds = labeled_seconds = last_end = 0.0
+
+    for segment in segments:
+        text = segment.get("text", "")
+        seconds = max(0.0, segment.get("end", 0.0) - segment.get("start", 0.0))
+        segment_words = len(text.split())
+        speaker = segment.get("speaker") or UNKNOWN_SPEAKER
+
+        entry = speakers[speaker]
+        entry["seconds"] += seconds
+        entry["words"] += segment_words
+        entry["segments"] += 1
+        if speaker != UNKNOWN_SPEAKER:
+            labeled_seconds += seconds
+
+        terms.update(term for term in WORD_PATTERN.findall(text.lower())
+                     if len(term) >= MIN_TERM_LENGTH and term not in STOPWORDS)
+        words += segment_words
+        speech_seconds += seconds
+        last_end = max(last_end, segment.get("end", 0.0))
+        count += 1
+
+    return {
+        "episode": episode_key(path),
+        "kind": TRANSCRIPT_PATTERN.search(path.name).group(1),
+        "title": metadata.get("title"),
+        "show": metadata.get("show") or path.parent.parent.name,
+        "year": path.parent.name,
+        "duration": metadata.get("audio_duration") or last_end,
+        "speech_seconds": speech_seconds,
+        "words": words,
+        "segments": count,
+        "labeled_seconds": labeled_seconds,
+        "speakers": dict(speakers),
+        "terms": terms.most_common(TERMS_PER_EPISODE),
+    }
+
+def summarize_job(path: Path) -> Tuple[Path, Optional[Dict], Optional[str]]:
+    """Pool entry point: (path, summary, None) or (path, None, error)"""
+    try:
+        return path, summarize_transcript(path), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+def group_sums(keys: np.ndarray, columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Sum each column per distinct key; returns (sorted keys, sums aligned with them)"""
+    groups, inverse = np.unique(keys, return_inverse=True)
+    return groups, {name: np.bincount(inverse, weights=values.astype(np.float64), minlength=len(groups))
+                    for name, values in columns.items()}
+
+def per_minute(words: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+    return np.divide(words * 60.0, seconds, out=np.zeros_like(words, dtype=np.float64), where=seconds > 0)
+
+class CorpusStats:
+    """SQLite summary tables over the transcript corpus, aggregated with NumPy"""
+
+    def __init__(self, path: Path = CORPUS_STATS_PATH):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stale(self, transcripts: List[Path]) -> Tuple[List[Path], List[int]]:
+        """Transcripts that are new or changed since they were summarized, and ids of vanished episodes"""
+        rows = {row["episode"]: row for row in
+                self.conn.execute("SELECT id, episode, path, size, mtime_ns FROM episodes")}
+        changed = []
+        current = set()
+        for path in transcripts:
+            episode = episode_key(path)
+            current.add(episode)
+            row = rows.get(episode)
+            stat = path.stat()
+            if row is None or row["path"] != str(path) or row["size"] != stat.st_size or row["mtime_ns"] != stat.st_mtime_ns:
+                changed.append(path)
+        removed = [row["id"] for episode, row in rows.items() if episode not in current]
+        return changed, removed
+
+    def _delete(self, episode_id: int):
+        """Drop an episode's rows and take its terms back out of the rollup"""
+        row = self.conn.execute("SELECT show, year FROM episodes WHERE id = ?", (episode_id,)).fetchone()
+        if row is None:
+            return
+        self.conn.execute(
+            "UPDATE term_totals SET count = count - (SELECT count FROM terms t WHERE t.episode_id = ? AND t.term = term_totals.term) "
+            "WHERE show = ? AND year = ? AND term IN (SELECT term FROM terms WHERE episode_id = ?)",
+            (episode_id, row["show"], row["year"], episode_id))
+        self.conn.execute("DELETE FROM term_totals WHERE show = ? AND year = ? AND count <= 0", (row["show"], row["year"]))
+        self.conn.execute("DELETE FROM terms WHERE episode_id = ?", (episode_id,))
+        self.conn.execute("DELETE FROM speakers WHERE episode_id = ?", (episode_id,))
+        self.conn.execute("DELETE FROM episodes WHERE id = ?", (episode_id,))
+
+    def remove(self, episode_ids: List[int]):
+        with self.conn:
+            for episode_id in episode_ids:
+                self._delete(episode_id)
+
+    def store(self, path: Path, summary: Dict):
+        """Replace the episode's summary rows with a fresh summary of path"""
+        stat = path.stat()
+        with self.conn:
+            row = self.conn.execute("SELECT id FROM episodes WHERE episode = ?", (summary["episode"],)).fetchone()
+            if row:
+                self._delete(row["id"])
+            cursor = self.conn.execute(
+                "INSERT INTO episodes (episode, path, kind, size, mtime_ns, title, show, year, duration, "
+                "speech_seconds, words, segments, labeled_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (summary["episode"], str(path), summary["kind"], stat.st_size, stat.st_mtime_ns, summary["title"],
+                 summary["show"], summary["year"], summary["duration"], summary["speech_seconds"], summary["words"],
+                 summary["segments"], summary["labeled_seconds"]))
+            episode_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO speakers (episode_id, speaker, seconds, words, segments) VALUES (?, ?, ?, ?, ?)",
+                ((episode_id, speaker, entry["seconds"], entry["words"], entry["segments"])
+                 for speaker, entry in summary["speakers"].items()))
+            self.conn.executemany("INSERT INTO terms (episode_id, term, count) VALUES (?, ?, ?)",
+                                  ((episode_id, term, count) for term, count in summary["terms"]))
+            self.conn.executemany(
+                "INSERT INTO term_totals (show, year, term, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (show, year, term) DO UPDATE SET count = count + excluded.count",
+                ((summary["show"], summary["year"], term, count) for term, count in summary["terms"]))
+
+    def _columns(self, sql: str, params: Tuple = ()) -> Dict[str, np.ndarray]:
+        """Query result as one NumPy array per column"""
+        cursor = self.conn.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+        values = list(zip(*rows)) if rows else [()] * len(names)
+        return {name: np.array(column) for name, column in zip(names, values)}
+
+    def _filter(self, show: Optional[str], year: Optional[str]) -> Tuple[str, Tuple]:
+        clauses, params = [], []
+        if show:
+            clauses.append("e.show LIKE ?")
+            params.append(f"%{show}%")
+        if year:
+            clauses.append("e.year = ?")
+            params.append(year)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), tuple(params)
+
+    def shows(self, by_year: bool = False, show: Optional[str] = None, year: Optional[str] = None) -> List[Dict]:
+        """Episodes, hours, words and speaking rate per show (and year)"""
+        where, params = self._filter(show, year)
+        columns = self._columns(
+            f"SELECT e.show, e.year, e.duration, e.speech_seconds, e.words, e.labeled_seconds FROM episodes e{where}",
+            params)
+        if not len(columns["show"]):
+            return []
+        keys = np.char.add(np.char.add(columns["show"].astype(str), "\t"), columns["year"].astype(str)) \
+            if by_year else columns["show"].astype(str)
+        groups, sums = group_sums(keys, {
+            "episodes": np.ones(len(keys)),
+            "duration": columns["duration"],
+            "speech_seconds": columns["speech_seconds"],
+            "words": columns["words"],
+            "labeled_seconds": columns["labeled_seconds"],
+        })
+        wpm = per_minute(sums["words"], sums["speech_seconds"])
+        labeled = np.divide(sums["labeled_seconds"], sums["speech_seconds"],
+                            out=np.zeros_like(wpm), where=sums["speech_seconds"] > 0)
+
+        rows = []
+        for i, key in enumerate(groups):
+            name, _, group_year = str(key).partition("\t")
+            row = {"show": name}
+            if by_year:
+                row["year"] = group_year
+            row.update(episodes=int(sums["episodes"][i]), hours=round(sums["duration"][i] / 3600, 1),
+                       words=int(sums["words"][i]), wpm=round(float(wpm[i]), 1),
+                       labeled=round(float(labeled[i]), 2))
+            rows.append(row)
+        return rows
+
+    def speakers(self, show: Optional[str] = None, year: Optional[str] = None, top: int = 20) -> List[Dict]:
+        """Talk time, share of speech and speaking rate per speaker label"""
+        where, params = self._filter(show, year)
+        columns = self._columns(
+            f"SELECT s.speaker, s.seconds, s.words, s.episode_id FROM speakers s JOIN episodes e ON e.id = s.episode_id{where}",
+            params)
+        if not len(columns["speaker"]):
+            return []
+        groups, sums = group_sums(columns["speaker"].astype(str), {
+            "seconds": columns["seconds"],
+            "words": columns["words"],
+            "episodes": np.ones(len(columns["speaker"])),  # one speakers row per speaker per episode
+        })
+        total = sums["seconds"].sum()
+        wpm = per_minute(sums["words"], sums["seconds"])
+        order = np.argsort(-sums["seconds"])[:top]
+        return [{
+            "speaker": str(groups[i]),
+            "episodes": int(sums["episodes"][i]),
+            "hours": round(sums["seconds"][i] / 3600, 1),
+            "share": round(float(sums["seconds"][i] / total), 3) if total else 0.0,
+            "words": int(sums["words"][i]),
+            "wpm": round(float(wpm[i]), 1),
+        } for i in order]
+
+    def terms(self, show: Optional[str] = None, year: Optional[str] = None, top: int = 20) -> List[Dict]:
+        """Most frequent terms, from the per-show/year rollup
+
+        Counts are sums of each episode's top TERMS_PER_EPISODE terms, which
+        is exact for anything an episode talks about more than in passing.
+        """
+        where, params = self._filter(show, year)
+        rows = self.conn.execute(
+            f"SELECT e.term, SUM(e.count) AS count FROM term_totals e{where} "
+            "GROUP BY e.term ORDER BY count DESC LIMIT ?", params + (top,))
+        return [{"term": row["term"], "count": row["count"]} for row in rows]
+
+def print_table(rows: List[Dict]):
+    """Left-aligned text columns, right-aligned numbers"""
+    if not rows:
+        print("No transcripts summarized yet (run: corpus_stats.py update)")
+        return
+    names = list(rows[0])
+    cells = [[str(row[name]) for name in names] for row in rows]
+    widths = [max(len(name), *(len(cell[i]) for cell in cells)) for i, name in enumerate(names)]
+    numeric = [isinstance(rows[0][name], (int, float)) for name in names]
+
+    def line(values):
+        return "  ".join(value.rjust(width) if right else value.ljust(width)
+                         for value, width, right in zip(values, widths, numeric))
+
+    print(line(names))
+    print(line(["-" * width for width in widths]))
+    for cell in cells:
+        print(line(cell))
+
+def main():
+    """Update or query the corpus summary tables"""
+    parser = argparse.ArgumentParser(description="Corpus-wide statistics over Ray Peat transcripts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", help="Summarize new and changed transcripts")
+    update_parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes (default: 1)")
+    update_parser.add_argument("--rebuild", action="store_true", help="Drop the summary tables and start over")
+
+    shows_parser = subparsers.add_parser("shows", help="Episodes, hours, words and words per minute per show")
+    shows_parser.add_argument("--by-year", action="store_true", help="One row per show and year")
+    speakers_parser = subparsers.add_parser("speakers", help="Talk time per speaker")
+    terms_parser = subparsers.add_parser("terms", help="Most frequent terms")
+    for query_parser in (shows_parser, speakers_parser, terms_parser):
+        query_parser.add_argument("--show", help="Only shows whose name contains this")
+        query_parser.add_argument("--year", help="Only this year")
+        query_parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    for query_parser in (speakers_parser, terms_parser):
+        query_parser.add_argument("--top", type=int, default=20, help="Number of rows (default: 20)")
+
+    args = parser.parse_args()
+
+    if args.command == "update":
+        if args.rebuild and CORPUS_STATS_PATH.exists():
+            CORPUS_STATS_PATH.unlink()
+
+        with CorpusStats() as stats:
+            transcripts = select_transcripts()
+            changed, removed = stats.stale(transcripts)
+            stats.remove(removed)
+            print(f"Summarizing {len(changed)} of {len(transcripts)} transcripts under {RAW_TRANSCRIPTS_DIR.parent}...")
+
+            updated = failed = 0
+            if args.jobs > 1:
+                executor = ProcessPoolExecutor(max_workers=args.jobs)
+                results = executor.map(summarize_job, changed, chunksize=8)
+            else:
+                executor = None
+                results = map(summarize_job, changed)
+            try:
+                # Summaries are computed in the workers, written here
+                for path, summary, error in results:
+                    if error is None:
+                        stats.store(path, summary)
+                        updated += 1
+                        print(f"✓ Summarized: {path}")
+                    else:
+                        failed += 1
+                        print(f"✗ Failed to summarize {path}: {error}")
+            finally:
+                if executor:
+                    executor.shutdown()
+
+        print(f"\n{updated} transcripts summarized, {len(transcripts) - len(changed)} unchanged, "
+              f"{failed} failed, {len(removed)} removed")
+        return
+
+    with CorpusStats() as stats:
+        if args.command == "shows":
+            rows = stats.shows(args.by_year, args.show, args.year)
+        elif args.command == "speakers":
+            rows = stats.speakers(args.show, args.year, args.top)
+        else:
+            rows = stats.terms(args.show, args.year, args.top)
+
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    else:
+        print_table(rows)
+
+if __name__ == "__main__":
+    main()
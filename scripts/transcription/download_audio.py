@@ -6,65 +6,247 @@ Downloads all audio files from the RSS feed to the audio-cache directory
 
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import argparse
+import threading
 import re
-from urllib.parse import urljoin, urlparse
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
 
 # RSS Feed URL
 RSS_URL = "https://www.toxinless.com/peat/podcast.rss"
 
-# Base URL for resolving relative links
-BASE_URL = "https://www.toxinless.com"
-
 # Output directory for audio files
 AUDIO_CACHE_DIR = Path("transcripts/audio-cache")
 
-def extract_audio_urls_from_rss():
-    """Extract all audio URLs from the RSS feed"""
-    print(f"Fetching RSS feed from {RSS_URL}...")
+# Parsed feed plus its ETag/Last-Modified, for conditional GETs
+FEED_INDEX_PATH = Path("transcripts/feed-index.json")
+
+# Which enclosure URL each cached filename belongs to
+SOURCES_PATH = AUDIO_CACHE_DIR / "sources.json"
+
+# Download settings
+DOWNLOAD_WORKERS = 4
+PER_HOST_CONNECTIONS = 2     # concurrent connections allowed to any one host
+PER_HOST_INTERVAL = 0.5      # minimum seconds between requests to one host
+CHUNK_SIZE = 256 * 1024
+REQUEST_TIMEOUT = (10, 60)   # connect, read
+
+class HostLimiter:
+    """Per-host politeness: caps concurrent connections and spaces out request starts"""
+
+    def __init__(self, connections: int = PER_HOST_CONNECTIONS, interval: float = PER_HOST_INTERVAL):
+        self.connections = connections
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(self.connections))
+
+        with semaphore:
+            # Reserve the next start time for this host, then sleep outside the lock
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+def create_session(pool_size: int = DOWNLOAD_WORKERS) -> "requests.Session":
+    """Shared keep-alive session sized for the worker pool"""
+    # requests is imported on first use: the offline paths (pipeline --offline, status) never need it
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def part_path_for(output_path: Path) -> Path:
+    """Path of the in-progress download for output_path"""
+    return output_path.with_name(output_path.name + ".part")
+
+def expected_total_size(response: "requests.Response", resume_from: int) -> Optional[int]:
+    """Full file size implied by a 200/206 response, if the server told us"""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        return resume_from + int(content_length)
+    return None
+
+def iter_feed_items(source) -> Iterator[Dict]:
+    """Stream RSS <item>s from a file-like object in a single pass"""
+    item = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if elem.tag == "item":
+                item = {"url": None, "title": "Unknown", "description": "", "pub_date": ""}
+            continue
 
-    try:
-        response = requests.get(RSS_URL)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching RSS feed: {e}")
-        return []
-
-    soup = BeautifulSoup(response.content, 'xml')
-    audio_urls = []
-
-    # Find all enclosure URLs (MP3 files)
-    for enclosure in soup.find_all('enclosure'):
-        audio_url = enclosure.get('url')
-        if audio_url and audio_url.endswith('.mp3'):
-            audio_urls.append(audio_url)
-
-    print(f"Found {len(audio_urls)} audio files in RSS feed")
-    return audio_urls
-
-def download_audio_file(url, output_path):
-    """Download a single audio file"""
-    try:
-        print(f"Downloading: {url}")
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-
-        print(f"✓ Downloaded: {output_path}")
-        return True
-
-    except requests.RequestException as e:
-        print(f"✗ Failed to download {url}: {e}")
-        return False
-    except IOError as e:
-        print(f"✗ Failed to write file {output_path}: {e}")
-        return False
+        if item is None:
+            # Channel-level element; drop it so the tree doesn't grow
+            if elem.tag != "channel":
+                elem.clear()
+            continue
+
+        # Only plain RSS tags; itunes:title and friends are namespaced
+        if elem.tag == "title":
+            item["title"] = elem.text or "Unknown"
+        elif elem.tag == "description":
+            item["description"] = elem.text or ""
+        elif elem.tag == "pubDate":
+            item["pub_date"] = elem.text or ""
+        elif elem.tag == "enclosure" and item["url"] is None:
+            item["url"] = elem.get("url")
+        elif elem.tag == "item":
+            if item["url"] and item["url"].endswith(".mp3"):
+                yield item
+            item = None
+            elem.clear()
+
+def load_feed_index() -> Dict:
+    """Load the cached feed index, or an empty one"""
+    if FEED_INDEX_PATH.exists():
+        try:
+            with open(FEED_INDEX_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable feed index {FEED_INDEX_PATH}: {e}")
+    return {"etag": None, "last_modified": None, "episodes": []}
+
+def save_feed_index(index: Dict):
+    """Write the feed index atomically"""
+    FEED_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = FEED_INDEX_PATH.with_name(FEED_INDEX_PATH.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, FEED_INDEX_PATH)
+
+def fetch_feed_episodes(session=None, use_cache: bool = True) -> Tuple[List[Dict], int]:
+    """Return (all episodes, number of new episodes) from the RSS feed
+
+    Sends a conditional GET using the cached ETag/Last-Modified; a 304
+    reuses the cached episode list without downloading or parsing the feed.
+    """
+    import requests
+
+    session = session or requests
+    index = load_feed_index() if use_cache else {"etag": None, "last_modified": None, "episodes": []}
+
+    headers = {}
+    if index["episodes"]:
+        if index.get("etag"):
+            headers["If-None-Match"] = index["etag"]
+        if index.get("last_modified"):
+            headers["If-Modified-Since"] = index["last_modified"]
+
+    print(f"Fetching RSS feed from {RSS_URL}...")
+    with get_metrics().stage("fetch", file=RSS_URL) as stage:
+        try:
+            with session.get(RSS_URL, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                stage["status"] = response.status_code
+                if response.status_code == 304:
+                    print(f"Feed not modified, {len(index['episodes'])} episodes in cached index")
+                    return index["episodes"], 0
+
+                response.raise_for_status()
+                response.raw.decode_content = True
+                episodes = list(iter_feed_items(response.raw))
+                stage["episodes"] = len(episodes)
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except requests.RequestException as e:
+            print(f"Error fetching RSS feed: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return index["episodes"], 0
+        except ET.ParseError as e:
+            print(f"Error parsing RSS feed: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return index["episodes"], 0
+
+    known_urls = {episode["url"] for episode in index["episodes"]}
+    new_count = sum(1 for episode in episodes if episode["url"] not in known_urls)
+
+    save_feed_index({"etag": etag, "last_modified": last_modified, "episodes": episodes})
+    print(f"Found {len(episodes)} audio files in RSS feed ({new_count} new)")
+    return episodes, new_count
+
+def download_audio_file(url, output_path, session=None, limiter=None):
+    """Download a single audio file via a .part file, resuming if one exists"""
+    import requests
+
+    session = session or requests
+    limiter = limiter or HostLimiter()
+    part_path = part_path_for(output_path)
+
+    with get_metrics().stage("download", file=output_path.name, host=urlparse(url).netloc) as stage:
+        try:
+            resume_from = part_path.stat().st_size if part_path.exists() else 0
+            headers = {"Range": f"bytes={resume_from}-"} if resume_from else {}
+
+            with limiter.slot(url):
+                print(f"Downloading: {url}" + (f" (resuming at {resume_from} bytes)" if resume_from else ""))
+                response = session.get(url, stream=True, headers=headers, timeout=REQUEST_TIMEOUT)
+
+                with response:
+                    if response.status_code == 416 and resume_from:
+                        # Nothing left to fetch; the .part may already be complete
+                        expected = expected_total_size(response, resume_from)
+                        if expected != resume_from:
+                            part_path.unlink()
+                            print(f"✗ Stale partial download removed, retry later: {part_path}")
+                            stage["error"] = "stale partial download"
+                            return False
+                    else:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            # Server ignored the Range header, start over
+                            resume_from = 0
+                        expected = expected_total_size(response, resume_from)
+
+                        with open(part_path, 'ab' if resume_from else 'wb') as f:
+                            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                                f.write(chunk)
+
+            size = part_path.stat().st_size
+            stage["bytes"] = size - resume_from
+            stage["resumed_from"] = resume_from
+            if expected is not None and size != expected:
+                print(f"✗ Incomplete download {output_path.name}: {size}/{expected} bytes, kept for resume")
+                stage["error"] = f"incomplete: {size}/{expected} bytes"
+                return False
+
+            os.replace(part_path, output_path)
+            print(f"✓ Downloaded: {output_path}")
+            return True
+
+        except requests.RequestException as e:
+            print(f"✗ Failed to download {url}: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return False
+        except IOError as e:
+            print(f"✗ Failed to write file {output_path}: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return False
 
 def sanitize_filename(filename):
     """Sanitize filename to be filesystem-safe"""
@@ -74,86 +256,119 @@ def sanitize_filename(filename):
     filename = re.sub(r'\s+', '_', filename)
     return filename
 
-def extract_episode_info_from_rss():
-    """Extract episode metadata from RSS feed for better file naming"""
-    print("Extracting episode metadata from RSS feed...")
-
-    try:
-        response = requests.get(RSS_URL)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching RSS feed: {e}")
-        return {}
-
-    soup = BeautifulSoup(response.content, 'xml')
-    episodes = {}
-
-    # Parse each item in the RSS feed
-    for item in soup.find_all('item'):
-        title = item.find('title').text if item.find('title') else "Unknown"
-        audio_url = None
+def load_sources() -> Dict[str, str]:
+    """Filename → enclosure URL map for the audio cache"""
+    if SOURCES_PATH.exists():
+        with open(SOURCES_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_sources(sources: Dict[str, str]):
+    SOURCES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = SOURCES_PATH.with_name(SOURCES_PATH.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(sources, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, SOURCES_PATH)
+
+def assign_filenames(episodes: List[Dict], sources: Dict[str, str]) -> Dict[str, str]:
+    """Pick a cache filename per enclosure URL without letting two URLs share one
+
+    Titles are the preferred name. When a title sanitizes to a name already
+    claimed by a different URL, the later URL gets a short hash of its URL
+    appended. Claims are recorded in sources, so names stay stable across runs.
+    """
+    filename_for_url = {url: filename for filename, url in sources.items()}
+    assigned = {}
+
+    for episode in episodes:
+        url = episode["url"]
+        if url in filename_for_url:
+            assigned[url] = filename_for_url[url]
+            continue
 
-        # Find the audio URL in enclosure
-        enclosure = item.find('enclosure')
-        if enclosure:
-            audio_url = enclosure.get('url')
+        base = sanitize_filename(episode["title"])
+        filename = base + ".mp3"
+        owner = sources.get(filename)
+        if owner is not None and owner != url:
+            filename = f"{base}_{hashlib.sha1(url.encode()).hexdigest()[:8]}.mp3"
+            print(f"! Title collision for {base}.mp3, saving {url} as {filename}")
 
-        if audio_url:
-            episodes[audio_url] = {
-                'title': title,
-                'description': item.find('description').text if item.find('description') else "",
-                'pub_date': item.find('pubDate').text if item.find('pubDate') else "",
-            }
+        sources[filename] = url
+        filename_for_url[url] = filename
+        assigned[url] = filename
 
-    return episodes
+    return assigned
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main download function"""
+    parser = argparse.ArgumentParser(description="Download Ray Peat audio files from the RSS feed")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Concurrent downloads (default: {DOWNLOAD_WORKERS})")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_CONNECTIONS,
+                        help=f"Max concurrent connections per host (default: {PER_HOST_CONNECTIONS})")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore the cached feed index and re-fetch the whole feed")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = configure_metrics(args)
+
     # Create audio cache directory
     AUDIO_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-    # Extract audio URLs from RSS
-    audio_urls = extract_audio_urls_from_rss()
-    if not audio_urls:
+    session = create_session(args.workers)
+
+    # Fetch and parse the RSS feed once for URLs and metadata
+    episodes, _ = fetch_feed_episodes(session, use_cache=not args.refresh)
+    if not episodes:
         print("No audio URLs found. Exiting.")
         return
 
-    # Extract episode metadata for better naming
-    episode_info = extract_episode_info_from_rss()
+    audio_urls = [episode["url"] for episode in episodes]
 
     print(f"\nStarting download of {len(audio_urls)} audio files...")
 
     downloaded = 0
     failed = 0
+    existing = 0
+    jobs = []
 
-    for i, url in enumerate(audio_urls, 1):
-        print(f"\n[{i}/{len(audio_urls)}] Processing: {url}")
+    # Sanitized titles, made unique per URL
+    sources = load_sources()
+    filenames = assign_filenames(episodes, sources)
+    save_sources(sources)
 
-        # Get episode info for this URL
-        info = episode_info.get(url, {})
-        title = info.get('title', 'Unknown_Title')
+    for episode in episodes:
+        url = episode["url"]
+        output_path = AUDIO_CACHE_DIR / filenames[url]
 
-        # Create a sanitized filename
-        filename = sanitize_filename(title) + ".mp3"
-        output_path = AUDIO_CACHE_DIR / filename
-
-        # Skip if file already exists
+        # Skip if file already exists (only complete downloads get renamed into place)
         if output_path.exists():
-            print(f"✓ File already exists: {output_path}")
+            existing += 1
             downloaded += 1
             continue
 
-        # Download the file
-        if download_audio_file(url, output_path):
-            downloaded += 1
-        else:
-            failed += 1
+        jobs.append((url, output_path))
+
+    print(f"✓ {existing} files already downloaded, {len(jobs)} to fetch")
+    limiter = HostLimiter(connections=args.per_host)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(download_audio_file, url, output_path, session, limiter): url
+            for url, output_path in jobs
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            if future.result():
+                downloaded += 1
+            else:
+                failed += 1
+            print(f"[{i}/{len(jobs)}] done, {failed} failed so far")
 
-        # Add a small delay to be respectful to the server
-        time.sleep(0.5)
+    session.close()
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
 
-    print("
-=== Download Summary ===")
+    print("\n=== Download Summary ===")
     print(f"Successfully downloaded: {downloaded} files")
     print(f"Failed downloads: {failed} files")
     print(f"Total processed: {len(audio_urls)} files")
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Transcription Engines for Ray Peat Podcast Collection
+Common interface over the whisper CLI and in-process Whisper backends so a
+run can pick its engine and A/B engines on the same corpus
+"""
+
+import json
+import subprocess
+import tempfile
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FASTER_WHISPER_COMPUTE_TYPE = "int8"  # int8 CTranslate2 is the fast path on CPU
+# whisper.transcribe()'s fallback thresholds, applied to batched windows
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# A file path, or 16 kHz mono float32 samples in [-1, 1]
+AudioInput = Union[Path, np.ndarray]
+
+def with_duration(result: Dict) -> Dict:
+    """Fill in duration from the last segment when the backend doesn't report it"""
+    if result.get("duration") is None and result.get("segments"):
+        result["duration"] = result["segments"][-1]["end"]
+    return result
+
+class TranscriptionEngine:
+    """Base class: load() once per process, then transcribe() many times"""
+
+    name = "base"
+    draft_model: Optional[str] = None  # set on cascades (see cascade.py)
+
+    def __init__(self, model: str, language: str):
+        self.model = model
+        self.language = language
+
+    @property
+    def method(self) -> str:
+        """Recorded as metadata.transcription_method"""
+        raise NotImplementedError
+
+    @property
+    def cache_key(self) -> str:
+        """Model identity for the manifest; engines with identical output share a key"""
+        return self.model
+
+    def load(self, threads: Optional[int] = None):
+        """Load the model; heavy imports happen here, not at construction"""
+
+    def transcribe(self, audio: AudioInput) -> Dict:
+        """Return a Whisper-style result: text, segments, language, duration"""
+        raise NotImplementedError
+
+    def transcribe_batch(self, windows: List[np.ndarray]) -> List[Dict]:
+        """Transcribe several short (<= 30 s) sample windows, one result per window
+
+        Engines that can share a model call or forward pass across windows
+        override this; the default just loops.
+        """
+        return [self.transcribe(window) for window in windows]
+
+class WhisperCLIEngine(TranscriptionEngine):
+    """Shells out to the whisper CLI (reloads the model on every call)"""
+
+    name = "cli"
+
+    @property
+    def method(self) -> str:
+        return f"OpenAI Whisper {self.model}"
+
+    def transcribe(self, audio: AudioInput) -> Dict:
+        # A private output directory per call, so overlapping runs can't pick up each other's JSON
+        with tempfile.TemporaryDirectory(prefix="whisper-") as tmp:
+            tmp_dir = Path(tmp)
+            if isinstance(audio, np.ndarray):
+                audio_path = tmp_dir / "chunk.wav"
+                write_wav(audio, audio_path)
+            else:
+                audio_path = Path(audio)
+
+            cmd = [
+                "whisper",
+                str(audio_path),
+                "--model", self.model,
+                "--output_format", "json",
+                "--output_dir", str(tmp_dir),
+                "--language", self.language,
+                "--verbose", "False"
+            ]
+            subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+            json_file = tmp_dir / (audio_path.stem + ".json")
+            with open(json_file, 'r', encoding='utf-8') as f:
+                return with_duration(json.load(f))
+
+    def transcribe_batch(self, windows: List[np.ndarray]) -> List[Dict]:
+        # The CLI takes several files per invocation, so the model loads once per batch
+        with tempfile.TemporaryDirectory(prefix="whisper-") as tmp:
+            tmp_dir = Path(tmp)
+            paths = [tmp_dir / f"window-{i:04d}.wav" for i in range(len(windows))]
+            for window, path in zip(windows, paths):
+                write_wav(window, path)
+
+            cmd = [
+                "whisper", *map(str, paths),
+                "--model", self.model,
+                "--output_format", "json",
+                "--output_dir", str(tmp_dir),
+                "--language", self.language,
+                "--verbose", "False"
+            ]
+            subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+            results = []
+            for path in paths:
+                with open(path.with_suffix(".json"), 'r', encoding='utf-8') as f:
+                    results.append(with_duration(json.load(f)))
+            return results
+
+class WhisperPythonEngine(TranscriptionEngine):
+    """openai-whisper's Python API, model kept in memory between calls
+
+    Same model and decoder as the CLI, so it shares the CLI's manifest key.
+    """
+
+    name = "whisper"
+
+    def __init__(self, model: str, language: str):
+        super().__init__(model, language)
+        self._model = None
+
+    @property
+    def method(self) -> str:
+        return f"OpenAI Whisper {self.model} (python)"
+
+    def load(self, threads: Optional[int] = None):
+        import torch
+        import whisper
+
+        if threads:
+            torch.set_num_threads(threads)
+        self._model = whisper.load_model(self.model)
+
+    def transcribe(self, audio: AudioInput) -> Dict:
+        if self._model is None:
+            self.load()
+        source = audio if isinstance(audio, np.ndarray) else str(audio)
+        return with_duration(self._model.transcribe(source, language=self.language, verbose=None))
+
+    def transcribe_batch(self, windows: List[np.ndarray]) -> List[Dict]:
+        """Decode all windows in one batched forward pass
+
+        Windows whose batched decode trips transcribe()'s quality thresholds
+        are redone individually, which retries at higher temperatures.
+        """
+        import torch
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+
+        if self._model is None:
+            self.load()
+        model = self._model
+        n_mels = getattr(model.dims, "n_mels", 80)
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(np.ascontiguousarray(window))), n_mels)
+            for window in windows
+        ]).to(model.device)
+
+        options = whisper.DecodingOptions(language=self.language, fp16=model.device.type == "cuda")
+        decoded = whisper.decode(model, mel, options)
+        # Newer whisper releases size the tokenizer by the model's language count (large-v3)
+        extra = {"num_languages": model.num_languages} if hasattr(model, "num_languages") else {}
+        tokenizer = get_tokenizer(model.is_multilingual, language=self.language, task="transcribe", **extra)
+
+        results = []
+        for window, result in zip(windows, decoded):
+            duration = len(window) / SAMPLE_RATE
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                results.append({"text": "", "segments": [], "language": result.language, "duration": duration})
+            elif (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                  or result.avg_logprob < LOGPROB_THRESHOLD):
+                results.append(self.transcribe(window))
+            else:
+                results.append({
+                    "text": result.text,
+                    "segments": timestamped_segments(result, tokenizer, duration),
+                    "language": result.language,
+                    "duration": duration,
+                })
+        return results
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """faster-whisper (CTranslate2) on CPU, int8-quantized by default"""
+
+    name = "faster-whisper"
+
+    def __init__(self, model: str, language: str, compute_type: str = FASTER_WHISPER_COMPUTE_TYPE):
+        super().__init__(model, language)
+        self.compute_type = compute_type
+        self._model = None
+
+    @property
+    def method(self) -> str:
+        return f"faster-whisper {self.model} ({self.compute_type})"
+
+    @property
+    def cache_key(self) -> str:
+        return f"faster-whisper:{self.model}:{self.compute_type}"
+
+    def load(self, threads: Optional[int] = None):
+        from faster_whisper import WhisperModel
+
+        self._model = WhisperModel(self.model, device="cpu", compute_type=self.compute_type,
+                                   cpu_threads=threads or 0)
+
+    def transcribe(self, audio: AudioInput) -> Dict:
+        if self._model is None:
+            self.load()
+        source = audio if isinstance(audio, np.ndarray) else str(audio)
+        segments_iter, info = self._model.transcribe(source, language=self.language)
+
+        # faster-whisper yields lazily; convert to the openai-whisper segment shape
+        segments = []
+        for segment in segments_iter:
+            segments.append({
+                "id": segment.id,
+                "seek": segment.seek,
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text,
+                "tokens": list(segment.tokens),
+                "temperature": getattr(segment, "temperature", None),
+                "avg_logprob": segment.avg_logprob,
+                "compression_ratio": segment.compression_ratio,
+                "no_speech_prob": segment.no_speech_prob,
+            })
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": info.language,
+            "duration": info.duration,
+        }
+
+ENGINES = {
+    WhisperCLIEngine.name: WhisperCLIEngine,
+    WhisperPythonEngine.name: WhisperPythonEngine,
+    FasterWhisperEngine.name: FasterWhisperEngine,
+}
+
+def create_engine(name: str, model: str, language: str, draft_model: Optional[str] = None) -> TranscriptionEngine:
+    """Build an (unloaded) engine by name
+
+    With draft_model, a cascade: draft_model transcribes everything and
+    model redoes only the low-confidence stretches.
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name!r}, expected one of: {', '.join(ENGINES)}")
+    if draft_model:
+        from cascade import CascadeEngine
+
+        return CascadeEngine(ENGINES[name](draft_model, language), ENGINES[name](model, language))
+    return ENGINES[name](model, language)
+
+_engines: Dict[Tuple, TranscriptionEngine] = {}
+
+def get_engine(name: str, model: str, language: str, draft_model: Optional[str] = None) -> TranscriptionEngine:
+    """Shared engine per configuration, so a long-lived process (transcribr daemon) loads each model once"""
+    key = (name, model, language, draft_model)
+    if key not in _engines:
+        _engines[key] = create_engine(name, model, language, draft_model)
+    return _engines[key]
+
+def timestamped_segments(result, tokenizer, duration: float) -> List[Dict]:
+    """Split a whisper DecodingResult at its timestamp tokens into openai-whisper segments"""
+    segments = []
+    start = None
+    text_tokens = []
+    for token in result.tokens:
+        if token < tokenizer.timestamp_begin:
+            text_tokens.append(token)
+            continue
+        time = (token - tokenizer.timestamp_begin) * 0.02
+        if start is not None and text_tokens:
+            segments.append((start, time, text_tokens))
+            start, text_tokens = None, []
+        else:
+            start = time
+    if text_tokens:
+        # No closing timestamp: the text runs to the end of the window
+        segments.append((start or 0.0, duration, text_tokens))
+
+    return [{
+        "id": i,
+        "seek": 0,
+        "start": round(start, 3),
+        "end": round(min(end, duration), 3),
+        "text": tokenizer.decode(tokens),
+        "tokens": tokens,
+        "temperature": result.temperature,
+        "avg_logprob": result.avg_logprob,
+        "compression_ratio": result.compression_ratio,
+        "no_speech_prob": result.no_speech_prob,
+    } for i, (start, end, tokens) in enumerate(segments)]
+
+def write_wav(samples: np.ndarray, path: Path):
+    """Write float32 samples as a 16-bit mono WAV"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(pcm.tobytes())
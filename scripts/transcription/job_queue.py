@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Durable Job Queue for the Transcription Service
+SQLite-backed queue of download → transcribe → diarize jobs with
+priorities, retries with exponential backoff, per-job progress and
+cancellation. Safe to share between worker processes.
+"""
+
+import json
+import time
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Configuration
+JOB_QUEUE_PATH = Path("transcripts/job-queue.sqlite")
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30       # first retry after 30 s, then 60 s, 120 s, ...
+RETRY_MAX_SECONDS = 30 * 60
+LEASE_SECONDS = 15 * 60       # a running job with no heartbeat for this long is presumed orphaned
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    audio_url TEXT,
+    audio_file TEXT,
+    title TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority DESC, id);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    engine TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+class LeaseLost(Exception):
+    """Raised inside a job whose lease expired and was handed to another worker"""
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before the next attempt after `attempts` failures"""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+class JobQueue:
+    """SQLite-backed job queue"""
+
+    def __init__(self, path: Path = JOB_QUEUE_PATH):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Several processes write here; wait on locks rather than failing
+        self.conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(self, audio_url: Optional[str] = None, audio_file: Optional[str] = None,
+               title: Optional[str] = None, priority: int = 0,
+               max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """Queue a job for an episode URL or a file already in the audio cache; returns its id
+
+        Higher priority runs first; equal priorities run in submission order.
+        """
+        if not audio_url and not audio_file:
+            raise ValueError("a job needs an audio_url or an audio_file")
+        cursor = self.conn.execute(
+            "INSERT INTO jobs (audio_url, audio_file, title, priority, max_attempts, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (audio_url, audio_file, title, priority, max_attempts, time.time())
+        )
+        return cursor.lastrowid
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Atomically take the highest-priority runnable job, or None"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker died mid-run go back in the queue
+            self.conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ?", (now - LEASE_SECONDS,)
+            )
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND not_before <= ? "
+                "ORDER BY priority DESC, id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, stage = NULL, "
+                "progress = 0, started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (worker, now, now, row["id"])
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def update_progress(self, job_id: int, worker: str, stage: str, progress: float):
+        """Record progress (0-1) and heartbeat
+
+        Raises LeaseLost if the job is no longer this worker's, and
+        JobCancelled if cancellation was requested.
+        """
+        if not self.conn.execute(
+            "UPDATE jobs SET stage = ?, progress = ?, heartbeat_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (stage, round(progress, 3), time.time(), job_id, worker)
+        ).rowcount:
+            raise LeaseLost(f"job {job_id} is no longer held by {worker}")
+        if self.conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]:
+            raise JobCancelled(f"job {job_id} cancelled")
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """Extend the worker's lease on a running job; False if the lease was already lost"""
+        return self.conn.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), job_id, worker)
+        ).rowcount > 0
+
+    def complete(self, job_id: int, worker: str, result: Dict) -> bool:
+        """Store the result; False (result dropped) if the worker no longer holds the job
+
+        complete, fail and mark_cancelled all check ownership, so a worker whose
+        lease expired can't overwrite the outcome of the worker that took over.
+        """
+        return self.conn.execute(
+            "UPDATE jobs SET status = 'done', progress = 1, error = NULL, result = ?, finished_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result), time.time(), job_id, worker)
+        ).rowcount > 0
+
+    def fail(self, job_id: int, worker: str, error: str) -> Optional[bool]:
+        """Record a failed attempt
+
+        Returns True if the job will be retried, False if it has failed for
+        good, None if the worker no longer holds the job.
+        """
+        job = self.get(job_id)
+        if job is None or job["worker"] != worker or job["status"] != "running":
+            return None
+        if job["attempts"] < job["max_attempts"]:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, error = ?, not_before = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (error, time.time() + retry_delay(job["attempts"]), job_id, worker)
+            )
+            return True if cursor.rowcount else None
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, time.time(), job_id, worker)
+        )
+        return False if cursor.rowcount else None
+
+    def release(self, worker: str) -> int:
+        """Put a stopped worker's running jobs back in the queue; returns how many"""
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, attempts = attempts - 1 "
+            "WHERE status = 'running' AND worker = ?", (worker,)
+        )
+        return cursor.rowcount
+
+    def mark_cancelled(self, job_id: int, worker: str) -> bool:
+        return self.conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), job_id, worker)
+        ).rowcount > 0
+
+    def cancel(self, job_id: int) -> Optional[str]:
+        """Cancel a job: queued jobs stop at once, running ones at their next progress update
+
+        Returns the job's resulting status, or None if there is no such job.
+        """
+        # Conditional updates, so a worker claiming the job concurrently can't slip between check and write
+        now = time.time()
+        if self.conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? "
+                             "WHERE id = ? AND status = 'queued'", (now, job_id)).rowcount:
+            return "cancelled"
+        if self.conn.execute("UPDATE jobs SET cancel_requested = 1 "
+                             "WHERE id = ? AND status = 'running'", (job_id,)).rowcount:
+            return "cancelling"
+        job = self.get(job_id)
+        return job["status"] if job else None
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Most recent jobs first, optionally only those with one status"""
+        if status:
+            rows = self.conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit))
+        else:
+            rows = self.conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        return [self._job(row) for row in rows]
+
+    def set_worker_state(self, worker: str, state: str, engine: Optional[str] = None, error: Optional[str] = None):
+        """Record a worker process's state ("loading", "ready" or "failed") for the status API"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO workers (name, state, engine, error, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (worker, state, engine, error, time.time())
+        )
+
+    def worker_states(self, workers: List[str]) -> List[Dict]:
+        placeholders = ", ".join("?" * len(workers))
+        rows = self.conn.execute(f"SELECT * FROM workers WHERE name IN ({placeholders}) ORDER BY name", workers)
+        return [dict(row) for row in rows]
+
+    def forget_workers(self, workers: List[str]):
+        self.conn.executemany("DELETE FROM workers WHERE name = ?", [(worker,) for worker in workers])
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status (queue depth is counts()['queued'])"""
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        for row in self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
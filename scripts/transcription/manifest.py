@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Transcription Manifest for Ray Peat Podcast Collection
+Tracks which audio files have been transcribed, keyed by audio content hash
++ model + language, so interrupted batches can resume without redoing work
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# Configuration
+MANIFEST_PATH = Path("transcripts/transcription-manifest.sqlite")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audio_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transcriptions (
+    audio_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    language TEXT NOT NULL,
+    status TEXT NOT NULL,
+    audio_file TEXT,
+    output_path TEXT,
+    audio_duration REAL,
+    wall_time REAL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (audio_hash, model, language)
+);
+"""
+
+def file_sha256(path: Path) -> str:
+    """Hash a file's contents in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TranscriptionManifest:
+    """SQLite-backed record of transcription runs"""
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def audio_hash(self, audio_path: Path) -> str:
+        """Content hash of an audio file, rehashed only when size or mtime change"""
+        stat = audio_path.stat()
+        key = str(audio_path.resolve())
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, sha256 FROM audio_hashes WHERE path = ?", (key,)
+        ).fetchone()
+        if row and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return row["sha256"]
+
+        sha256 = file_sha256(audio_path)
+        if row and row["sha256"] != sha256:
+            print(f"! Audio changed since last run, will retranscribe: {audio_path.name}")
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO audio_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, sha256)
+            )
+        return sha256
+
+    def lookup(self, audio_hash: str, model: str, language: str) -> Optional[Dict]:
+        """Return the manifest record for a hash/model/language, if any"""
+        row = self.conn.execute(
+            "SELECT * FROM transcriptions WHERE audio_hash = ? AND model = ? AND language = ?",
+            (audio_hash, model, language)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """Transcription counts per model and status"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for row in self.conn.execute("SELECT model, status, COUNT(*) AS n FROM transcriptions GROUP BY model, status"):
+            counts.setdefault(row["model"], {})[row["status"]] = row["n"]
+        return counts
+
+    def is_done(self, audio_hash: str, model: str, language: str) -> bool:
+        """True if a finished transcript for this audio still exists on disk"""
+        record = self.lookup(audio_hash, model, language)
+        if not record or record["status"] != "done":
+            return False
+        return bool(record["output_path"]) and Path(record["output_path"]).exists()
+
+    def _record(self, audio_hash: str, model: str, language: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ["audio_hash", "model", "language"] + list(fields)
+        placeholders = ", ".join("?" for _ in columns)
+        with self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO transcriptions ({', '.join(columns)}) VALUES ({placeholders})",
+                [audio_hash, model, language] + list(fields.values())
+            )
+
+    def mark_done(self, audio_hash: str, model: str, language: str, audio_file: Path,
+                  output_path: Path, audio_duration: Optional[float] = None,
+                  wall_time: Optional[float] = None):
+        self._record(audio_hash, model, language, status="done",
+                     audio_file=audio_file.name, output_path=str(output_path),
+                     audio_duration=audio_duration, wall_time=wall_time, error=None)
+
+    def mark_failed(self, audio_hash: str, model: str, language: str, audio_file: Path,
+                    wall_time: Optional[float] = None, error: Optional[str] = None):
+        self._record(audio_hash, model, language, status="failed",
+                     audio_file=audio_file.name, output_path=None,
+                     audio_duration=None, wall_time=wall_time, error=error)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Pipeline Instrumentation for Ray Peat Transcription Scripts
+Stage timers that feed a JSON-lines event log, Prometheus text-format
+counters and optional per-file cProfile dumps, so a slow run can be pinned
+on the network, ffmpeg, Whisper or serialization
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import cProfile
+import argparse
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+# Configuration
+# Settings travel through the environment so spawned worker processes log to the same places
+EVENTS_ENV = "TRANSCRIBR_EVENTS"
+PROFILE_ENV = "TRANSCRIBR_PROFILE_DIR"
+RUN_ENV = "TRANSCRIBR_RUN_ID"
+DURATION_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+METRIC_PREFIX = "transcribr"
+
+class Metrics:
+    """Per-process stage timings: appended to the event log, aggregated for export"""
+
+    def __init__(self, events_path: Optional[Path] = None, profile_dir: Optional[Path] = None,
+                 run_id: Optional[str] = None):
+        self.events_path = events_path
+        self.profile_dir = profile_dir
+        self.run_id = run_id
+        self.host = socket.gethostname()
+        self.lock = threading.Lock()  # downloads record from several threads
+        self.runs = defaultdict(int)            # (stage, outcome) → count
+        self.seconds = defaultdict(float)       # stage → total seconds
+        self.bytes = defaultdict(int)           # stage → total bytes
+        self.audio_seconds = defaultdict(float) # stage → total audio seconds
+        self.buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+
+    def event(self, event: str, **fields):
+        """Append one JSON line to the event log, if there is one"""
+        if not self.events_path:
+            return
+        record = {"ts": round(time.time(), 3), "event": event, "run": self.run_id,
+                  "host": self.host, "pid": os.getpid()}
+        record.update(fields)
+        # One write() per line in append mode, so lines from several processes don't interleave
+        with open(self.events_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def record(self, stage: str, seconds: float, ok: bool = True, file: Optional[str] = None, **fields):
+        """Count one finished stage and log it
+
+        bytes and audio_seconds fields also feed throughput counters and
+        derived bytes_per_second / realtime (audio seconds per wall second).
+        """
+        self._count(stage, seconds, ok, fields.get("bytes"), fields.get("audio_seconds"))
+        if fields.get("bytes"):
+            fields["bytes_per_second"] = round(fields["bytes"] / seconds, 1) if seconds > 0 else None
+        if fields.get("audio_seconds"):
+            fields["realtime"] = round(fields["audio_seconds"] / seconds, 2) if seconds > 0 else None
+
+        self.event("stage", stage=stage, file=file, seconds=round(seconds, 4), ok=ok, **fields)
+
+    def _count(self, stage: str, seconds: float, ok: bool, size: Optional[int], audio_seconds: Optional[float]):
+        bucket = next((i for i, bound in enumerate(DURATION_BUCKETS) if seconds <= bound), len(DURATION_BUCKETS))
+        with self.lock:
+            self.runs[(stage, "ok" if ok else "error")] += 1
+            self.seconds[stage] += seconds
+            self.buckets[stage][bucket] += 1
+            self.bytes[stage] += size or 0
+            self.audio_seconds[stage] += audio_seconds or 0.0
+
+    @contextmanager
+    def stage(self, stage: str, file: Optional[str] = None, **fields) -> Iterator[Dict]:
+        """Time a block; the yielded dict takes extra fields (bytes, audio_seconds, error, ok)
+
+        An exception escaping the block is recorded as an error and re-raised.
+        """
+        info = dict(fields)
+        started = time.perf_counter()
+        try:
+            yield info
+        except BaseException as e:
+            info.setdefault("error", f"{type(e).__name__}: {e}")
+            info["ok"] = False
+            raise
+        finally:
+            ok = info.pop("ok", "error" not in info)
+            self.record(stage, time.perf_counter() - started, ok, file, **info)
+
+    @contextmanager
+    def profile(self, stage: str, file: Optional[str] = None) -> Iterator[None]:
+        """cProfile the block into <profile dir>/<stage>-<file>.prof when profiling is on"""
+        if not self.profile_dir:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            name = re.sub(r"[^\w.-]", "_", f"{stage}-{file or os.getpid()}")
+            profiler.dump_stats(str(self.profile_dir / f"{name}.prof"))
+
+    def prometheus_text(self) -> str:
+        """Counters and a duration histogram in Prometheus text exposition format"""
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+
+        family("stage_runs_total", "counter", "Finished pipeline stages by outcome")
+        for (stage, outcome), count in sorted(self.runs.items()):
+            lines.append(f'{METRIC_PREFIX}_stage_runs_total{{stage="{stage}",outcome="{outcome}"}} {count}')
+
+        family("stage_duration_seconds", "histogram", "Wall time per stage run")
+        for stage, counts in sorted(self.buckets.items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} {self.seconds[stage]:.4f}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        family("stage_bytes_total", "counter", "Bytes moved by a stage (downloaded, written)")
+        for stage, total in sorted(self.bytes.items()):
+            if total:
+                lines.append(f'{METRIC_PREFIX}_stage_bytes_total{{stage="{stage}"}} {total}')
+
+        family("stage_audio_seconds_total", "counter", "Seconds of audio processed by a stage")
+        for stage, total in sorted(self.audio_seconds.items()):
+            if total:
+                lines.append(f'{METRIC_PREFIX}_stage_audio_seconds_total{{stage="{stage}"}} {total:.3f}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        """Atomically replace path, e.g. for node_exporter's textfile collector
+
+        With an event log, the file covers every process of this run (worker
+        processes included); without one, only this process.
+        """
+        source = self
+        if self.events_path and self.events_path.exists():
+            source = aggregate_events(self.events_path, self.run_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(source.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def summary(self) -> str:
+        """Per-stage table: runs, errors, wall time and throughput"""
+        lines = [f"  {'stage':<18} {'runs':>6} {'errors':>6} {'total s':>10} {'mean s':>9} {'MB/s':>8} {'realtime':>9}"]
+        for stage in sorted(self.seconds):
+            ok, errors = self.runs[(stage, "ok")], self.runs[(stage, "error")]
+            total = self.seconds[stage]
+            mb_per_second = f"{self.bytes[stage] / total / 1e6:.2f}" if self.bytes[stage] and total else "-"
+            realtime = f"{self.audio_seconds[stage] / total:.1f}x" if self.audio_seconds[stage] and total else "-"
+            lines.append(f"  {stage:<18} {ok + errors:>6} {errors:>6} {total:>10.2f} "
+                         f"{total / max(ok + errors, 1):>9.3f} {mb_per_second:>8} {realtime:>9}")
+        return "\n".join(lines)
+
+def aggregate_events(events_path: Path, run_id: Optional[str] = None) -> Metrics:
+    """Rebuild stage aggregates from an event log, optionally for one run only"""
+    metrics = Metrics()
+    with open(events_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("event") != "stage" or (run_id and record.get("run") != run_id):
+                continue
+            metrics._count(record["stage"], record["seconds"], record["ok"],
+                           record.get("bytes"), record.get("audio_seconds"))
+    return metrics
+
+_metrics = None
+
+def get_metrics() -> Metrics:
+    """This process's Metrics, configured from the environment on first use"""
+    global _metrics
+    if _metrics is None:
+        events = os.environ.get(EVENTS_ENV)
+        profile_dir = os.environ.get(PROFILE_ENV)
+        _metrics = Metrics(Path(events) if events else None, Path(profile_dir) if profile_dir else None,
+                           os.environ.get(RUN_ENV))
+    return _metrics
+
+def add_metrics_arguments(parser: argparse.ArgumentParser):
+    """--events / --metrics-file / --profile, shared by the pipeline scripts"""
+    parser.add_argument("--events", type=Path, help="Append JSON-lines stage events to this file")
+    parser.add_argument("--metrics-file", type=Path,
+                        help="Write Prometheus text-format stage metrics here (rewritten during and after the run)")
+    parser.add_argument("--profile", type=Path, metavar="DIR",
+                        help="Write a cProfile .prof per file and stage into DIR")
+
+def configure_metrics(args: argparse.Namespace) -> Metrics:
+    """Apply the command line options to this process and any workers it spawns"""
+    global _metrics
+    os.environ[RUN_ENV] = uuid.uuid4().hex[:12]
+    if args.events:
+        args.events.parent.mkdir(parents=True, exist_ok=True)
+        os.environ[EVENTS_ENV] = str(args.events.resolve())
+    if args.profile:
+        os.environ[PROFILE_ENV] = str(args.profile.resolve())
+    _metrics = None
+    return get_metrics()
+
+def main():
+    """Summarize an event log"""
+    parser = argparse.ArgumentParser(description="Summarize pipeline stage events")
+    parser.add_argument("events", type=Path, help="JSON-lines event log written with --events")
+    parser.add_argument("--run", help="Only this run id (default: every run in the log)")
+    parser.add_argument("--prometheus", type=Path, help="Also write the aggregates in Prometheus text format")
+    args = parser.parse_args()
+
+    metrics = aggregate_events(args.events, args.run)
+    print(metrics.summary())
+    if args.prometheus:
+        with open(args.prometheus, 'w', encoding='utf-8') as f:
+            f.write(metrics.prometheus_text())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Decoded Audio Cache for Ray Peat Podcast Collection
+Decodes each MP3 once to 16 kHz mono int16 PCM and keeps it memory-mapped,
+so model sweeps, retries, chunking and diarization read slices instead of
+running ffmpeg again. Keyed by the source's content hash and bounded in
+size, evicting the least recently used entries.
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+from chunked_transcribe import READ_BLOCK_SECONDS, SAMPLE_RATE, decode_pcm_blocks
+from manifest import file_sha256
+from metrics import get_metrics
+
+# Configuration
+PCM_CACHE_DIR = Path("transcripts/pcm-cache")
+PCM_CACHE_MAX_BYTES = 20 * 1024 ** 3  # ~145 hours of audio
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    sha256 TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+def to_float(samples: np.ndarray) -> np.ndarray:
+    """int16 PCM → float32 in [-1, 1], the input Whisper engines expect"""
+    return samples.astype(np.float32) / 32768.0
+
+class PCMCache:
+    """Content-addressed, LRU-bounded cache of decoded PCM files"""
+
+    def __init__(self, directory: Path = PCM_CACHE_DIR, max_bytes: int = PCM_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Worker processes share the index, so wait on locks rather than failing
+        self.conn = sqlite3.connect(str(directory / "index.sqlite"), timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def source_hash(self, audio_path: Path) -> str:
+        """sha256 of the source file, rehashed only when its size or mtime change"""
+        stat = audio_path.stat()
+        key = str(audio_path.resolve())
+        row = self.conn.execute("SELECT * FROM sources WHERE path = ?", (key,)).fetchone()
+        if row and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return row["sha256"]
+
+        sha256 = file_sha256(audio_path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, sha256)
+            )
+        return sha256
+
+    def pcm_path(self, sha256: str) -> Path:
+        return self.directory / f"{sha256}.pcm"
+
+    def load(self, audio_path: Path) -> np.ndarray:
+        """Read-only memory map of the file's 16 kHz mono int16 PCM, decoding it on a miss"""
+        sha256 = self.source_hash(audio_path)
+        pcm_path = self.pcm_path(sha256)
+
+        if not pcm_path.exists():
+            self._decode(audio_path, pcm_path)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO entries (sha256, bytes, last_used) VALUES (?, ?, ?)",
+                                  (sha256, pcm_path.stat().st_size, time.time()))
+            self.evict(keep=sha256)
+        else:
+            with self.conn:
+                self.conn.execute("UPDATE entries SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+
+        if pcm_path.stat().st_size == 0:
+            return np.zeros(0, dtype=np.int16)
+        return np.memmap(pcm_path, dtype=np.int16, mode="r")
+
+    def blocks(self, audio_path: Path, block_seconds: float = READ_BLOCK_SECONDS) -> Iterator[np.ndarray]:
+        """Zero-copy drop-in for decode_pcm_blocks()"""
+        samples = self.load(audio_path)
+        block = int(block_seconds * SAMPLE_RATE)
+        for start in range(0, len(samples), block):
+            yield samples[start:start + block]
+
+    @staticmethod
+    def _decode(audio_path: Path, pcm_path: Path):
+        # Unique temp name: two workers may decode the same file at once, and the last rename wins
+        tmp_path = pcm_path.with_name(f"{pcm_path.name}.{os.getpid()}.tmp")
+        try:
+            with get_metrics().stage("decode", file=audio_path.name) as stage:
+                with open(tmp_path, 'wb') as f:
+                    for block in decode_pcm_blocks(audio_path):
+                        f.write(block.tobytes())
+                stage["bytes"] = tmp_path.stat().st_size
+                stage["audio_seconds"] = stage["bytes"] / 2 / SAMPLE_RATE
+            os.replace(tmp_path, pcm_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def total_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+
+    def evict(self, keep: Optional[str] = None, max_bytes: Optional[int] = None) -> int:
+        """Delete least recently used entries until the cache fits; returns bytes freed"""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        total = self.total_bytes()
+        freed = 0
+        for row in self.conn.execute("SELECT sha256, bytes FROM entries ORDER BY last_used").fetchall():
+            if total - freed <= limit:
+                break
+            if row["sha256"] == keep:
+                continue
+            pcm_path = self.pcm_path(row["sha256"])
+            if pcm_path.exists():
+                pcm_path.unlink()
+            with self.conn:
+                self.conn.execute("DELETE FROM entries WHERE sha256 = ?", (row["sha256"],))
+            freed += row["bytes"]
+        return freed
+
+def main():
+    """Pre-decode the audio cache or manage the PCM cache"""
+    from bulk_transcribe import get_audio_files
+
+    parser = argparse.ArgumentParser(description="Decode-once PCM cache for the audio collection")
+    parser.add_argument("command", choices=["warm", "stats", "clear"],
+                        help="warm: decode every MP3 not yet cached; stats: show usage; clear: empty the cache")
+    parser.add_argument("--limit", type=int, help="Only warm the first N files")
+    parser.add_argument("--max-gb", type=float, default=PCM_CACHE_MAX_BYTES / 1024 ** 3,
+                        help=f"Size bound (default: {PCM_CACHE_MAX_BYTES / 1024 ** 3:.0f})")
+    args = parser.parse_args()
+
+    with PCMCache(max_bytes=int(args.max_gb * 1024 ** 3)) as cache:
+        if args.command == "warm":
+            audio_files = get_audio_files()[:args.limit]
+            for i, audio_file in enumerate(audio_files, 1):
+                try:
+                    samples = cache.load(audio_file)
+                    print(f"✓ [{i}/{len(audio_files)}] {audio_file.name} ({len(samples) / SAMPLE_RATE / 60:.1f} min)")
+                except (OSError, RuntimeError) as e:
+                    print(f"✗ [{i}/{len(audio_files)}] {audio_file.name}: {e}")
+        elif args.command == "clear":
+            print(f"Freed {cache.evict(max_bytes=0) / 1024 ** 2:.0f} MB")
+
+        entries = cache.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = cache.total_bytes()
+        print(f"{entries} files, {total / 1024 ** 3:.2f} GB "
+              f"({total / 2 / SAMPLE_RATE / 3600:.1f} hours) of {cache.max_bytes / 1024 ** 3:.0f} GB")
+
+if __name__ == "__main__":
+    main()
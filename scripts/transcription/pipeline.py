@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Incremental Pipeline Runner for Ray Peat Podcast Collection
+Models each episode as a small DAG (download → transcribe → diarize) and,
+make-style, rebuilds only stale artifacts: every stage records a
+fingerprint of its inputs and settings plus the output it wrote. Episodes
+move through the stages independently, so one is diarized as soon as its
+transcript is saved, with all stages sharing one CPU and network budget.
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import bulk_transcribe
+import download_audio
+import speaker_diarization
+from cascade import CASCADE_DRAFT_MODEL
+from engines import ENGINES, create_engine
+from manifest import TranscriptionManifest
+from metrics import add_metrics_arguments, configure_metrics
+from segment_store import TRANSCRIPT_FORMATS
+from transcript_search import SearchIndex
+
+# Configuration
+PIPELINE_STATE_PATH = Path("transcripts/pipeline-state.sqlite")
+STAGES = ("download", "transcribe", "diarize")
+DOWNLOAD_SLOTS = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    episode TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    input_fingerprint TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    output_fingerprint TEXT NOT NULL,
+    built_at REAL NOT NULL,
+    PRIMARY KEY (episode, stage)
+);
+"""
+
+def file_fingerprint(path: Path) -> Optional[str]:
+    """Cheap identity of a file's current contents (size and mtime), or None if it is missing"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+class PipelineState:
+    """What each stage last built for each episode, and from which inputs"""
+
+    def __init__(self, path: Path = PIPELINE_STATE_PATH):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_fresh(self, episode: str, stage: str, input_fingerprint: str) -> bool:
+        """True if the stage's output was built from these inputs and hasn't been touched since"""
+        row = self.conn.execute("SELECT * FROM artifacts WHERE episode = ? AND stage = ?",
+                                (episode, stage)).fetchone()
+        return bool(row and row["input_fingerprint"] == input_fingerprint
+                    and file_fingerprint(Path(row["output_path"])) == row["output_fingerprint"])
+
+    def record(self, episode: str, stage: str, input_fingerprint: str, output_path: Path):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO artifacts (episode, stage, input_fingerprint, output_path, "
+                "output_fingerprint, built_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (episode, stage, input_fingerprint, str(output_path), file_fingerprint(output_path), time.time())
+            )
+
+    def output(self, episode: str, stage: str) -> Optional[Path]:
+        row = self.conn.execute("SELECT output_path FROM artifacts WHERE episode = ? AND stage = ?",
+                                (episode, stage)).fetchone()
+        return Path(row["output_path"]) if row else None
+
+class ResourceBudget:
+    """Counted resources shared by every stage; a task starts only when its whole cost fits"""
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = dict(limits)
+        self.used = dict.fromkeys(limits, 0)
+
+    def fits(self, cost: Dict[str, int]) -> bool:
+        return all(self.used[name] + amount <= self.limits[name] for name, amount in cost.items())
+
+    def acquire(self, cost: Dict[str, int]):
+        for name, amount in cost.items():
+            self.used[name] += amount
+
+    def release(self, cost: Dict[str, int]):
+        for name, amount in cost.items():
+            self.used[name] -= amount
+
+class Episode:
+    """One episode's way through the DAG"""
+
+    def __init__(self, name: str, audio_path: Path, url: Optional[str] = None):
+        self.name = name
+        self.audio_path = audio_path
+        self.url = url
+        self.raw_path = None
+        self.stage = 0          # index into STAGES of the next stage to check
+        self.fingerprint = None # input fingerprint of the stage in flight
+        self.failed = False
+
+def stage_input(stage: str, episode: Episode, manifest: TranscriptionManifest, engine, acoustic: bool) -> str:
+    """Fingerprint of everything the stage's output depends on"""
+    if stage == "download":
+        return hashlib.sha1(episode.url.encode()).hexdigest() if episode.url else "local"
+    if stage == "transcribe":
+        return f"{manifest.audio_hash(episode.audio_path)}:{engine.cache_key}:{engine.language}"
+    return f"{file_fingerprint(episode.raw_path)}:{'acoustic' if acoustic else 'patterns'}"
+
+def adopt_output(stage: str, episode: Episode, manifest: TranscriptionManifest, engine) -> Optional[Path]:
+    """An output built before the runner tracked this episode, if it is still current"""
+    if stage == "download":
+        return episode.audio_path if episode.audio_path.exists() else None
+    if stage == "transcribe":
+        # The manifest knows transcripts from bulk_transcribe.py, including those shared by duplicates
+        audio_hash = manifest.audio_hash(episode.audio_path)
+        if manifest.is_done(audio_hash, engine.cache_key, engine.language):
+            return Path(manifest.lookup(audio_hash, engine.cache_key, engine.language)["output_path"])
+        return None
+    speakers_path = speaker_diarization.speaker_output_path(episode.raw_path)
+    return speakers_path if speaker_diarization.is_up_to_date(episode.raw_path, speakers_path) else None
+
+def stage_output(stage: str, episode: Episode, suffix: str) -> Path:
+    """Where the stage writes when it runs"""
+    if stage == "download":
+        return episode.audio_path
+    if stage == "transcribe":
+        return bulk_transcribe.expected_output_path(episode.audio_path, suffix)
+    return speaker_diarization.speaker_output_path(episode.raw_path)
+
+def discover_episodes(offline: bool = False, refresh: bool = False) -> List[Episode]:
+    """Feed episodes (named as download_audio.py names them) plus any other audio already cached"""
+    episodes = []
+    if not offline:
+        session = download_audio.create_session()
+        feed, _ = download_audio.fetch_feed_episodes(session, use_cache=not refresh)
+        session.close()
+        sources = download_audio.load_sources()
+        filenames = download_audio.assign_filenames(feed, sources)
+        download_audio.save_sources(sources)
+        for item in feed:
+            filename = filenames[item["url"]]
+            episodes.append(Episode(filename, download_audio.AUDIO_CACHE_DIR / filename, item["url"]))
+
+    known = {episode.audio_path.resolve() for episode in episodes}
+    for audio_file in bulk_transcribe.get_audio_files():
+        if audio_file.resolve() not in known:
+            episodes.append(Episode(str(audio_file.relative_to(bulk_transcribe.AUDIO_CACHE_DIR)), audio_file))
+    return episodes
+
+def main():
+    """Bring every episode's artifacts up to date"""
+    parser = argparse.ArgumentParser(description="Run download → transcribe → diarize, rebuilding only stale artifacts")
+    parser.add_argument("--offline", action="store_true", help="Skip the feed; only process audio already cached")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached feed index and re-fetch the feed")
+    parser.add_argument("--file", type=str, help="Only episodes whose audio filename contains this")
+    parser.add_argument("--limit", type=int, help="Only the first N episodes")
+    parser.add_argument("--dry-run", action="store_true", help="List the stale stages without running them")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count() or 1,
+                        help="CPU budget shared by transcription and diarization (default: all cores)")
+    parser.add_argument("--workers", type=int, default=1, help="Transcription worker processes (default: 1)")
+    parser.add_argument("--diarize-jobs", type=int, default=1,
+                        help="Cores kept for diarization, so it runs alongside transcription (default: 1)")
+    parser.add_argument("--downloads", type=int, default=DOWNLOAD_SLOTS,
+                        help=f"Concurrent downloads (default: {DOWNLOAD_SLOTS})")
+    parser.add_argument("--engine", choices=list(ENGINES), default="whisper", help="Transcription backend (default: whisper)")
+    parser.add_argument("--model", default=bulk_transcribe.WHISPER_MODEL,
+                        help=f"Model name (default: {bulk_transcribe.WHISPER_MODEL})")
+    parser.add_argument("--cascade", nargs="?", const=CASCADE_DRAFT_MODEL, metavar="DRAFT_MODEL",
+                        help="Draft with this fast model, redo only low-confidence segments with --model")
+    parser.add_argument("--format", choices=list(TRANSCRIPT_FORMATS), default="json",
+                        help="Transcript file format (default: json)")
+    parser.add_argument("--acoustic", action="store_true", help="Diarize from the audio (see speaker_diarization.py)")
+    parser.add_argument("--pcm-cache", action="store_true", help="Share decoded audio through the PCM cache")
+    parser.add_argument("--no-index", action="store_true", help="Don't update the search index")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    metrics = configure_metrics(args)
+
+    suffix = TRANSCRIPT_FORMATS[args.format]
+    engine = create_engine(args.engine, args.model, bulk_transcribe.WHISPER_LANGUAGE, args.cascade)
+
+    episodes = discover_episodes(args.offline, args.refresh)
+    if args.file:
+        episodes = [episode for episode in episodes if args.file in episode.name]
+    if args.limit:
+        episodes = episodes[:args.limit]
+    print(f"Found {len(episodes)} episodes")
+
+    diarize_jobs = max(1, min(args.diarize_jobs, args.cpus - 1)) if args.cpus > 1 else 1
+    threads = max(1, (args.cpus - diarize_jobs) // args.workers)
+    budget = ResourceBudget({"network": args.downloads, "cpu": args.cpus, "transcriber": args.workers})
+    costs = {
+        "download": {"network": 1},
+        "transcribe": {"cpu": threads, "transcriber": 1},
+        "diarize": {"cpu": 1},
+    }
+
+    state = PipelineState()
+    manifest = TranscriptionManifest()
+    search_index = None if args.no_index or args.dry_run else SearchIndex()
+    counts = {stage: {"built": 0, "fresh": 0, "failed": 0} for stage in STAGES}
+
+    runnable = []                 # (episode, stage) whose inputs are ready and output is stale
+    completions = queue.Queue()   # (episode, stage, outcome) pushed by executor callbacks
+    in_flight = 0
+
+    def advance(episode: Episode):
+        """Skip the episode past every fresh stage; queue the first stale one"""
+        while episode.stage < len(STAGES):
+            stage = STAGES[episode.stage]
+            if stage == "download" and not episode.url and not episode.audio_path.exists():
+                episode.failed = True
+                return
+            fingerprint = stage_input(stage, episode, manifest, engine, args.acoustic)
+
+            output = None
+            if state.is_fresh(episode.name, stage, fingerprint):
+                output = state.output(episode.name, stage)
+            elif state.output(episode.name, stage) is None:
+                # Never built by the runner: take over what the standalone scripts left behind
+                output = adopt_output(stage, episode, manifest, engine)
+                if output and not args.dry_run:
+                    state.record(episode.name, stage, fingerprint, output)
+
+            if output is None:
+                episode.fingerprint = fingerprint
+                runnable.append((episode, stage))
+                return
+            counts[stage]["fresh"] += 1
+            if stage == "transcribe":
+                episode.raw_path = output
+            episode.stage += 1
+
+    if args.dry_run:
+        stale = 0
+        for episode in episodes:
+            advance(episode)
+            if runnable:
+                stages = STAGES[episode.stage:]
+                print(f"  {episode.name}: {' → '.join(stages)}")
+                stale += 1
+                runnable.clear()
+        print(f"{stale} of {len(episodes)} episodes need work")
+        manifest.close()
+        state.close()
+        return
+
+    session = download_audio.create_session(args.downloads)
+    limiter = download_audio.HostLimiter()
+    download_executor = ThreadPoolExecutor(max_workers=args.downloads)
+    transcribe_pool = None
+    # spawn: forking with the scheduler's threads running is not safe
+    diarize_executor = ProcessPoolExecutor(max_workers=diarize_jobs, mp_context=multiprocessing.get_context("spawn"))
+    diarize_job = partial(speaker_diarization.process_transcript_job, acoustic=args.acoustic,
+                          use_pcm_cache=args.pcm_cache)
+
+    def start(episode: Episode, stage: str):
+        nonlocal transcribe_pool, in_flight
+        budget.acquire(costs[stage])
+        in_flight += 1
+        done = lambda outcome: completions.put((episode, stage, outcome))
+        failed = lambda error: completions.put((episode, stage, error))
+
+        if stage == "download":
+            future = download_executor.submit(download_audio.download_audio_file, episode.url,
+                                              episode.audio_path, session, limiter)
+            future.add_done_callback(lambda f: done(f.exception() or f.result()))
+        elif stage == "transcribe":
+            if transcribe_pool is None:
+                # Started on first use, so a fully fresh run never loads a model
+                transcribe_pool = bulk_transcribe.start_worker_pool(args.workers, engine, args.pcm_cache, threads)
+            transcribe_pool.apply_async(bulk_transcribe.transcribe_in_worker, (episode.audio_path,),
+                                        callback=done, error_callback=failed)
+        else:
+            future = diarize_executor.submit(diarize_job, (episode.raw_path, stage_output(stage, episode, suffix)))
+            future.add_done_callback(lambda f: done(f.exception() or f.result()))
+
+    def finish(episode: Episode, stage: str, outcome) -> bool:
+        """Save and record a finished stage's output; returns success"""
+        if isinstance(outcome, BaseException):
+            print(f"✗ {stage} failed for {episode.name}: {outcome}")
+            return False
+
+        if stage == "download":
+            ok = bool(outcome)
+        elif stage == "transcribe":
+            _, transcript_data, wall_time = outcome
+            audio_hash = manifest.audio_hash(episode.audio_path)
+            output_path = stage_output(stage, episode, suffix)
+            ok = bool(transcript_data) and bulk_transcribe.save_transcript(transcript_data, output_path)
+            if ok:
+                manifest.mark_done(audio_hash, engine.cache_key, engine.language, episode.audio_path, output_path,
+                                   audio_duration=transcript_data["metadata"].get("audio_duration"),
+                                   wall_time=wall_time)
+                episode.raw_path = output_path
+            else:
+                manifest.mark_failed(audio_hash, engine.cache_key, engine.language, episode.audio_path,
+                                     wall_time=wall_time, error="transcription failed")
+        else:
+            ok, error = outcome
+            if error:
+                print(f"✗ diarize failed for {episode.name}: {error}")
+
+        if ok:
+            output_path = stage_output(stage, episode, suffix)
+            state.record(episode.name, stage, episode.fingerprint, output_path)
+            if search_index and stage != "download":
+                search_index.index_file(output_path)
+        return ok
+
+    started = time.monotonic()
+    try:
+        for episode in episodes:
+            advance(episode)
+
+        while runnable or in_flight:
+            # Later stages first: finishing an episode beats starting a new one
+            runnable.sort(key=lambda task: -STAGES.index(task[1]))
+            for task in list(runnable):
+                if budget.fits(costs[task[1]]):
+                    runnable.remove(task)
+                    start(*task)
+
+            episode, stage, outcome = completions.get()
+            in_flight -= 1
+            budget.release(costs[stage])
+            if finish(episode, stage, outcome):
+                counts[stage]["built"] += 1
+                episode.stage += 1
+                advance(episode)
+            else:
+                counts[stage]["failed"] += 1
+                episode.failed = True
+    finally:
+        download_executor.shutdown(wait=False, cancel_futures=True)
+        diarize_executor.shutdown(cancel_futures=True)
+        if transcribe_pool:
+            transcribe_pool.terminate()
+        session.close()
+        manifest.close()
+        state.close()
+        if search_index:
+            search_index.close()
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
+
+    print(f"\n=== Pipeline Summary ({time.monotonic() - started:.0f}s) ===")
+    for stage in STAGES:
+        print(f"  {stage:<11} built {counts[stage]['built']:>4}   up to date {counts[stage]['fresh']:>4}   "
+              f"failed {counts[stage]['failed']:>4}")
+    print(f"Episodes complete: {sum(1 for e in episodes if e.stage == len(STAGES))}/{len(episodes)}")
+
+if __name__ == "__main__":
+    main()
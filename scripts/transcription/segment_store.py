@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Compact Segment Store for Ray Peat Transcripts
+Stores transcript segments as fixed-width NumPy columns plus a UTF-8 text
+blob, so files can be memory-mapped and time ranges read without parsing
+the whole transcript. Converts to and from the usual JSON transcript format.
+
+File layout (all sections 8-byte aligned):
+    magic | header length (uint64) | JSON header | segment records | tokens (int32) | text blob
+"""
+
+import json
+import struct
+import argparse
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from transcript_stream import STREAM_SUFFIX, TranscriptReader, save_stream_transcript
+
+MAGIC = b"TSEGS\x00\x01\x00"
+SEGMENT_STORE_SUFFIX = ".segs"
+# Suffix per --format choice of the pipeline scripts
+TRANSCRIPT_FORMATS = {"json": ".json", "segs": SEGMENT_STORE_SUFFIX, "ndjson": STREAM_SUFFIX}
+
+# Numeric Whisper segment fields, in the order Whisper writes them
+INT_FIELDS = ["id", "seek"]
+FLOAT_FIELDS = ["temperature", "avg_logprob", "compression_ratio", "no_speech_prob"]
+OPTIONAL_FIELDS = INT_FIELDS + FLOAT_FIELDS + ["tokens", "speaker"]
+KNOWN_FIELDS = {"start", "end", "text"} | set(OPTIONAL_FIELDS)
+
+SEGMENT_DTYPE = np.dtype([
+    ("start", "<f8"),
+    ("end", "<f8"),
+    ("text_offset", "<i8"),
+    ("text_length", "<i4"),
+    ("tokens_length", "<i4"),
+    ("tokens_offset", "<i8"),
+    ("id", "<i4"),
+    ("seek", "<i4"),
+    ("temperature", "<f8"),
+    ("avg_logprob", "<f8"),
+    ("compression_ratio", "<f8"),
+    ("no_speech_prob", "<f8"),
+    ("speaker", "<i4"),
+    ("present", "<u4"),   # bit i set when OPTIONAL_FIELDS[i] was in the segment and not None
+])
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+def save_segment_store(transcript_data: Dict, output_path: Path):
+    """Write transcript_data in the compact segment store format"""
+    segments = transcript_data["transcript"]["segments"]
+    records = np.zeros(len(segments), dtype=SEGMENT_DTYPE)
+
+    text_parts: List[bytes] = []
+    token_parts: List[List[int]] = []
+    speakers: List[str] = []
+    speaker_ids: Dict[str, int] = {}
+    extra_fields: Dict[str, Dict] = {}
+    text_offset = 0
+    tokens_offset = 0
+
+    for i, segment in enumerate(segments):
+        record = records[i]
+        record["start"] = segment.get("start", 0.0)
+        record["end"] = segment.get("end", 0.0)
+
+        encoded = segment.get("text", "").encode("utf-8")
+        record["text_offset"] = text_offset
+        record["text_length"] = len(encoded)
+        text_parts.append(encoded)
+        text_offset += len(encoded)
+
+        present = 0
+        for bit, field in enumerate(OPTIONAL_FIELDS):
+            # None (e.g. faster-whisper's temperature) has no column value; it goes to extras
+            if segment.get(field) is None:
+                continue
+            present |= 1 << bit
+            if field == "tokens":
+                record["tokens_offset"] = tokens_offset
+                record["tokens_length"] = len(segment["tokens"])
+                token_parts.append(segment["tokens"])
+                tokens_offset += len(segment["tokens"])
+            elif field == "speaker":
+                speaker = segment["speaker"]
+                if speaker not in speaker_ids:
+                    speaker_ids[speaker] = len(speakers)
+                    speakers.append(speaker)
+                record["speaker"] = speaker_ids[speaker]
+            else:
+                record[field] = segment[field]
+        record["present"] = present
+
+        extras = {key: value for key, value in segment.items()
+                  if key not in KNOWN_FIELDS or (value is None and key in OPTIONAL_FIELDS)}
+        if extras:
+            extra_fields[str(i)] = extras
+
+    tokens = np.array([t for part in token_parts for t in part], dtype="<i4")
+    text_blob = b"".join(text_parts)
+
+    # Everything except the segments goes into the JSON header
+    document = {key: value for key, value in transcript_data.items() if key != "transcript"}
+    document["transcript"] = {
+        key: value for key, value in transcript_data["transcript"].items() if key != "segments"
+    }
+
+    header = {
+        "document": document,
+        "segment_count": len(segments),
+        "token_count": len(tokens),
+        "text_bytes": len(text_blob),
+        "speakers": speakers,
+        "extra_fields": extra_fields,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    header_bytes += b" " * (_align(len(header_bytes)) - len(header_bytes))
+
+    segments_offset = len(MAGIC) + 8 + len(header_bytes)
+    tokens_start = segments_offset + records.nbytes
+    text_start = _align(tokens_start + tokens.nbytes)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(records.tobytes())
+        f.write(tokens.tobytes())
+        f.write(b"\0" * (text_start - tokens_start - tokens.nbytes))
+        f.write(text_blob)
+
+class SegmentStore:
+    """Memory-mapped reader for a segment store file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a segment store file: {self.path}")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(header_length).decode("utf-8"))
+
+        count = self.header["segment_count"]
+        segments_offset = len(MAGIC) + 8 + header_length
+        tokens_start = segments_offset + count * SEGMENT_DTYPE.itemsize
+        text_start = _align(tokens_start + self.header["token_count"] * 4)
+
+        # np.memmap rejects zero-length maps, so empty sections become empty arrays
+        self.records = self._map(SEGMENT_DTYPE, segments_offset, count)
+        self.tokens = self._map(np.dtype("<i4"), tokens_start, self.header["token_count"])
+        self.text = self._map(np.dtype("u1"), text_start, self.header["text_bytes"])
+        self.speakers = self.header["speakers"]
+        self.extra_fields = self.header["extra_fields"]
+
+    def _map(self, dtype: np.dtype, offset: int, count: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.records["start"]
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self.records["end"]
+
+    def segment_text(self, index: int) -> str:
+        record = self.records[index]
+        offset = int(record["text_offset"])
+        return self.text[offset:offset + int(record["text_length"])].tobytes().decode("utf-8")
+
+    def segment(self, index: int) -> Dict:
+        """Rebuild segment `index` as the dict Whisper would have produced"""
+        record = self.records[index]
+        present = int(record["present"])
+        segment: Dict = {}
+
+        def has(field: str) -> bool:
+            return bool(present & (1 << OPTIONAL_FIELDS.index(field)))
+
+        for field in INT_FIELDS:
+            if has(field):
+                segment[field] = int(record[field])
+        segment["start"] = float(record["start"])
+        segment["end"] = float(record["end"])
+        segment["text"] = self.segment_text(index)
+        if has("tokens"):
+            offset = int(record["tokens_offset"])
+            segment["tokens"] = self.tokens[offset:offset + int(record["tokens_length"])].tolist()
+        for field in FLOAT_FIELDS:
+            if has(field):
+                segment[field] = float(record[field])
+        if has("speaker"):
+            segment["speaker"] = self.speakers[int(record["speaker"])]
+
+        segment.update(self.extra_fields.get(str(index), {}))
+        return segment
+
+    def iter_segments(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict]:
+        for index in range(start, len(self) if stop is None else stop):
+            yield self.segment(index)
+
+    def time_range(self, start_time: float, end_time: float) -> List[Dict]:
+        """Segments overlapping [start_time, end_time) seconds"""
+        # Segment starts are non-decreasing, so only the prefix before end_time can overlap
+        stop = int(np.searchsorted(self.starts, end_time, side="left"))
+        indices = np.nonzero(self.ends[:stop] > start_time)[0]
+        return [self.segment(int(i)) for i in indices]
+
+    def to_transcript_data(self) -> Dict:
+        """Rebuild the full JSON-compatible transcript dict"""
+        document = json.loads(json.dumps(self.header["document"]))
+        transcript = document.pop("transcript")
+        transcript["segments"] = list(self.iter_segments())
+
+        # Keep the key order of the JSON files bulk_transcribe writes
+        transcript_data = {}
+        if "metadata" in document:
+            transcript_data["metadata"] = document.pop("metadata")
+        transcript_data["transcript"] = transcript
+        transcript_data.update(document)
+        return transcript_data
+
+def load_transcript_file(path: Path) -> Dict:
+    """Load a transcript from JSON, a segment store or a streaming (.ndjson) file"""
+    if path.suffix == SEGMENT_STORE_SUFFIX:
+        return SegmentStore(path).to_transcript_data()
+    if path.suffix == STREAM_SUFFIX:
+        return TranscriptReader(path).to_transcript_data()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def read_transcript_stream(path: Path) -> Tuple[Dict, Iterator[Dict]]:
+    """(metadata, segment iterator) for any transcript format
+
+    Segment store and streaming files are read one segment at a time; JSON
+    has to be loaded whole first.
+    """
+    if path.suffix == SEGMENT_STORE_SUFFIX:
+        store = SegmentStore(path)
+        return store.header["document"].get("metadata", {}), store.iter_segments()
+    if path.suffix == STREAM_SUFFIX:
+        reader = TranscriptReader(path)
+        return reader.header.get("metadata", {}), reader.iter_segments()
+    transcript_data = load_transcript_file(path)
+    return transcript_data.get("metadata", {}), iter(transcript_data.get("transcript", {}).get("segments", []))
+
+def save_transcript_file(transcript_data: Dict, path: Path):
+    """Save a transcript as JSON, a segment store or a streaming file, based on the suffix"""
+    if path.suffix == SEGMENT_STORE_SUFFIX:
+        save_segment_store(transcript_data, path)
+        return
+    if path.suffix == STREAM_SUFFIX:
+        save_stream_transcript(transcript_data, path)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(transcript_data, f, indent=2, ensure_ascii=False)
+
+def main():
+    """Convert between JSON transcripts and segment store files"""
+    parser = argparse.ArgumentParser(description="Convert or query compact transcript segment stores")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser("convert", help="Convert a JSON transcript to a segment store")
+    convert.add_argument("input", type=Path)
+    convert.add_argument("output", type=Path, nargs="?")
+
+    export = subparsers.add_parser("export", help="Export a segment store back to JSON")
+    export.add_argument("input", type=Path)
+    export.add_argument("output", type=Path, nargs="?")
+
+    time_range = subparsers.add_parser("range", help="Print segments between two times (seconds)")
+    time_range.add_argument("input", type=Path)
+    time_range.add_argument("start", type=float)
+    time_range.add_argument("end", type=float)
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        output = args.output or args.input.with_suffix(SEGMENT_STORE_SUFFIX)
+        save_segment_store(load_transcript_file(args.input), output)
+        print(f"✓ Wrote {output} ({output.stat().st_size} bytes, was {args.input.stat().st_size})")
+    elif args.command == "export":
+        output = args.output or args.input.with_suffix(".json")
+        save_transcript_file(SegmentStore(args.input).to_transcript_data(), output)
+        print(f"✓ Exported {output}")
+    else:
+        for segment in SegmentStore(args.input).time_range(args.start, args.end):
+            speaker = f"{segment['speaker']}:" if "speaker" in segment else ""
+            print(f"[{segment['start']:.2f}-{segment['end']:.2f}] {speaker}{segment['text']}")
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,20 @@ Speaker Diarization Script for Ray Peat Transcripts
 Identifies and labels speakers in transcribed audio files
 """
 
-import json
 import re
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from metrics import add_metrics_arguments, configure_metrics, get_metrics
+from segment_store import TRANSCRIPT_FORMATS, load_transcript_file, save_transcript_file
+from transcript_search import SearchIndex
+from transcript_stream import STREAM_SUFFIX, TranscriptReader, TranscriptWriter
 
 # Configuration
+AUDIO_CACHE_DIR = Path("transcripts/audio-cache")
 RAW_TRANSCRIPTS_DIR = Path("transcripts/raw-transcripts")
 SPEAKER_LABELED_DIR = Path("transcripts/speaker-labeled-transcripts")
 
@@ -30,11 +37,45 @@ SPEAKER_PATTERNS = {
     ]
 }
 
+class SpeakerMatcher:
+    """SPEAKER_PATTERNS compiled once
+
+    Patterns stay separate regexes: each starts with a literal, which re
+    can jump to directly, where a combined alternation or lookahead would
+    have to try every position of the segment.
+    """
+
+    def __init__(self, speaker_patterns: Dict[str, List[str]]):
+        self.speakers = list(speaker_patterns)
+        self.pattern_regexes = {
+            speaker: [re.compile(pattern) for pattern in patterns]
+            for speaker, patterns in speaker_patterns.items()
+        }
+
+    def first_speaker(self, text_lower: str) -> Optional[str]:
+        """The highest-priority speaker mentioned in already-lowercased text"""
+        for speaker in self.speakers:
+            if any(regex.search(text_lower) for regex in self.pattern_regexes[speaker]):
+                return speaker
+        return None
+
+    def match_segments(self, segments: List[Dict]) -> List[Optional[str]]:
+        """First matching speaker for each segment, lowercasing each segment once"""
+        return [self.first_speaker(segment.get("text", "").lower()) for segment in segments]
+
+_speaker_matcher = None
+
+def get_speaker_matcher() -> SpeakerMatcher:
+    """Compile SPEAKER_PATTERNS on first use"""
+    global _speaker_matcher
+    if _speaker_matcher is None:
+        _speaker_matcher = SpeakerMatcher(SPEAKER_PATTERNS)
+    return _speaker_matcher
+
 def load_transcript(file_path: Path) -> Dict:
-    """Load a transcript JSON file"""
+    """Load a transcript JSON (or .segs / .ndjson) file"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_transcript_file(file_path)
     except Exception as e:
         print(f"Error loading {file_path}: {e}")
         return None
@@ -42,13 +83,14 @@ def load_transcript(file_path: Path) -> Dict:
 def identify_speakers(text: str) -> Dict[str, List[str]]:
     """Identify speakers from transcript text"""
     speakers_found = {}
+    text_lower = text.lower()
+    matcher = get_speaker_matcher()
 
     # Check for known speaker patterns
-    for speaker, patterns in SPEAKER_PATTERNS.items():
+    for speaker in matcher.speakers:
         found_segments = []
-        for pattern in patterns:
-            matches = re.finditer(pattern, text.lower())
-            for match in matches:
+        for regex in matcher.pattern_regexes[speaker]:
+            for match in regex.finditer(text_lower):
                 # Get context around the match
                 start = max(0, match.start() - 50)
                 end = min(len(text), match.end() + 50)
@@ -60,33 +102,28 @@ def identify_speakers(text: str) -> Dict[str, List[str]]:
 
     return speakers_found
 
-def analyze_segments_for_speakers(segments: List[Dict]) -> Dict[str, List[Dict]]:
-    """Analyze transcript segments to identify speaker patterns"""
+def analyze_segments_for_speakers(segments: List[Dict],
+                                  segment_matches: Optional[List[Optional[str]]] = None) -> Dict[str, List[Dict]]:
+    """Analyze transcript segments to identify speaker patterns
+
+    segment_matches is the output of SpeakerMatcher.match_segments(); pass it
+    in to reuse matches already computed for the same segments.
+    """
+    if segment_matches is None:
+        segment_matches = get_speaker_matcher().match_segments(segments)
+
     speakers = {}
 
-    for segment in segments:
-        text = segment.get("text", "").lower()
-        start_time = segment.get("start", 0)
-        end_time = segment.get("end", 0)
-
-        # Check for speaker indicators
-        speaker_found = None
-
-        for speaker, patterns in SPEAKER_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, text):
-                    if speaker not in speakers:
-                        speakers[speaker] = []
-                    speakers[speaker].append({
-                        "start": start_time,
-                        "end": end_time,
-                        "text": segment.get("text", ""),
-                        "confidence": 0.8  # Placeholder confidence score
-                    })
-                    speaker_found = speaker
-                    break
-            if speaker_found:
-                break
+    for segment, speaker in zip(segments, segment_matches):
+        if speaker is None:
+            continue
+
+        speakers.setdefault(speaker, []).append({
+            "start": segment.get("start", 0),
+            "end": segment.get("end", 0),
+            "text": segment.get("text", ""),
+            "confidence": 0.8  # Placeholder confidence score
+        })
 
     return speakers
 
@@ -95,10 +132,24 @@ def apply_speaker_labels(transcript_data: Dict) -> Dict:
     text = transcript_data["transcript"]["text"]
     segments = transcript_data["transcript"]["segments"]
 
+    # Match every segment once; the analysis and labelling below share the results
+    segment_matches = get_speaker_matcher().match_segments(segments)
+
     # Identify speakers from text and segments
     text_speakers = identify_speakers(text)
-    segment_speakers = analyze_segments_for_speakers(segments)
+    segment_speakers = analyze_segments_for_speakers(segments, segment_matches)
+
+    # Update transcript metadata
+    transcript_data["speaker_analysis"] = build_speaker_analysis(text_speakers, segment_speakers)
 
+    # Add speaker labels to segments where possible
+    for segment, speaker in zip(segments, segment_matches):
+        segment["speaker"] = speaker or "Unknown Speaker"
+
+    return transcript_data
+
+def build_speaker_analysis(text_speakers: Dict[str, List[str]], segment_speakers: Dict[str, List[Dict]]) -> Dict:
+    """The speaker_analysis block for pattern matching"""
     # Combine speaker information
     all_speakers = {}
     for speaker in set(list(text_speakers.keys()) + list(segment_speakers.keys())):
@@ -107,69 +158,170 @@ def apply_speaker_labels(transcript_data: Dict) -> Dict:
             "segment_evidence": segment_speakers.get(speaker, [])
         }
 
-    # Update transcript metadata
-    transcript_data["speaker_analysis"] = {
+    return {
         "identified_speakers": list(all_speakers.keys()),
         "speaker_evidence": all_speakers,
         "analysis_method": "pattern_matching",
         "analysis_date": __import__('datetime').datetime.now().isoformat()
     }
 
-    # Add speaker labels to segments where possible
-    for segment in segments:
-        segment_text = segment.get("text", "").lower()
-
-        # Find matching speaker
-        speaker_label = "Unknown Speaker"
-        for speaker, patterns in SPEAKER_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, segment_text):
-                    speaker_label = speaker
-                    break
-            if speaker_label != "Unknown Speaker":
-                break
-
-        segment["speaker"] = speaker_label
-
-    return transcript_data
-
-def process_transcript_file(input_path: Path, output_path: Path):
+def label_stream_file(input_path: Path, output_path: Path) -> int:
+    """apply_speaker_labels() for streaming transcripts, one segment in memory at a time
+
+    Text evidence comes from each segment plus the one before it (for
+    mentions split across segments) rather than from the whole transcript
+    text. Returns the number of segments written.
+    """
+    reader = TranscriptReader(input_path)
+    matcher = get_speaker_matcher()
+    text_speakers: Dict[str, List[str]] = {}
+    segment_speakers: Dict[str, List[Dict]] = {}
+    previous = ""
+
+    with TranscriptWriter(output_path, reader.header) as writer:
+        for segment in reader.iter_segments():
+            text = segment.get("text", "")
+            window = previous + text
+            window_lower = window.lower()
+            for speaker in matcher.speakers:
+                for regex in matcher.pattern_regexes[speaker]:
+                    for match in regex.finditer(window_lower):
+                        # Mentions wholly inside the previous segment were counted with it
+                        if match.end() <= len(previous):
+                            continue
+                        start = max(0, match.start() - 50)
+                        end = min(len(window), match.end() + 50)
+                        text_speakers.setdefault(speaker, []).append(window[start:end].strip())
+
+            speaker = matcher.first_speaker(text.lower())
+            if speaker:
+                segment_speakers.setdefault(speaker, []).append({
+                    "start": segment.get("start", 0),
+                    "end": segment.get("end", 0),
+                    "text": text,
+                    "confidence": 0.8  # Placeholder confidence score
+                })
+            segment["speaker"] = speaker or "Unknown Speaker"
+            writer.write_segment(segment)
+            previous = text
+
+        footer = dict(reader.footer)
+        footer.pop("segment_count", None)
+        footer["speaker_analysis"] = build_speaker_analysis(text_speakers, segment_speakers)
+        writer.close(footer)
+    return writer.segment_count
+
+def apply_acoustic_labels(transcript_data: Dict, use_pcm_cache: bool = False) -> Dict:
+    """Cluster speakers from the episode audio, falling back to text patterns without it"""
+    from acoustic_diarization import diarize_audio_file
+    from pcm_cache import PCMCache
+    from voiceprints import load_voiceprints
+
+    audio_path = AUDIO_CACHE_DIR / transcript_data.get("metadata", {}).get("audio_file", "")
+    if not audio_path.is_file():
+        print(f"! Audio not found for acoustic diarization, using text patterns: {audio_path}")
+        return apply_speaker_labels(transcript_data)
+    if not use_pcm_cache:
+        return diarize_audio_file(transcript_data, audio_path, get_speaker_matcher(), voiceprints=load_voiceprints())
+    with PCMCache() as pcm_cache:
+        return diarize_audio_file(transcript_data, audio_path, get_speaker_matcher(),
+                                  voiceprints=load_voiceprints(), pcm_cache=pcm_cache)
+
+def process_transcript_file(input_path: Path, output_path: Path, acoustic: bool = False,
+                            use_pcm_cache: bool = False):
     """Process a single transcript file for speaker diarization"""
     print(f"Processing: {input_path.name}")
+    metrics = get_metrics()
+
+    if input_path.suffix == STREAM_SUFFIX and not acoustic:
+        with metrics.stage("diarize", file=input_path.name, streaming=True) as stage:
+            try:
+                stage["segments"] = label_stream_file(input_path, output_path)
+                stage["bytes"] = input_path.stat().st_size
+                print(f"✓ Speaker labels applied: {output_path}")
+                return True
+            except (OSError, ValueError) as e:
+                print(f"✗ Failed to label {input_path.name}: {e}")
+                stage["error"] = f"{type(e).__name__}: {e}"
+                return False
 
     # Load transcript
-    transcript_data = load_transcript(input_path)
-    if not transcript_data:
-        return False
+    with metrics.stage("load", file=input_path.name) as stage:
+        transcript_data = load_transcript(input_path)
+        if not transcript_data:
+            stage["error"] = "unreadable transcript"
+            return False
+        stage["bytes"] = input_path.stat().st_size
 
     # Apply speaker analysis
-    updated_transcript = apply_speaker_labels(transcript_data)
+    with metrics.stage("diarize", file=input_path.name, acoustic=acoustic) as stage:
+        with metrics.profile("diarize", input_path.name):
+            if acoustic:
+                updated_transcript = apply_acoustic_labels(transcript_data, use_pcm_cache)
+            else:
+                updated_transcript = apply_speaker_labels(transcript_data)
+        stage["audio_seconds"] = updated_transcript.get("metadata", {}).get("audio_duration")
 
     # Save updated transcript
+    with metrics.stage("serialize", file=output_path.name) as stage:
+        try:
+            save_transcript_file(updated_transcript, output_path)
+            stage["bytes"] = output_path.stat().st_size
+            print(f"✓ Speaker labels applied: {output_path}")
+            return True
+        except Exception as e:
+            print(f"✗ Failed to save {output_path}: {e}")
+            stage["error"] = f"{type(e).__name__}: {e}"
+            return False
+
+def speaker_output_path(transcript_file: Path) -> Path:
+    """Speaker-labeled output path for a raw transcript"""
+    relative_path = transcript_file.relative_to(RAW_TRANSCRIPTS_DIR)
+    output_path = SPEAKER_LABELED_DIR / relative_path
+
+    # Replace "_raw.json" with "_speakers.json" (likewise for .segs and .ndjson)
+    suffix = output_path.suffix
+    return output_path.with_name(output_path.name.replace(f"_raw{suffix}", f"_speakers{suffix}"))
+
+def is_up_to_date(input_path: Path, output_path: Path) -> bool:
+    """True if output_path exists and is newer than input_path"""
+    return output_path.exists() and output_path.stat().st_mtime >= input_path.stat().st_mtime
+
+def process_transcript_job(paths: Tuple[Path, Path], acoustic: bool = False,
+                           use_pcm_cache: bool = False) -> Tuple[bool, Optional[str]]:
+    """Pool entry point: never raises, so one bad file can't take down the batch"""
+    input_path, output_path = paths
     try:
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(updated_transcript, f, indent=2, ensure_ascii=False)
-        print(f"✓ Speaker labels applied: {output_path}")
-        return True
+        return process_transcript_file(input_path, output_path, acoustic, use_pcm_cache), None
     except Exception as e:
-        print(f"✗ Failed to save {output_path}: {e}")
-        return False
+        return False, f"{type(e).__name__}: {e}"
 
 def find_transcript_files() -> List[Path]:
     """Find all raw transcript files"""
     transcript_files = []
     if RAW_TRANSCRIPTS_DIR.exists():
-        for json_file in RAW_TRANSCRIPTS_DIR.glob("**/*_raw.json"):
-            transcript_files.append(json_file)
+        for suffix in TRANSCRIPT_FORMATS.values():
+            for transcript_file in RAW_TRANSCRIPTS_DIR.glob(f"**/*_raw{suffix}"):
+                transcript_files.append(transcript_file)
     return sorted(transcript_files)
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """Main speaker diarization function"""
     parser = argparse.ArgumentParser(description="Apply speaker diarization to Ray Peat transcripts")
     parser.add_argument("--limit", type=int, help="Limit number of files to process")
     parser.add_argument("--file", type=str, help="Process specific file")
-    args = parser.parse_args()
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip files whose _speakers.json is newer than the _raw.json")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Don't update the search index with the speaker-labeled transcripts")
+    parser.add_argument("--acoustic", action="store_true",
+                        help="Cluster voices in the audio (needs ffmpeg and the audio cache) and name clusters from text patterns")
+    parser.add_argument("--pcm-cache", action="store_true",
+                        help="With --acoustic, read audio from the shared decoded PCM cache")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = configure_metrics(args)
 
     # Get transcript files
     transcript_files = find_transcript_files()
@@ -186,30 +338,54 @@ def main():
     if args.limit:
         transcript_files = transcript_files[:args.limit]
 
-    print(f"Processing {len(transcript_files)} files...")
+    jobs = [(transcript_file, speaker_output_path(transcript_file)) for transcript_file in transcript_files]
+
+    if args.incremental:
+        total = len(jobs)
+        jobs = [(input_path, output_path) for input_path, output_path in jobs
+                if not is_up_to_date(input_path, output_path)]
+        print(f"Skipping {total - len(jobs)} up-to-date files")
+
+    print(f"Processing {len(jobs)} files...")
 
     # Process files
     processed = 0
     successful = 0
+    job = partial(process_transcript_job, acoustic=args.acoustic, use_pcm_cache=args.pcm_cache)
 
-    for transcript_file in transcript_files:
-        # Create output path in speaker-labeled directory
-        relative_path = transcript_file.relative_to(RAW_TRANSCRIPTS_DIR)
-        output_path = SPEAKER_LABELED_DIR / relative_path
+    if args.jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        # map() yields in submission order, so progress stays ordered
+        results = executor.map(job, jobs, chunksize=4)
+    else:
+        executor = None
+        results = map(job, jobs)
 
-        # Replace "_raw.json" with "_speakers.json"
-        output_path = output_path.with_name(output_path.name.replace("_raw.json", "_speakers.json"))
+    # Indexed here in the parent: SQLite wants a single writer
+    search_index = None if args.no_index else SearchIndex()
 
-        if process_transcript_file(transcript_file, output_path):
-            successful += 1
-
-        processed += 1
-
-        if processed % 10 == 0:
-            print(f"--- Progress: {processed}/{len(transcript_files)} files processed, {successful} successful ---")
-
-    print("
-=== Final Summary ===")
+    try:
+        for (transcript_file, output_path), (ok, error) in zip(jobs, results):
+            if ok:
+                successful += 1
+                if search_index:
+                    search_index.index_file(output_path)
+            elif error:
+                print(f"✗ Failed to process {transcript_file.name}: {error}")
+
+            processed += 1
+
+            if processed % 10 == 0:
+                print(f"--- Progress: {processed}/{len(jobs)} files processed, {successful} successful ---")
+    finally:
+        if executor:
+            executor.shutdown()
+        if search_index:
+            search_index.close()
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
+
+    print("\n=== Final Summary ===")
     print(f"Total files processed: {processed}")
     print(f"Successful speaker labeling: {successful}")
     print(f"Failed: {processed - successful}")
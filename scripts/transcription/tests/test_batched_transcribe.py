@@ -0,0 +1,59 @@
+"""Regression tests for batched_transcribe: failed files must not abort the rest of the batch"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import batched_transcribe  # noqa: E402
+
+WINDOW = np.zeros(16000, dtype=np.int16)
+
+class FakeEngine:
+    method = "fake"
+
+    def __init__(self, fail_windows=()):
+        self.fail_windows = set(fail_windows)
+
+    def transcribe_batch(self, windows):
+        if any(len(window) in self.fail_windows for window in windows):
+            raise RuntimeError("batch failed")
+        return [self.transcribe(window) for window in windows]
+
+    def transcribe(self, window):
+        if len(window) in self.fail_windows:
+            raise RuntimeError("window failed")
+        return {"text": " x", "segments": [{"start": 0.0, "end": 1.0, "text": " x"}], "language": "en"}
+
+def run(monkeypatch, chunks_by_file, engine, batch_size=8):
+    def iter_audio_chunks(audio_path, window_seconds, pcm_cache=None):
+        for index, chunk in enumerate(chunks_by_file[audio_path.name]):
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield index, index * 30.0, chunk
+
+    monkeypatch.setattr(batched_transcribe, "iter_audio_chunks", iter_audio_chunks)
+    files = [Path(name) for name in chunks_by_file]
+    results = batched_transcribe.transcribe_batched(files, engine, batch_size=batch_size, max_wait=5.0)
+    return {audio_file.name: result for audio_file, result, _ in results}
+
+def test_decode_failure_mid_file(monkeypatch):
+    results = run(monkeypatch, {
+        "a.mp3": [WINDOW, WINDOW, WINDOW, RuntimeError("corrupt frame")],
+        "b.mp3": [WINDOW, WINDOW],
+    }, FakeEngine())
+
+    assert results["a.mp3"] is None
+    assert len(results["b.mp3"]["segments"]) == 2
+
+def test_failed_window_with_later_windows_pending(monkeypatch):
+    bad = np.zeros(8000, dtype=np.int16)
+    results = run(monkeypatch, {
+        "a.mp3": [WINDOW, bad, WINDOW, WINDOW],
+        "b.mp3": [WINDOW],
+    }, FakeEngine(fail_windows={len(bad)}), batch_size=2)
+
+    assert results["a.mp3"] is None
+    assert len(results["b.mp3"]["segments"]) == 1
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+transcribr: One Command Line for the Ray Peat Transcription Scripts
+download, transcribe and diarize run the existing scripts; status
+summarizes the corpus. Each subcommand imports only what it needs, so a
+status check never loads numpy or requests. When `transcribr daemon` is
+running, the script subcommands run inside that warm process over a local
+socket. Repeat calls then skip interpreter start-up, imports and, with the
+in-process engines, model loading.
+"""
+
+import os
+import sys
+import json
+import signal
+import socket
+import argparse
+import importlib
+import threading
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Configuration
+DAEMON_SOCKET_PATH = Path("transcripts/transcribr.sock")
+PING_TIMEOUT_SECONDS = 2.0  # a daemon answers pings even mid-command, so silence means it is hung
+AUDIO_CACHE_DIR = Path("transcripts/audio-cache")
+RAW_TRANSCRIPTS_DIR = Path("transcripts/raw-transcripts")
+SPEAKER_LABELED_DIR = Path("transcripts/speaker-labeled-transcripts")
+# segment_store.TRANSCRIPT_FORMATS suffixes, repeated so status doesn't import numpy
+TRANSCRIPT_SUFFIXES = (".json", ".segs", ".ndjson")
+
+# Subcommand → script module whose main(argv) runs it
+SCRIPT_COMMANDS = {
+    "download": "download_audio",
+    "transcribe": "bulk_transcribe",
+    "diarize": "speaker_diarization",
+}
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+def run_script(command: str, argv: List[str]) -> int:
+    """Run a script's main() in this process; returns its exit status"""
+    module = importlib.import_module(SCRIPT_COMMANDS[command])
+    try:
+        module.main(argv)
+    except SystemExit as e:
+        # argparse errors and --help exit; the daemon must survive both
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
+def count_transcripts(directory: Path, kind: str) -> int:
+    if not directory.exists():
+        return 0
+    return sum(1 for path in directory.glob(f"**/*_{kind}.*") if path.suffix in TRANSCRIPT_SUFFIXES)
+
+def show_status(socket_path: Path):
+    """Audio, transcripts, manifest, job queue and daemon at a glance"""
+    from job_queue import JOB_QUEUE_PATH, JobQueue
+    from manifest import MANIFEST_PATH, TranscriptionManifest
+
+    audio_files = list(AUDIO_CACHE_DIR.glob("**/*.mp3")) if AUDIO_CACHE_DIR.exists() else []
+    audio_bytes = sum(path.stat().st_size for path in audio_files)
+    print(f"Audio cache:        {len(audio_files)} files ({audio_bytes / 1024 ** 3:.1f} GB)")
+    print(f"Raw transcripts:    {count_transcripts(RAW_TRANSCRIPTS_DIR, 'raw')}")
+    print(f"Speaker-labeled:    {count_transcripts(SPEAKER_LABELED_DIR, 'speakers')}")
+
+    if MANIFEST_PATH.exists():
+        with TranscriptionManifest() as manifest:
+            for model, counts in sorted(manifest.summary().items()):
+                print(f"Manifest {model}: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+
+    if JOB_QUEUE_PATH.exists():
+        with JobQueue() as queue:
+            print("Job queue:          " + "  ".join(f"{status}: {n}" for status, n in queue.counts().items()))
+
+    info = daemon_request(socket_path, {"ping": True}, timeout=PING_TIMEOUT_SECONDS)
+    if info and "pid" in info:
+        busy = ", running a command" if info.get("busy") else ""
+        print(f"Daemon:             running (pid {info['pid']}, {info['served']} commands served{busy}) on {socket_path}")
+    elif info:
+        print(f"Daemon:             not responding on {socket_path} ({info['error']})")
+    else:
+        print("Daemon:             not running")
+
+def daemon_request(socket_path: Path, request: Dict, timeout: Optional[float] = None) -> Optional[Dict]:
+    """Send one request, relay any output, return the final message; None if no daemon is listening
+
+    timeout bounds each wait on the socket; a daemon that accepts the
+    connection but stays silent past it yields an error message.
+    """
+    if not socket_path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(socket_path))
+    except socket.timeout:
+        sock.close()
+        return {"exit": 1, "error": "daemon did not accept the connection"}
+    except OSError:
+        # Left behind by a daemon that was killed
+        sock.close()
+        return None
+
+    with sock, sock.makefile("rwb") as stream:
+        try:
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if "out" in message:
+                    sys.stdout.write(message["out"])
+                    sys.stdout.flush()
+                else:
+                    return message
+        except socket.timeout:
+            return {"exit": 1, "error": f"daemon did not answer within {timeout:g}s"}
+    return {"exit": 1, "error": "daemon closed the connection"}
+
+class SocketOutput:
+    """File-like stdout/stderr replacement that forwards writes to the client"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.connected = True
+
+    def write(self, text: str) -> int:
+        if text and self.connected:
+            try:
+                self.stream.write(json.dumps({"out": text}, ensure_ascii=False).encode() + b"\n")
+                self.stream.flush()
+            except OSError:
+                # The client went away; let the command finish rather than fail halfway
+                self.connected = False
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+@contextmanager
+def isolated_run(cwd: str):
+    """Run a command as if in a fresh process: its cwd, and settings and environment restored afterwards
+
+    Scripts assign module-level configuration from their arguments (e.g.
+    bulk_transcribe --output-dir) and export metrics settings through the
+    environment; neither may leak into the next command.
+    """
+    modules = [module for module in list(sys.modules.values())
+               if getattr(module, "__file__", None) and Path(module.__file__).resolve().parent == SCRIPTS_DIR]
+    settings = [(module, {name: value for name, value in vars(module).items() if name.isupper()})
+                for module in modules]
+    environ = dict(os.environ)
+    previous_cwd = os.getcwd()
+    os.chdir(cwd)
+    try:
+        yield
+    finally:
+        os.chdir(previous_cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+        for module, values in settings:
+            vars(module).update(values)
+
+def raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(socket_path: Path, preload: List[str]):
+    """Keep the scripts imported (and models loaded) and run commands sent over the socket
+
+    Each connection gets its own thread so pings are answered while a
+    command runs, but commands themselves run one at a time: they share
+    the process's cwd, environment, stdout and module settings.
+    """
+    import socketserver
+
+    if daemon_request(socket_path, {"ping": True}, timeout=PING_TIMEOUT_SECONDS):
+        print(f"A daemon is already listening on {socket_path}")
+        return 1
+    if socket_path.exists():
+        socket_path.unlink()
+
+    for module in SCRIPT_COMMANDS.values():
+        importlib.import_module(module)
+    if preload:
+        from bulk_transcribe import WHISPER_LANGUAGE
+        from engines import get_engine
+
+        for spec in preload:
+            engine_name, _, model = spec.partition(":")
+            engine = get_engine(engine_name, model, WHISPER_LANGUAGE)
+            print(f"Loading {engine.method}...")
+            engine.load()
+
+    served = 0
+    command_lock = threading.Lock()
+
+    class ThreadingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    class CommandHandler(socketserver.StreamRequestHandler):
+        def _send(self, message: Dict):
+            self.wfile.write(json.dumps(message).encode() + b"\n")
+
+        def handle(self):
+            nonlocal served
+            request = json.loads(self.rfile.readline() or b"{}")
+            if request.get("ping"):
+                self._send({"pid": os.getpid(), "served": served, "busy": command_lock.locked()})
+                return
+            if request.get("command") not in SCRIPT_COMMANDS:
+                self._send({"exit": 2, "error": f"unknown command {request.get('command')!r}"})
+                return
+
+            output = SocketOutput(self.wfile)
+            with command_lock:
+                with isolated_run(request["cwd"]), redirect_stdout(output), redirect_stderr(output):
+                    try:
+                        code = run_script(request["command"], request["argv"])
+                    except Exception as e:
+                        print(f"✗ {request['command']} failed: {type(e).__name__}: {e}")
+                        code = 1
+                served += 1
+            if output.connected:
+                self._send({"exit": code})
+
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    server = ThreadingServer(str(socket_path), CommandHandler)
+    print(f"transcribr daemon listening on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        server.server_close()
+        if socket_path.exists():
+            socket_path.unlink()
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Dispatch a subcommand, through the daemon when one is running"""
+    parser = argparse.ArgumentParser(prog="transcribr", description="Ray Peat transcription tools")
+    parser.add_argument("--root", type=Path, help="Project root holding transcripts/ (default: current directory)")
+    parser.add_argument("--socket", type=Path, default=DAEMON_SOCKET_PATH,
+                        help=f"Daemon socket (default: {DAEMON_SOCKET_PATH})")
+    parser.add_argument("--no-daemon", action="store_true", help="Run in this process even if a daemon is running")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command, module in SCRIPT_COMMANDS.items():
+        # `transcribr <command> --help` shows the script's own options
+        subparsers.add_parser(command, add_help=False, help=f"Run {module}.py")
+    subparsers.add_parser("status", help="Summarize audio, transcripts, the manifest, job queue and daemon")
+    daemon_parser = subparsers.add_parser("daemon", help="Serve the other subcommands from one warm process")
+    daemon_parser.add_argument("--preload", action="append", default=[], metavar="ENGINE:MODEL",
+                               help="Load this model at start-up, e.g. whisper:small (repeatable)")
+
+    # Everything after a script subcommand belongs to the script, options included
+    argv = sys.argv[1:] if argv is None else list(argv)
+    split = next((i for i, arg in enumerate(argv) if arg in SCRIPT_COMMANDS), len(argv))
+    args = parser.parse_args(argv[:split + 1])
+    script_args = argv[split + 1:]
+    if args.root:
+        os.chdir(args.root)
+
+    if args.command == "status":
+        show_status(args.socket)
+        return 0
+    if args.command == "daemon":
+        return serve(args.socket, args.preload)
+
+    if not args.no_daemon:
+        reply = daemon_request(args.socket, {"command": args.command, "argv": script_args, "cwd": os.getcwd()})
+        if reply is not None:
+            if reply.get("error"):
+                print(f"✗ {reply['error']}", file=sys.stderr)
+            return reply.get("exit", 1)
+
+    return run_script(args.command, script_args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Transcript Search Index for Ray Peat Transcripts
+Incrementally indexes transcript segments into SQLite FTS5 and returns
+ranked hits with millisecond timestamps for deep links into the audio
+"""
+
+import re
+import sqlite3
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from segment_store import TRANSCRIPT_FORMATS, read_transcript_stream
+
+# Configuration
+SEARCH_INDEX_PATH = Path("transcripts/search-index.sqlite")
+RAW_TRANSCRIPTS_DIR = Path("transcripts/raw-transcripts")
+SPEAKER_LABELED_DIR = Path("transcripts/speaker-labeled-transcripts")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    episode TEXT UNIQUE NOT NULL,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    title TEXT,
+    show TEXT,
+    year TEXT,
+    audio_file TEXT,
+    first_rowid INTEGER,
+    last_rowid INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5(
+    text,
+    speaker,
+    doc_id UNINDEXED,
+    start_ms UNINDEXED,
+    end_ms UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+TRANSCRIPT_PATTERN = re.compile(r"_(raw|speakers)(\.json|\.segs|\.ndjson)$")
+
+def episode_key(path: Path) -> Optional[str]:
+    """show/year/name shared by an episode's _raw and _speakers files"""
+    match = TRANSCRIPT_PATTERN.search(path.name)
+    if not match:
+        return None
+    return f"{path.parent.parent.name}/{path.parent.name}/{path.name[:match.start()]}"
+
+class SearchIndex:
+    """SQLite FTS5 index over transcript segments"""
+
+    def __init__(self, path: Path = SEARCH_INDEX_PATH):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        if "first_rowid" not in columns:
+            # Index built before segment rowid ranges were recorded
+            with self.conn:
+                self.conn.execute("ALTER TABLE documents ADD COLUMN first_rowid INTEGER")
+                self.conn.execute("ALTER TABLE documents ADD COLUMN last_rowid INTEGER")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def index_file(self, path: Path) -> bool:
+        """(Re)index one transcript file; returns False if it was already current
+
+        A speaker-labeled transcript supersedes the raw transcript of the same
+        episode, so each episode is indexed once.
+        """
+        episode = episode_key(path)
+        if episode is None:
+            return False
+        kind = TRANSCRIPT_PATTERN.search(path.name).group(1)
+
+        stat = path.stat()
+        row = self.conn.execute("SELECT * FROM documents WHERE episode = ?", (episode,)).fetchone()
+        if row:
+            if row["kind"] == "speakers" and kind == "raw" and Path(row["path"]).exists():
+                return False
+            if row["path"] == str(path) and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+                return False
+
+        # Segments go straight from the file into the index where the format allows
+        metadata, segments = read_transcript_stream(path)
+
+        with self.conn:
+            if row:
+                self._delete_document(row)
+            cursor = self.conn.execute(
+                "INSERT INTO documents (episode, path, kind, size, mtime_ns, title, show, year, audio_file) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (episode, str(path), kind, stat.st_size, stat.st_mtime_ns, metadata.get("title"),
+                 metadata.get("show"), path.parent.name, metadata.get("audio_file"))
+            )
+            doc_id = cursor.lastrowid
+            # Explicit consecutive rowids, so the document can later be deleted by range
+            last = self.conn.execute("SELECT rowid FROM segments ORDER BY rowid DESC LIMIT 1").fetchone()
+            first_rowid = (last[0] if last else 0) + 1
+            count = 0
+
+            def rows():
+                nonlocal count
+                for count, segment in enumerate(segments, 1):
+                    yield (first_rowid + count - 1, segment.get("text", "").strip(), segment.get("speaker", ""),
+                           doc_id, int(round(segment.get("start", 0) * 1000)), int(round(segment.get("end", 0) * 1000)))
+
+            self.conn.executemany(
+                "INSERT INTO segments (rowid, text, speaker, doc_id, start_ms, end_ms) VALUES (?, ?, ?, ?, ?, ?)",
+                rows()
+            )
+            self.conn.execute("UPDATE documents SET first_rowid = ?, last_rowid = ? WHERE id = ?",
+                              (first_rowid, first_rowid + count - 1, doc_id))
+        return True
+
+    def _delete_document(self, row: sqlite3.Row):
+        """Remove a document and its segments; call inside a transaction
+
+        doc_id is an UNINDEXED column, so filtering segments on it scans the
+        whole index. Deleting the document's rowid range is a b-tree lookup.
+        """
+        if row["first_rowid"] is not None:
+            self.conn.execute("DELETE FROM segments WHERE rowid BETWEEN ? AND ?",
+                              (row["first_rowid"], row["last_rowid"]))
+        else:
+            self.conn.execute("DELETE FROM segments WHERE doc_id = ?", (row["id"],))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (row["id"],))
+
+    def prune(self) -> int:
+        """Drop documents whose transcript file no longer exists"""
+        stale = [row for row in self.conn.execute("SELECT id, path, first_rowid, last_rowid FROM documents")
+                 if not Path(row["path"]).exists()]
+        with self.conn:
+            for row in stale:
+                self._delete_document(row)
+        return len(stale)
+
+    def search(self, query: str, show: Optional[str] = None, year: Optional[str] = None,
+               speaker: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Ranked segment hits for an FTS5 query"""
+        sql = """
+            SELECT d.title, d.show, d.year, d.audio_file, d.path,
+                   s.speaker, s.start_ms, s.end_ms,
+                   snippet(segments, 0, '[', ']', '…', 12) AS snippet,
+                   bm25(segments) AS score
+            FROM segments s JOIN documents d ON d.id = s.doc_id
+            WHERE segments MATCH ?
+        """
+        params: List = [query]
+        if show:
+            sql += " AND d.show LIKE ?"
+            params.append(f"%{show}%")
+        if year:
+            sql += " AND d.year = ?"
+            params.append(year)
+        if speaker:
+            sql += " AND s.speaker LIKE ?"
+            params.append(f"%{speaker}%")
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        hits = []
+        for row in self.conn.execute(sql, params):
+            hit = dict(row)
+            # Media fragment link, e.g. episode.mp3#t=754.32
+            hit["link"] = f"{hit['audio_file']}#t={hit['start_ms'] / 1000:.2f}"
+            hits.append(hit)
+        return hits
+
+def find_indexable_files() -> List[Path]:
+    """All raw and speaker-labeled transcripts, in any storage format"""
+    files = []
+    for directory, kind in ((RAW_TRANSCRIPTS_DIR, "raw"), (SPEAKER_LABELED_DIR, "speakers")):
+        if directory.exists():
+            for suffix in TRANSCRIPT_FORMATS.values():
+                files.extend(directory.glob(f"**/*_{kind}{suffix}"))
+    # Speaker-labeled files last, so they replace the raw version in one pass
+    return sorted(files, key=lambda f: (TRANSCRIPT_PATTERN.search(f.name).group(1) == "speakers", str(f)))
+
+def select_transcripts() -> List[Path]:
+    """One transcript per episode, preferring the speaker-labeled version"""
+    chosen = {}
+    # find_indexable_files() lists speaker-labeled files after raw ones
+    for path in find_indexable_files():
+        chosen[episode_key(path)] = path
+    return sorted(chosen.values())
+
+def format_timestamp(ms: int) -> str:
+    seconds = ms // 1000
+    return f"{seconds // 3600:d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{ms % 1000:03d}"
+
+def main():
+    """Build or query the transcript search index"""
+    parser = argparse.ArgumentParser(description="Search Ray Peat transcripts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Index new and changed transcripts")
+    index_parser.add_argument("--rebuild", action="store_true", help="Drop the index and start over")
+
+    query_parser = subparsers.add_parser("query", help="Search the index (FTS5 query syntax)")
+    query_parser.add_argument("query")
+    query_parser.add_argument("--show", help="Only shows whose name contains this")
+    query_parser.add_argument("--year", help="Only this year")
+    query_parser.add_argument("--speaker", help="Only segments whose speaker label contains this")
+    query_parser.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == "index":
+        if args.rebuild and SEARCH_INDEX_PATH.exists():
+            SEARCH_INDEX_PATH.unlink()
+
+        with SearchIndex() as index:
+            files = find_indexable_files()
+            updated = 0
+            for path in files:
+                try:
+                    if index.index_file(path):
+                        updated += 1
+                        print(f"✓ Indexed: {path}")
+                except (OSError, ValueError) as e:
+                    print(f"✗ Failed to index {path}: {e}")
+            removed = index.prune()
+
+        print(f"\n{updated} transcripts indexed, {len(files) - updated} unchanged, {removed} removed")
+        return
+
+    with SearchIndex() as index:
+        try:
+            hits = index.search(args.query, args.show, args.year, args.speaker, args.limit)
+        except sqlite3.OperationalError as e:
+            print(f"Invalid query: {e}")
+            return
+
+    for hit in hits:
+        speaker = f" {hit['speaker']}:" if hit["speaker"] else ""
+        print(f"{hit['title']}  [{format_timestamp(hit['start_ms'])}]  {hit['link']}")
+        print(f"   {speaker} {hit['snippet']}\n")
+    print(f"{len(hits)} hits")
+
+if __name__ == "__main__":
+    main()
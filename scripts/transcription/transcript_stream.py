@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Streaming Transcript Format for Ray Peat Transcripts
+Newline-delimited JSON: a header line, one line per segment, and a footer
+line. Writers append segments as they are produced and readers iterate
+them, so neither side holds a whole episode in memory. The transcript-wide
+text is not stored; it is the concatenation of the segment texts.
+
+File layout:
+    {"header": {metadata, ...}}
+    {"start": ..., "end": ..., "text": ..., ...}     one per segment
+    {"footer": {"segment_count": N, speaker_analysis, quality_metrics, ...}}
+"""
+
+import os
+import json
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+STREAM_SUFFIX = ".ndjson"
+FOOTER_SCAN_BYTES = 64 * 1024  # read backwards this far at a time looking for the footer line
+
+class TranscriptWriter:
+    """Append segments to a streaming transcript; the file appears atomically on close()
+
+    Used as a context manager, an exception discards the partial file.
+    """
+
+    def __init__(self, path: Path, header: Dict):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        self.file = open(self.tmp_path, 'w', encoding='utf-8')
+        self.segment_count = 0
+        self._line({"header": header})
+
+    def _line(self, record: Dict):
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write("\n")
+
+    def write_segment(self, segment: Dict):
+        self._line(segment)
+        self.segment_count += 1
+
+    def close(self, footer: Optional[Dict] = None):
+        """Write the footer (fields only known after the last segment) and move the file into place"""
+        self._line({"footer": dict(footer or {}, segment_count=self.segment_count)})
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.abort()
+        elif not self.file.closed:
+            self.close()
+
+class TranscriptReader:
+    """Header up front, segments as an iterator, footer read from the end of the file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            first = json.loads(f.readline() or "{}")
+        if "header" not in first:
+            raise ValueError(f"Not a streaming transcript: {self.path}")
+        self.header = first["header"]
+        self._footer = None
+
+    def iter_segments(self) -> Iterator[Dict]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.readline()
+            for line in f:
+                record = json.loads(line)
+                if "footer" in record:
+                    self._footer = record["footer"]
+                    return
+                yield record
+        raise ValueError(f"Truncated streaming transcript (no footer): {self.path}")
+
+    @property
+    def footer(self) -> Dict:
+        """The footer line, found by scanning back from the end of the file"""
+        if self._footer is None:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                end = f.tell()
+                tail = b""
+                while end > 0 and tail.count(b"\n") < 2:
+                    start = max(0, end - FOOTER_SCAN_BYTES)
+                    f.seek(start)
+                    tail = f.read(end - start) + tail
+                    end = start
+            record = json.loads(tail.rstrip(b"\n").rsplit(b"\n", 1)[-1])
+            if "footer" not in record:
+                raise ValueError(f"Truncated streaming transcript (no footer): {self.path}")
+            self._footer = record["footer"]
+        return self._footer
+
+    def to_transcript_data(self) -> Dict:
+        """Rebuild the full JSON-compatible transcript dict (loads every segment)"""
+        segments = list(self.iter_segments())
+        footer = dict(self.footer)
+        footer.pop("segment_count", None)
+        transcript = footer.pop("transcript", {})
+        transcript.setdefault("text", "".join(segment.get("text", "") for segment in segments))
+        transcript["segments"] = segments
+
+        # Keep the key order of the JSON files bulk_transcribe writes
+        transcript_data = {}
+        header = dict(self.header)
+        if "metadata" in header:
+            transcript_data["metadata"] = header.pop("metadata")
+        transcript_data["transcript"] = transcript
+        transcript_data.update(header)
+        transcript_data.update(footer)
+        return transcript_data
+
+def save_stream_transcript(transcript_data: Dict, path: Path):
+    """Write a full transcript dict in the streaming format"""
+    transcript = transcript_data["transcript"]
+    segments = transcript["segments"]
+    header = {key: value for key, value in transcript_data.items() if key in ("metadata",)}
+    footer = {key: value for key, value in transcript_data.items() if key not in ("metadata", "transcript")}
+
+    extra = {key: value for key, value in transcript.items() if key not in ("text", "segments")}
+    if transcript.get("text", "") != "".join(segment.get("text", "") for segment in segments):
+        # Only kept when it can't be rebuilt from the segments
+        extra["text"] = transcript.get("text", "")
+    if extra:
+        footer["transcript"] = extra
+
+    with TranscriptWriter(path, header) as writer:
+        for segment in segments:
+            writer.write_segment(segment)
+        writer.close(footer)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Voiceprint Store for Recurring Ray Peat Hosts and Guests
+Keeps enrolled speaker embeddings in one compact on-disk matrix so acoustic
+diarization can name clusters by voice instead of re-deriving identities
+from text patterns in every episode
+"""
+
+import os
+import re
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from segment_store import load_transcript_file
+
+# Configuration
+VOICEPRINT_PATH = Path("transcripts/voiceprints.npz")
+MATCH_THRESHOLD = 0.6        # cosine similarity needed to name a cluster by voice
+FOLD_THRESHOLD = 0.95        # closer than this to an existing print: fold in rather than add a row
+UNNAMED_SPEAKER = re.compile(r"^(Speaker \d+|Unknown Speaker)$")
+
+class VoiceprintStore:
+    """Enrolled speaker embeddings plus the background statistics used to compare them
+
+    Rows of `prints` are raw (un-normalized) cluster centroids, several per
+    speaker when their voice varies between recordings. Comparisons
+    standardize against the pooled mean/variance of every enrolled episode,
+    so they don't depend on any single episode's mix of voices.
+    """
+
+    def __init__(self, path: Path = VOICEPRINT_PATH):
+        self.path = path
+        self.prints = np.zeros((0, 0), dtype=np.float32)
+        self.names: List[str] = []
+        self.weights = np.zeros(0, dtype=np.float64)
+        self.episodes: List[str] = []
+        self.background = None  # (count, sum, sum of squares)
+
+        if path.exists():
+            with np.load(path) as data:
+                self.prints = data["prints"]
+                self.names = [str(name) for name in data["names"]]
+                self.weights = data["weights"]
+                self.episodes = [str(episode) for episode in data["episodes"]]
+                self.background = (float(data["background_count"]), data["background_sum"], data["background_sumsq"])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def speakers(self) -> List[str]:
+        return sorted(set(self.names))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp.npz")
+        count, total, squares = self.background
+        np.savez(tmp_path, prints=self.prints, names=np.array(self.names, dtype=str), weights=self.weights,
+                 episodes=np.array(self.episodes, dtype=str), background_count=count,
+                 background_sum=total, background_sumsq=squares)
+        os.replace(tmp_path, self.path)
+
+    def _standardize(self, vectors: np.ndarray) -> np.ndarray:
+        count, total, squares = self.background
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0.0)) + 1e-6
+        z = (vectors - mean) / std
+        return z / (np.linalg.norm(z, axis=1, keepdims=True) + 1e-9)
+
+    def match(self, centroids: np.ndarray, threshold: float = MATCH_THRESHOLD) -> Dict[int, Tuple[str, float]]:
+        """Map cluster index → (speaker, similarity) for clusters that sound like an enrolled speaker
+
+        A speaker's score is its best print. Each speaker is given to at most
+        one cluster, best matches first.
+        """
+        if not len(self) or not len(centroids):
+            return {}
+
+        similarity = self._standardize(centroids) @ self._standardize(self.prints).T
+        speakers = self.speakers
+        names = np.array(self.names)
+        # (clusters, speakers): best print per speaker
+        scores = np.stack([similarity[:, names == speaker].max(axis=1) for speaker in speakers], axis=1)
+
+        matches: Dict[int, Tuple[str, float]] = {}
+        taken = set()
+        for flat in np.argsort(scores, axis=None)[::-1]:
+            cluster, speaker = np.unravel_index(flat, scores.shape)
+            score = float(scores[cluster, speaker])
+            if score < threshold:
+                break
+            if cluster in matches or speaker in taken:
+                continue
+            matches[int(cluster)] = (speakers[speaker], round(score, 3))
+            taken.add(speaker)
+        return matches
+
+    def enroll(self, speaker: str, centroid: np.ndarray, windows: int):
+        """Add a confirmed speaker centroid, folding it into a near-identical existing print"""
+        centroid = np.asarray(centroid, dtype=np.float32)
+        if len(self) and self.background:
+            same = np.array([name == speaker for name in self.names])
+            if same.any():
+                similarity = self._standardize(self.prints[same]) @ self._standardize(centroid[None])[0]
+                best = int(similarity.argmax())
+                if similarity[best] >= FOLD_THRESHOLD:
+                    row = np.flatnonzero(same)[best]
+                    total = self.weights[row] + windows
+                    self.prints[row] = (self.prints[row] * self.weights[row] + centroid * windows) / total
+                    self.weights[row] = total
+                    return
+
+        self.prints = centroid[None] if not len(self) else np.vstack([self.prints, centroid])
+        self.names.append(speaker)
+        self.weights = np.append(self.weights, float(windows))
+
+    def add_background(self, count: float, total: np.ndarray, squares: np.ndarray):
+        """Pool one episode's embedding statistics into the background"""
+        if self.background is None:
+            self.background = (count, np.asarray(total, dtype=np.float64), np.asarray(squares, dtype=np.float64))
+        else:
+            old_count, old_total, old_squares = self.background
+            self.background = (old_count + count, old_total + total, old_squares + squares)
+
+    def enroll_transcript(self, transcript_data: Dict, renames: Optional[Dict[str, str]] = None) -> List[str]:
+        """Enroll every named speaker of an acoustically diarized, reviewed transcript
+
+        renames maps cluster labels to people, e.g. {"Speaker 2": "Sarah Johannessen Murray"}.
+        Returns the speakers enrolled.
+        """
+        analysis = transcript_data.get("speaker_analysis", {})
+        embeddings = analysis.get("speaker_embeddings")
+        background = analysis.get("embedding_background")
+        if not embeddings or not background:
+            raise ValueError("transcript has no speaker embeddings (run speaker_diarization.py --acoustic)")
+
+        # Background first, so the first enrolled prints can be compared
+        self.add_background(background["count"], np.array(background["sum"]), np.array(background["sumsq"]))
+        enrolled = []
+        for label, embedding in embeddings.items():
+            speaker = (renames or {}).get(label, label)
+            if UNNAMED_SPEAKER.match(speaker):
+                continue
+            self.enroll(speaker, np.array(embedding["centroid"]), embedding["windows"])
+            enrolled.append(speaker)
+
+        self.episodes.append(transcript_data.get("metadata", {}).get("audio_file", ""))
+        return enrolled
+
+def load_voiceprints(path: Path = VOICEPRINT_PATH) -> Optional[VoiceprintStore]:
+    """The voiceprint store, or None if nobody has been enrolled yet"""
+    if not path.exists():
+        return None
+    return VoiceprintStore(path)
+
+def main():
+    """Enroll reviewed transcripts or list enrolled speakers"""
+    parser = argparse.ArgumentParser(description="Manage speaker voiceprints")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enroll_parser = subparsers.add_parser("enroll", help="Enroll the speakers of reviewed _speakers transcripts")
+    enroll_parser.add_argument("files", nargs="+", type=Path)
+    enroll_parser.add_argument("--rename", action="append", default=[], metavar="LABEL=NAME",
+                               help='Name a cluster before enrolling, e.g. "Speaker 2=Sarah Johannessen Murray"')
+    enroll_parser.add_argument("--force", action="store_true", help="Enroll episodes that were enrolled before")
+
+    subparsers.add_parser("list", help="Show enrolled speakers")
+
+    args = parser.parse_args()
+    store = VoiceprintStore()
+
+    if args.command == "list":
+        print(f"{len(store.episodes)} episodes enrolled, {len(store)} voiceprints")
+        for speaker in store.speakers:
+            rows = [i for i, name in enumerate(store.names) if name == speaker]
+            windows = int(sum(store.weights[i] for i in rows))
+            print(f"  {speaker}: {len(rows)} prints, {windows} windows")
+        return
+
+    renames = dict(rename.split("=", 1) for rename in args.rename)
+    for path in args.files:
+        transcript_data = load_transcript_file(path)
+        audio_file = transcript_data.get("metadata", {}).get("audio_file", "")
+        if audio_file in store.episodes and not args.force:
+            print(f"Skipping already enrolled: {path.name}")
+            continue
+        try:
+            enrolled = store.enroll_transcript(transcript_data, renames)
+        except ValueError as e:
+            print(f"✗ {path.name}: {e}")
+            continue
+        print(f"✓ {path.name}: {', '.join(enrolled) or 'no named speakers'}")
+
+    if store.background:
+        store.save()
+        print(f"\nVoiceprints saved to {store.path}")
+
+if __name__ == "__main__":
+    main()
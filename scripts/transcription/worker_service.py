@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Transcription Worker Service for Ray Peat Podcast Collection
+Runs a pool of warm workers that take jobs from the durable job queue and
+carry each through download → transcribe → diarize, plus a small HTTP API
+so the backend can submit jobs and poll their progress instead of blocking
+"""
+
+import os
+import json
+import fcntl
+import signal
+import argparse
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import bulk_transcribe
+import download_audio
+import speaker_diarization
+from engines import ENGINES, TranscriptionEngine, create_engine
+from job_queue import JOB_STATUSES, JobCancelled, JobQueue, LeaseLost
+from manifest import TranscriptionManifest
+from transcript_search import SearchIndex
+
+# Configuration
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+POLL_SECONDS = 2.0
+HEARTBEAT_SECONDS = 60        # well inside job_queue.LEASE_SECONDS, so long transcriptions keep their lease
+SHUTDOWN_GRACE_SECONDS = 10
+
+@contextmanager
+def sources_lock():
+    """Serialize read-modify-write of sources.json between worker processes"""
+    lock_path = download_audio.SOURCES_PATH.with_name(download_audio.SOURCES_PATH.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def fetch_audio(job: Dict, session) -> Path:
+    """The job's audio in the audio cache, downloading it first if needed"""
+    if job["audio_file"]:
+        audio_path = bulk_transcribe.AUDIO_CACHE_DIR / job["audio_file"]
+        if not audio_path.is_file():
+            raise FileNotFoundError(f"not in the audio cache: {job['audio_file']}")
+        return audio_path
+
+    url = job["audio_url"]
+    title = job["title"] or Path(urlparse(url).path).stem
+    with sources_lock():
+        sources = download_audio.load_sources()
+        filename = download_audio.assign_filenames([{"url": url, "title": title}], sources)[url]
+        download_audio.save_sources(sources)
+
+    audio_path = download_audio.AUDIO_CACHE_DIR / filename
+    if not audio_path.exists() and not download_audio.download_audio_file(url, audio_path, session):
+        raise RuntimeError(f"download failed: {url}")
+    return audio_path
+
+def transcribe_job_audio(audio_path: Path, engine: TranscriptionEngine) -> Path:
+    """Raw transcript for audio_path, reusing one the manifest already knows about"""
+    with TranscriptionManifest() as manifest:
+        audio_hash = manifest.audio_hash(audio_path)
+        if manifest.is_done(audio_hash, engine.cache_key, engine.language):
+            return Path(manifest.lookup(audio_hash, engine.cache_key, engine.language)["output_path"])
+
+        transcript_data = bulk_transcribe.transcribe_audio(audio_path, engine)
+        if not transcript_data:
+            manifest.mark_failed(audio_hash, engine.cache_key, engine.language, audio_path,
+                                 error="transcription failed")
+            raise RuntimeError(f"transcription failed: {audio_path.name}")
+
+        output_path = bulk_transcribe.organize_by_show_and_year(audio_path, transcript_data)
+        if not bulk_transcribe.save_transcript(transcript_data, output_path):
+            raise RuntimeError(f"could not save {output_path}")
+        manifest.mark_done(audio_hash, engine.cache_key, engine.language, audio_path, output_path,
+                           audio_duration=transcript_data["metadata"].get("audio_duration"))
+        return output_path
+
+@contextmanager
+def heartbeat(job_id: int, worker: str):
+    """Keep the job's lease alive from a background thread while the body runs
+
+    Stages such as transcription can run far longer than the lease; without
+    this the job would be handed to another worker mid-run.
+    """
+    stop = threading.Event()
+
+    def beat():
+        # SQLite connections belong to the thread that opened them
+        with JobQueue() as queue:
+            while not stop.wait(HEARTBEAT_SECONDS):
+                if not queue.heartbeat(job_id, worker):
+                    print(f"✗ [{worker}] lost the lease on job {job_id}")
+                    return
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_job(job: Dict, queue: JobQueue, engine: TranscriptionEngine, session) -> Dict:
+    """download → transcribe → diarize → index for one job
+
+    Progress updates between stages double as cancellation points and
+    raise LeaseLost if another worker has taken the job over.
+    """
+    job_id = job["id"]
+    worker = job["worker"]
+
+    queue.update_progress(job_id, worker, "download", 0.0)
+    audio_path = fetch_audio(job, session)
+
+    queue.update_progress(job_id, worker, "transcribe", 0.1)
+    raw_path = transcribe_job_audio(audio_path, engine)
+
+    queue.update_progress(job_id, worker, "diarize", 0.9)
+    speakers_path = speaker_diarization.speaker_output_path(raw_path)
+    if not speaker_diarization.process_transcript_file(raw_path, speakers_path):
+        raise RuntimeError(f"diarization failed: {raw_path.name}")
+
+    queue.update_progress(job_id, worker, "index", 0.98)
+    with SearchIndex() as index:
+        index.index_file(speakers_path)
+
+    return {
+        "audio_file": audio_path.name,
+        "raw_transcript": str(raw_path),
+        "speaker_transcript": str(speakers_path),
+    }
+
+def worker_main(worker: str, engine_name: str, model: str, language: str, threads: int, stop_event):
+    """Worker process: load the engine once, then take jobs until told to stop"""
+    engine = create_engine(engine_name, model, language)
+    with JobQueue() as queue:
+        queue.set_worker_state(worker, "loading", engine.method)
+        try:
+            engine.load(threads)
+        except Exception as e:
+            # Reported through /status; the other workers carry on
+            error = f"{type(e).__name__}: {e}"
+            print(f"✗ [{worker}] could not load {engine.method}: {error}")
+            queue.set_worker_state(worker, "failed", engine.method, error)
+            return
+        queue.set_worker_state(worker, "ready", engine.method)
+
+    session = download_audio.create_session(pool_size=1)
+    print(f"[{worker}] ready ({engine.method})")
+
+    with JobQueue() as queue:
+        while not stop_event.is_set():
+            job = queue.claim(worker)
+            if job is None:
+                stop_event.wait(POLL_SECONDS)
+                continue
+
+            print(f"[{worker}] job {job['id']} (attempt {job['attempts']}/{job['max_attempts']}): "
+                  f"{job['audio_file'] or job['audio_url']}")
+            try:
+                with heartbeat(job["id"], worker):
+                    result = run_job(job, queue, engine, session)
+            except JobCancelled:
+                queue.mark_cancelled(job["id"], worker)
+                print(f"[{worker}] job {job['id']} cancelled")
+            except LeaseLost:
+                print(f"✗ [{worker}] job {job['id']} was taken over by another worker, dropping it")
+            except Exception as e:
+                retrying = queue.fail(job["id"], worker, f"{type(e).__name__}: {e}")
+                if retrying is None:
+                    print(f"✗ [{worker}] job {job['id']} failed after its lease was lost: {e}")
+                else:
+                    print(f"✗ [{worker}] job {job['id']} failed{', will retry' if retrying else ''}: {e}")
+            else:
+                if queue.complete(job["id"], worker, result):
+                    print(f"✓ [{worker}] job {job['id']} done")
+                else:
+                    print(f"✗ [{worker}] job {job['id']} finished after its lease was lost, result dropped")
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """JSON API over the job queue
+
+    GET  /status               job counts by status, worker count and each worker's state
+    GET  /jobs[?status=&limit=] recent jobs
+    GET  /jobs/<id>            one job, including stage and progress
+    POST /jobs                 {"audio_url" | "audio_file", "title", "priority", "max_attempts"}
+    POST /jobs/<id>/cancel     cancel a queued or running job
+    """
+
+    workers = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_id(self, part: str) -> Optional[int]:
+        return int(part) if part.isdigit() else None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+
+        with JobQueue() as queue:
+            if parts == ["status"]:
+                counts = queue.counts()
+                self._send(200, {"counts": counts, "queue_depth": counts["queued"], "workers": len(self.workers),
+                                 "worker_states": queue.worker_states(self.workers)})
+            elif parts == ["jobs"]:
+                status = query.get("status", [None])[0]
+                if status and status not in JOB_STATUSES:
+                    self._send(400, {"error": f"status must be one of {', '.join(JOB_STATUSES)}"})
+                    return
+                try:
+                    limit = int(query.get("limit", ["100"])[0])
+                except (ValueError, TypeError) as e:
+                    self._send(400, {"error": f"limit must be an integer: {e}"})
+                    return
+                self._send(200, queue.jobs(status, limit))
+            elif len(parts) == 2 and parts[0] == "jobs" and self._job_id(parts[1]) is not None:
+                job = queue.get(self._job_id(parts[1]))
+                self._send(200 if job else 404, job or {"error": "no such job"})
+            else:
+                self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = [part for part in urlparse(self.path).path.split("/") if part]
+
+        with JobQueue() as queue:
+            if parts == ["jobs"]:
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    job_id = queue.submit(body.get("audio_url"), body.get("audio_file"), body.get("title"),
+                                          int(body.get("priority", 0)), int(body.get("max_attempts", 3)))
+                except (ValueError, TypeError) as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                self._send(201, queue.get(job_id))
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel" and self._job_id(parts[1]) is not None:
+                status = queue.cancel(self._job_id(parts[1]))
+                self._send(200 if status else 404, {"status": status} if status else {"error": "no such job"})
+            else:
+                self._send(404, {"error": "not found"})
+
+def raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(args):
+    """Start the workers and the HTTP API; Ctrl+C or SIGTERM stops both"""
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    names = [f"worker-{os.getpid()}-{i}" for i in range(args.workers)]
+    processes = [
+        ctx.Process(target=worker_main, args=(name, args.engine, args.model, bulk_transcribe.WHISPER_LANGUAGE,
+                                              threads, stop_event), daemon=True)
+        for name in names
+    ]
+    for process in processes:
+        process.start()
+
+    StatusHandler.workers = names
+    server = ThreadingHTTPServer((args.host, args.port), StatusHandler)
+    print(f"Serving job API on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        server.server_close()
+        stop_event.set()
+        for process in processes:
+            process.join(SHUTDOWN_GRACE_SECONDS)
+            if process.is_alive():
+                process.terminate()
+        # Interrupted jobs go straight back in the queue rather than waiting out their lease
+        with JobQueue() as queue:
+            released = sum(queue.release(name) for name in names)
+            queue.forget_workers(names)
+        if released:
+            print(f"Requeued {released} interrupted jobs")
+
+def main():
+    """Run the service or talk to its queue"""
+    parser = argparse.ArgumentParser(description="Transcription job queue and worker service")
+    parser.add_argument("--root", type=Path, help="Project root holding transcripts/ (default: current directory)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Run workers and the HTTP status API")
+    serve_parser.add_argument("--workers", type=int, default=1)
+    serve_parser.add_argument("--engine", choices=list(ENGINES), default="whisper")
+    serve_parser.add_argument("--model", default=bulk_transcribe.WHISPER_MODEL)
+    serve_parser.add_argument("--host", default=SERVICE_HOST)
+    serve_parser.add_argument("--port", type=int, default=SERVICE_PORT)
+
+    submit_parser = subparsers.add_parser("submit", help="Queue jobs")
+    source = submit_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--url", help="Episode audio URL to download")
+    source.add_argument("--file", help="File name in the audio cache")
+    source.add_argument("--all", action="store_true", help="Every file in the audio cache (archive batch)")
+    submit_parser.add_argument("--title")
+    submit_parser.add_argument("--priority", type=int, default=None,
+                               help="Higher runs first (default: 0, or -10 with --all)")
+
+    subparsers.add_parser("status", help="Show queue depth and recent jobs")
+
+    cancel_parser = subparsers.add_parser("cancel", help="Cancel a job")
+    cancel_parser.add_argument("job_id", type=int)
+
+    args = parser.parse_args()
+    if args.root:
+        os.chdir(args.root)
+
+    if args.command == "serve":
+        serve(args)
+        return
+
+    with JobQueue() as queue:
+        if args.command == "submit":
+            if args.all:
+                priority = -10 if args.priority is None else args.priority
+                files = bulk_transcribe.get_audio_files(dedupe=True)
+                for audio_file in files:
+                    queue.submit(audio_file=str(audio_file.relative_to(bulk_transcribe.AUDIO_CACHE_DIR)),
+                                 priority=priority)
+                print(f"Queued {len(files)} jobs at priority {priority}")
+            else:
+                job_id = queue.submit(args.url, args.file, args.title, args.priority or 0)
+                print(f"Queued job {job_id}")
+        elif args.command == "cancel":
+            print(queue.cancel(args.job_id) or "no such job")
+        else:
+            print("  ".join(f"{status}: {n}" for status, n in queue.counts().items()))
+            for job in queue.jobs(limit=20):
+                stage = f"{job['stage']} {job['progress']:.0%}" if job["status"] == "running" else ""
+                print(f"  #{job['id']:<5} {job['status']:<9} p{job['priority']:<4} {stage:<16} "
+                      f"{job['audio_file'] or job['audio_url']}" + (f"  ({job['error']})" if job["error"] else ""))
+
+if __name__ == "__main__":
+    main()